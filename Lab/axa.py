@@ -1,5 +1,10 @@
+import os
+import sys
+
 import serial
-import struct
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Remora"))
+from axetris_framer import PacketFramer, GAS1, MEAS_PAYLOAD_OFFSET
 
 ser = serial.Serial(
     port='/dev/cu.usbserial-BG011WD7',
@@ -7,29 +12,15 @@ ser = serial.Serial(
     timeout=0.1
 )
 
-buffer = b''
+framer = PacketFramer()
 
 while True:
-    buffer += ser.read(128)
-
-    while True:
-        start = buffer.find(b'{')
-        if start == -1:
-            buffer = b''
-            break
-
-        end = buffer.find(b'}', start)
-        if end == -1:
-            buffer = buffer[start:]
-            break
-
-        packet = buffer[start:end+1]
-        buffer = buffer[end+1:]
+    framer.feed(ser.read(128))
 
+    for packet in framer:
         # Only process measurement packets
-        if len(packet) >= 14 and packet[1:2] == b'M':
+        if len(packet) >= 14 and packet[1] == ord('M'):
             # extract float (bytes 6–9)
-            value_bytes = packet[6:10]
-            value = struct.unpack('<f', value_bytes)[0]
+            value = GAS1.unpack_from(packet, MEAS_PAYLOAD_OFFSET)[0]
 
             print("Value:", value)
@@ -1,5 +1,5 @@
 import serial
-import struct
+import sys
 import threading
 import os
 from datetime import datetime
@@ -10,6 +10,9 @@ import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 from matplotlib.widgets import Slider, TextBox
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Remora'))
+from axetris_framer import PacketFramer, GAS1, MEAS_PAYLOAD_OFFSET
+
 # ---------------------------------------------------------------------------
 # Starting defaults (adjust here or via the on-screen controls at runtime)
 # ---------------------------------------------------------------------------
@@ -38,22 +41,12 @@ _vals = deque()
 
 def _serial_reader():
     ser = serial.Serial(port=PORT, baudrate=BAUD, timeout=0.1)
-    buf = b''
+    framer = PacketFramer()
     while True:
-        buf += ser.read(128)
-        while True:
-            start = buf.find(b'{')
-            if start == -1:
-                buf = b''
-                break
-            end = buf.find(b'}', start)
-            if end == -1:
-                buf = buf[start:]
-                break
-            packet = buf[start:end+1]
-            buf = buf[end+1:]
-            if len(packet) >= 14 and packet[1:2] == b'M':
-                value = struct.unpack('<f', packet[6:10])[0]
+        framer.feed(ser.read(128))
+        for packet in framer:
+            if len(packet) >= 14 and packet[1] == ord('M'):
+                value = GAS1.unpack_from(packet, MEAS_PAYLOAD_OFFSET)[0]
                 ts = datetime.now()
                 with _lock:
                     _vals.append(value)
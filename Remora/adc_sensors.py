@@ -12,6 +12,64 @@ This Python translation reproduces the behavior of the original bash scripts:
     - Voltage = (raw 16-bit value) * 0.0000625
 
 Returned values are floats in volts.
+
+The transactions go straight to the kernel's i2c-dev driver: /dev/i2c-1 is
+opened once and each write-then-read is one I2C_RDWR ioctl, so a reading
+no longer forks a process (or one per not-ready poll) and parses its text
+output. Where /dev/i2c-1 cannot be opened the original i2ctransfer path is
+used instead; set_backend() picks one explicitly.
+
+Waiting for a conversion: the channel select also starts a one-shot
+conversion, whose length is set by the sample-rate bits of the command
+byte (66.7 ms at the 16-bit setting used here). The reader sleeps for most
+of that time and then polls the ready bit with increasing gaps. A read
+that is still not ready by its deadline raises TimeoutError. adc_stats()
+counts the polls.
+
+Public API:
+
+    read_windspeed(), read_current()
+        - One conversion each; volts. While the background sampler runs,
+          the mean of that channel's window since the previous call instead.
+
+    read_channels(names=("windspeed", "current"))
+        - Back-to-back conversions of several CHANNELS in one call;
+          {name: (volts, t_acq)}.
+
+    set_backend(name), backend_name()
+        - "ioctl" / "subprocess" / "auto".
+
+    conversion_time(cmd)
+        - Nominal conversion time (s) for a command byte.
+
+    adc_stats()
+        - {"reads", "polls", "max_polls", "last_polls", "timeouts"} since
+          start-up (polls includes the read that comes with the select).
+
+    start_sampler(rate=SAMPLER_RATE, names=("windspeed", "current"))
+        - Start a background thread converting the channels back to back
+          rate times a second into preallocated NumPy ring buffers.
+
+    window_since_last(name)
+        - Aggregate one channel over every sample taken since the previous
+          call:
+              {
+                  "n": <int>,
+                  "mean": <float or None>,
+                  "std": <float or None>,
+                  "min": <float or None>,
+                  "max": <float or None>,
+                  "faults": <int, samples outside FAULT_BAND, left out>,
+                  "errors": <int, conversions that failed>,
+                  "t_first": <epoch seconds or None>,
+                  "t_last": <epoch seconds or None>,
+              }
+
+    stop_sampler(), sampler_running()
+
+CLI:
+    python3 adc_sensors.py            # read both channels once
+    python3 adc_sensors.py --bench    # per-read latency of each backend
 """
 
 """
@@ -19,10 +77,12 @@ Returned values are floats in volts.
 NOTES ON IMPLEMENTING THESE ADC READS USING smbus2 OR periphery
 -------------------------------------------------------------------------------
 
-The current Python module calls the `i2ctransfer` binary to read the ADC at
-I2C address 0x6C. This exactly mimics the bash code already tested on the Pi.
+This module originally called the `i2ctransfer` binary to read the ADC at
+I2C address 0x6C, exactly mimicking the bash code tested on the Pi. That is
+still the fallback backend; the default one (_IoctlBus below) issues the
+same transactions itself, the way smbus2's i2c_rdwr does.
 
-However, the same logic can be implemented cleanly using a pure-Python I2C 
+The same logic can also be implemented using a pure-Python I2C
 library such as **smbus2** (most common) or **periphery** (lower-level, but
 stable). The key is that the ADC requires a *write-then-read* transaction:
 
@@ -108,20 +168,179 @@ direct drop-in replacement for the i2ctransfer calls used here.
 -------------------------------------------------------------------------------
 """
 
+import argparse
+import ctypes
+import fcntl
+import os
+import statistics
 import subprocess
+import sys
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:  # only the background sampler needs NumPy
+    np = None
 
 
 I2C_BUS = "1"
 I2C_ADDR = "0x6c"
 ADC_LSB = 0.0000625    # Same as your bash: raw * .0000625
 
+# Channel name -> command byte (one-shot conversion, 16 bit, gain 1)
+CHANNELS = {"windspeed": "0x88", "current": "0xa8"}
+
+# "auto" = ioctl if /dev/i2c-<bus> can be opened, else subprocess
+I2C_BACKEND = "auto"
+
+# MCP342x sample-rate bits (command bits 3-2) -> nominal conversion time (s)
+CONVERSION_TIME = {0b00: 1 / 240, 0b01: 1 / 60, 0b10: 1 / 15, 0b11: 1 / 3.75}
+
+# Ready polling: first poll at this fraction of the nominal conversion time
+# (the internal oscillator can run fast), then gaps growing from POLL_MIN by
+# POLL_BACKOFF up to POLL_MAX, giving up READ_TIMEOUT_FACTOR conversion
+# times (but at least READ_TIMEOUT_MIN) after the select.
+FIRST_POLL_FRACTION = 0.85
+POLL_MIN = 0.001
+POLL_MAX = 0.02
+POLL_BACKOFF = 2.0
+READ_TIMEOUT_FACTOR = 3.0
+READ_TIMEOUT_MIN = 0.1
+
+# Longest a single i2ctransfer process may take (subprocess backend)
+SUBPROCESS_TIMEOUT = 1.0
+
+# From <linux/i2c-dev.h> / <linux/i2c.h>
+I2C_RDWR = 0x0707
+I2C_M_RD = 0x0001
+
+# Both channels share one converter: a channel select issued while another
+# channel's conversion is in flight would clobber it, so callers on
+# different threads take turns on the bus.
+_bus_lock = threading.Lock()
+
+_stats = {"reads": 0, "polls": 0, "max_polls": 0, "last_polls": 0, "timeouts": 0}
+
+# Background sampler: passes (all channels once) per second. One 16-bit
+# conversion takes 66.7 ms, so two channels top out near 7.5 passes/s.
+SAMPLER_RATE = 5.0
+
+# Samples kept per channel (at 5/s, about 13 minutes between calls)
+SAMPLER_RING_SIZE = 4096
+
+# A sample further than this (V) from its window's median is a fault code
+# (a bad read at 0 V or full scale), not a measurement; it is counted and
+# left out of the window's statistics. Channels not listed are not screened.
+FAULT_BAND = {"windspeed": 0.5}
+
+
+# ----------------------------------------------------------------------
+# Bus backends: select_and_read(cmd) = w1 <cmd> r3 in one transaction,
+# read() = r3; both return the 3 bytes (MSB, LSB, status) as ints.
+# ----------------------------------------------------------------------
+
+class _I2CMsg(ctypes.Structure):
+    _fields_ = [("addr", ctypes.c_uint16), ("flags", ctypes.c_uint16),
+                ("len", ctypes.c_uint16), ("buf", ctypes.POINTER(ctypes.c_uint8))]
+
+
+class _I2CRdwrData(ctypes.Structure):
+    _fields_ = [("msgs", ctypes.POINTER(_I2CMsg)), ("nmsgs", ctypes.c_uint32)]
+
+
+class _IoctlBus:
+    """/dev/i2c-N kept open; one I2C_RDWR ioctl per transaction, no allocation."""
+
+    name = "ioctl"
+
+    def __init__(self, bus=I2C_BUS, addr=I2C_ADDR):
+        self.fd = os.open(f"/dev/i2c-{bus}", os.O_RDWR | os.O_CLOEXEC)
+        addr = int(addr, 16)
+        self._wbuf = (ctypes.c_uint8 * 1)()
+        self._rbuf = (ctypes.c_uint8 * 3)()
+        wptr = ctypes.cast(self._wbuf, ctypes.POINTER(ctypes.c_uint8))
+        rptr = ctypes.cast(self._rbuf, ctypes.POINTER(ctypes.c_uint8))
+        # Write + read with a repeated start, as i2ctransfer does for w1 r3
+        self._sel_msgs = (_I2CMsg * 2)(_I2CMsg(addr, 0, 1, wptr),
+                                       _I2CMsg(addr, I2C_M_RD, 3, rptr))
+        self._sel = _I2CRdwrData(self._sel_msgs, 2)
+        self._rd_msgs = (_I2CMsg * 1)(_I2CMsg(addr, I2C_M_RD, 3, rptr))
+        self._rd = _I2CRdwrData(self._rd_msgs, 1)
+
+    def select_and_read(self, cmd):
+        self._wbuf[0] = cmd
+        fcntl.ioctl(self.fd, I2C_RDWR, self._sel)
+        return list(self._rbuf)
+
+    def read(self):
+        fcntl.ioctl(self.fd, I2C_RDWR, self._rd)
+        return list(self._rbuf)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _SubprocessBus:
+    """The original path: one i2ctransfer process per transaction."""
+
+    name = "subprocess"
+
+    def select_and_read(self, cmd):
+        return [int(b, 16) for b in _run_i2ctransfer([
+            "i2ctransfer", "-y", I2C_BUS,
+            f"w1@{I2C_ADDR}", f"0x{cmd:02x}",
+            f"r3@{I2C_ADDR}",
+        ])]
+
+    def read(self):
+        return [int(b, 16) for b in _run_i2ctransfer([
+            "i2ctransfer", "-y", I2C_BUS,
+            f"r3@{I2C_ADDR}",
+        ])]
+
+    def close(self):
+        pass
+
+
+_bus = None
+
+
+def _open_bus(name):
+    if name in ("auto", "ioctl"):
+        try:
+            return _IoctlBus()
+        except OSError:
+            if name == "ioctl":
+                raise
+    return _SubprocessBus()
+
+
+def set_backend(name="auto"):
+    """
+    Switch to the "ioctl" or "subprocess" backend ("auto": ioctl if the
+    device opens). Returns the name of the backend now in use.
+    """
+    global _bus
+    with _bus_lock:
+        if _bus is not None:
+            _bus.close()
+            _bus = None
+        _bus = _open_bus(name)
+        return _bus.name
+
+
+def backend_name():
+    return _bus.name if _bus is not None else None
+
 
 def _run_i2ctransfer(args):
     """
     Run i2ctransfer and return list of byte strings WITHOUT '0x'.
     Example returned list: ['12', 'AF', '00']
     """
-    output = subprocess.check_output(args, text=True)
+    # A hung bus must not hang the caller
+    output = subprocess.check_output(args, text=True, timeout=SUBPROCESS_TIMEOUT)
     # Output looks like: '0x12 0xAF 0x00\n'
     # Strip '0x', normalize to uppercase hex
     parts = output.strip().split()
@@ -129,6 +348,15 @@ def _run_i2ctransfer(args):
     return cleaned
 
 
+def conversion_time(cmd):
+    return CONVERSION_TIME[(cmd >> 2) & 0b11]
+
+
+def adc_stats():
+    with _bus_lock:
+        return dict(_stats)
+
+
 def _read_adc(channel_cmd):
     """
     Perform the busy-wait read sequence used in both sensor scripts.
@@ -138,43 +366,286 @@ def _read_adc(channel_cmd):
 
     Returns voltage as a float.
     """
+    with _bus_lock:
+        return _read_adc_locked(channel_cmd)[0]
+
+
+def _read_adc_locked(channel_cmd):
+    """
+    _read_adc body; caller must hold _bus_lock. Returns (voltage, t_acq),
+    t_acq being the wall-clock midpoint of the conversion.
+    """
+    global _bus
+    if _bus is None:
+        _bus = _open_bus(I2C_BACKEND)
+
+    cmd = int(channel_cmd, 16)
+    t_conv = conversion_time(cmd)
 
     # Initial read: w1@0x6c <channel_cmd> r3@0x6c
-    args = [
-        "i2ctransfer", "-y", I2C_BUS,
-        f"w1@{I2C_ADDR}", channel_cmd,
-        f"r3@{I2C_ADDR}",
-    ]
-    bytes_hex = _run_i2ctransfer(args)
-
-    # Busy-wait until MSB ready (bytes[2] & 0x80 == 0)
-    # Subsequent reads omit the write:
-    # i2ctransfer -y 1 r3@0x6c
-    while int(bytes_hex[2], 16) & 0x80:
-        bytes_hex = _run_i2ctransfer([
-            "i2ctransfer", "-y", I2C_BUS,
-            f"r3@{I2C_ADDR}",
-        ])
+    t_wall = time.time()
+    t_select = time.monotonic()
+    data = _bus.select_and_read(cmd)
+    polls = 1
+
+    # Wait until ready (bytes[2] & 0x80 == 0). Nothing can be ready before
+    # the conversion time, so sleep through most of it, then poll with
+    # backoff until the deadline. Subsequent reads omit the write: r3@0x6c
+    if data[2] & 0x80:
+        deadline = t_select + max(READ_TIMEOUT_FACTOR * t_conv, READ_TIMEOUT_MIN)
+        time.sleep(max(0.0, t_select + FIRST_POLL_FRACTION * t_conv - time.monotonic()))
+        gap = POLL_MIN
+        while True:
+            data = _bus.read()
+            polls += 1
+            if not data[2] & 0x80:
+                break
+            now = time.monotonic()
+            if now >= deadline:
+                _stats["timeouts"] += 1
+                _record_polls(polls)
+                raise TimeoutError(f"ADC not ready after {polls} polls "
+                                   f"({(now - t_select) * 1000:.0f} ms)")
+            time.sleep(min(gap, deadline - now))
+            gap = min(gap * POLL_BACKOFF, POLL_MAX)
+    _record_polls(polls)
 
     # Combine bytes[0] and bytes[1] into a 16-bit integer
-    raw_val = int(bytes_hex[0] + bytes_hex[1], 16)
+    raw_val = (data[0] << 8) | data[1]
 
     # Apply scale factor
     voltage = raw_val * ADC_LSB
-    return voltage
+    return voltage, t_wall + 0.5 * (time.monotonic() - t_select)
+
+
+def _record_polls(polls):
+    _stats["reads"] += 1
+    _stats["polls"] += polls
+    _stats["last_polls"] = polls
+    _stats["max_polls"] = max(_stats["max_polls"], polls)
 
 
 def read_windspeed():
-    """Return windspeed sensor voltage as a float."""
+    """
+    Return windspeed sensor voltage as a float: one conversion, or with the
+    background sampler running the mean of its window since the last call.
+    """
     try:
-        return _read_adc("0x88")
+        if sampler_running() and "windspeed" in _rings:
+            return _window_mean("windspeed")
+        return _read_adc(CHANNELS["windspeed"])
     except Exception as e:
         raise RuntimeError(f"Error reading windspeed sensor: {e}")
 
 
 def read_current():
-    """Return current sensor voltage as a float."""
+    """
+    Return current sensor voltage as a float: one conversion, or with the
+    background sampler running the mean of its window since the last call.
+    """
     try:
-        return _read_adc("0xa8")
+        if sampler_running() and "current" in _rings:
+            return _window_mean("current")
+        return _read_adc(CHANNELS["current"])
     except Exception as e:
         raise RuntimeError(f"Error reading current sensor: {e}")
+
+
+def read_channels(names=("windspeed", "current")):
+    """
+    Convert several channels back to back in one hold of the bus: each
+    channel is selected (starting its conversion) in the same moment the
+    previous one's result is latched, with no other caller in between.
+    Returns {name: (volts, t_acq)}, t_acq being the wall-clock midpoint of
+    that channel's conversion.
+
+    The converter is shared, so conversions cannot overlap; what this saves
+    is the gap between them, and it keeps the channels one conversion apart.
+    """
+    result = {}
+    with _bus_lock:
+        for name in names:
+            try:
+                result[name] = _read_adc_locked(CHANNELS[name])
+            except Exception as e:
+                raise RuntimeError(f"Error reading {name} sensor: {e}")
+    return result
+
+
+# ----------------------------------------------------------------------
+# Background sampler
+# ----------------------------------------------------------------------
+
+class _Ring:
+    """
+    Preallocated per-channel sample buffer. seq counts every sample ever
+    written, so seq % size is the next slot and a reader that remembers
+    seq knows which samples are new.
+    """
+
+    def __init__(self, size):
+        self.t = np.zeros(size)
+        self.v = np.zeros(size)
+        self.seq = 0
+        self.taken = 0
+        self.errors = 0
+
+    def append(self, value, t_acq):
+        i = self.seq % len(self.v)
+        self.v[i] = value
+        self.t[i] = t_acq
+        self.seq += 1
+
+    def take(self):
+        """(t, v) copies of the samples since the last take(), oldest first."""
+        n = min(self.seq - self.taken, len(self.v))
+        idx = np.arange(self.seq - n, self.seq) % len(self.v)
+        self.taken = self.seq
+        return self.t[idx], self.v[idx]
+
+
+_rings = {}
+_ring_lock = threading.Lock()
+_sampler = None
+_sampler_stop = threading.Event()
+
+
+def _sampler_loop(names, rate):
+    """Fixed-phase passes over names until stopped."""
+    interval = 1.0 / rate
+    next_pass = time.monotonic()
+    while not _sampler_stop.is_set():
+        with _bus_lock:
+            for name in names:
+                try:
+                    value, t_acq = _read_adc_locked(CHANNELS[name])
+                except Exception:
+                    with _ring_lock:
+                        _rings[name].errors += 1
+                    continue
+                with _ring_lock:
+                    _rings[name].append(value, t_acq)
+        next_pass += interval
+        now = time.monotonic()
+        if next_pass < now:
+            # Slower than rate (slow bus, retries): run flat out, no catch-up
+            next_pass = now
+        _sampler_stop.wait(next_pass - now)
+
+
+def sampler_running():
+    return _sampler is not None and _sampler.is_alive()
+
+
+def start_sampler(rate=SAMPLER_RATE, names=("windspeed", "current")):
+    """Start the background sampler; windows start from now."""
+    global _sampler
+    if np is None:
+        raise RuntimeError("NumPy is required for the background ADC sampler.")
+    if rate <= 0:
+        raise ValueError("Sampler rate must be > 0 passes per second.")
+    if sampler_running():
+        return
+    with _ring_lock:
+        _rings.clear()
+        for name in names:
+            _rings[name] = _Ring(SAMPLER_RING_SIZE)
+    _sampler_stop.clear()
+    _sampler = threading.Thread(target=_sampler_loop, args=(tuple(names), rate),
+                                name="adc-sampler", daemon=True)
+    _sampler.start()
+
+
+def stop_sampler():
+    global _sampler
+    if _sampler is None:
+        return
+    _sampler_stop.set()
+    _sampler.join(timeout=1.0)
+    _sampler = None
+
+
+def window_since_last(name):
+    if not sampler_running():
+        raise RuntimeError("ADC background sampler is not running.")
+    if name not in _rings:
+        raise KeyError(f"ADC sampler is not sampling {name!r}.")
+
+    with _ring_lock:
+        ring = _rings[name]
+        t, v = ring.take()
+        errors, ring.errors = ring.errors, 0
+
+    faults = 0
+    if name in FAULT_BAND and len(v):
+        good = np.abs(v - np.median(v)) <= FAULT_BAND[name]
+        faults = int(len(v) - np.count_nonzero(good))
+        v = v[good]
+    n = len(v)
+    return {
+        "n": n,
+        "mean": float(v.mean()) if n else None,
+        "std": float(v.std()) if n else None,
+        "min": float(v.min()) if n else None,
+        "max": float(v.max()) if n else None,
+        "faults": faults,
+        "errors": errors,
+        "t_first": float(t[0]) if len(t) else None,
+        "t_last": float(t[-1]) if len(t) else None,
+    }
+
+
+def _window_mean(name):
+    window = window_since_last(name)
+    if window["n"] == 0:
+        raise RuntimeError(f"no good {name} samples since the previous read")
+    return window["mean"]
+
+
+# ----------------------------------------------------------------------
+# CLI
+# ----------------------------------------------------------------------
+
+def _bench(n):
+    backends = ["ioctl", "subprocess"]
+    for backend in backends:
+        try:
+            set_backend(backend)
+        except OSError as e:
+            print(f"{backend:10s} unavailable: {e}")
+            continue
+        for label, func in (("windspeed", read_windspeed), ("current", read_current),
+                            ("both", read_channels)):
+            times = []
+            try:
+                for _ in range(n):
+                    t0 = time.perf_counter()
+                    func()
+                    times.append((time.perf_counter() - t0) * 1000)
+            except RuntimeError as e:
+                print(f"{backend:10s} {label:9s} failed: {e}")
+                continue
+            times.sort()
+            print(f"{backend:10s} {label:9s} n={n} mean={statistics.mean(times):.2f} ms "
+                  f"median={statistics.median(times):.2f} ms "
+                  f"p95={times[int(0.95 * (n - 1))]:.2f} ms max={times[-1]:.2f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Read the windspeed/current ADC.")
+    ap.add_argument("--bench", action="store_true",
+                    help="time reads with each backend")
+    ap.add_argument("-n", type=int, default=50, help="reads per channel for --bench")
+    args = ap.parse_args()
+
+    if args.bench:
+        _bench(args.n)
+        return 0
+    readings = read_channels(("windspeed", "current"))
+    print(f"windspeed={readings['windspeed'][0]:.5f} V current={readings['current'][0]:.5f} V "
+          f"({backend_name()}, {abs(readings['current'][1] - readings['windspeed'][1]) * 1000:.1f} ms apart)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -14,17 +14,14 @@
 
 import argparse
 import glob
-import struct
 import sys
-import time
 from datetime import datetime
 
 
 import serial
 
-
-START = 0x7B  # '{'
-END   = 0x7D  # '}'
+from axetris_framer import (PacketFramer, STATUS, GAS1, GAS3,
+                            MEAS_STATUS_OFFSET, MEAS_PAYLOAD_OFFSET)
 
 
 # Prebuilt 8-byte commands from the manual (little-endian size includes braces)
@@ -39,6 +36,10 @@ DEFAULT_BAUD = 9600  # per manual
 DEFAULT_TIMEOUT = 1.0
 
 
+# Bytes received but not yet framed (one port per process)
+_framer = PacketFramer()
+
+
 def find_serial_port(explicit_port=None):
     if explicit_port:
         return explicit_port
@@ -64,63 +65,13 @@ def open_serial(port, baud):
     return ser
 
 
-def read_exact(ser, n):
-    """Read exactly n bytes or raise TimeoutError."""
-    data = bytearray()
-    deadline = time.monotonic() + ser.timeout if ser.timeout else None
-    while len(data) < n:
-        chunk = ser.read(n - len(data))
-        if chunk:
-            data += chunk
-        else:
-            if deadline is not None and time.monotonic() > deadline:
-                raise TimeoutError(f"Timeout reading {n} bytes (got {len(data)}).")
-    return bytes(data)
-
-
-def compute_sum8(buf):
-    """Sum of bytes modulo 256."""
-    return sum(buf) & 0xFF
-
-
 def read_packet(ser):
     """
     Read one framed packet { ID sizeLSB sizeMSB ... checksum }.
-    Returns bytes including both braces. Validates checksum & end marker.
+    Returns bytes including both braces. Framing, checksum and resync are
+    done by the shared framer (axetris_framer.py) over bulk reads.
     """
-    # Seek start byte
-    while True:
-        b = ser.read(1)
-        if not b:
-            raise TimeoutError("Timeout waiting for start byte '{'.")
-        if b[0] == START:
-            break
-        # else keep discarding until we find '{'
-
-
-    header = read_exact(ser, 3)  # ID + size LSB + size MSB
-    pid = header[0]
-    size = header[1] | (header[2] << 8)
-
-
-    if size < 6:
-        # Minimum is {, ID, sizeLSB, sizeMSB, checksum, }
-        raise ValueError(f"Invalid size {size}")
-
-
-    # We've read 1 (start) + 3 (header) = 4 bytes so far.
-    rest = read_exact(ser, size - 4)  # includes checksum and final '}'
-    if rest[-1] != END:
-        raise ValueError("Packet missing closing '}'")
-
-
-    packet = bytes([START]) + header + rest
-    # Verify checksum: sum of all bytes except the final '}' must be 0 mod 256
-    if compute_sum8(packet[:-1]) != 0:
-        raise ValueError("Checksum failed")
-
-
-    return packet
+    return _framer.read_packet(ser)
 
 
 def parse_version(packet):
@@ -154,16 +105,16 @@ def parse_measurement(packet):
     if len(body) < 2:
         raise ValueError("Measurement packet too short")
     # Bytes 5-6 of full packet are error status code (2 bytes little-endian)
-    err_code = struct.unpack_from("<H", body, 0)[0]
+    (err_code,) = STATUS.unpack_from(packet, MEAS_STATUS_OFFSET)
     # Remaining bytes contain floats and padding to multiple of 8
     payload = body[2:]
     # Decide by packet size
     result = {"error_code": err_code}
     if size == 16 and len(payload) >= 4:
-        (g1,) = struct.unpack_from("<f", payload, 0)
+        (g1,) = GAS1.unpack_from(packet, MEAS_PAYLOAD_OFFSET)
         result["gas1"] = g1
     elif size == 24 and len(payload) >= 12:
-        g1, g2, temp = struct.unpack_from("<fff", payload, 0)
+        g1, g2, temp = GAS3.unpack_from(packet, MEAS_PAYLOAD_OFFSET)
         result["gas1"] = g1
         result["gas2"] = g2
         result["temperature_C"] = temp
@@ -172,7 +123,7 @@ def parse_measurement(packet):
         floats = []
         for off in range(0, min(len(payload), 12), 4):
             if off + 4 <= len(payload):
-                floats.append(struct.unpack_from("<f", payload, off)[0])
+                floats.append(GAS1.unpack_from(payload, off)[0])
         for i, val in enumerate(floats, 1):
             result[f"f{i}"] = val
     return result
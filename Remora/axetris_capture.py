@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+axetris_capture.py
+
+Record the raw byte stream from the Axetris methane sensor, and play a
+recording back through a pseudo-terminal, so methane_sensor.py, ax.py,
+axg.py and run.py can be run, debugged and benchmarked without the device.
+
+Capture file: an 8-byte magic, then one record per serial read,
+
+    <arrival time, uint64 ns since the epoch> <length, uint16> <bytes>
+
+all little-endian. Records hold whatever each read returned, so the
+timing of the original stream (including partial packets) is kept.
+
+Public API:
+
+    CaptureWriter(path)
+        - writer.write(data, t_ns=None); writer.close().
+
+    CapturingSerial(ser, writer)
+        - Wraps an open pyserial port (.ser); every read() is also written
+          to the capture (.writer). Everything else is passed through to ser.
+
+    read_capture(path)
+        - Yields (t_ns, bytes) records in file order.
+
+    replay(path, speed=1.0, link=None)
+        - Serve a capture on a new pty, at recorded timing divided by speed
+          (0 = as fast as the reader takes it). Prints the pty's path (and
+          symlinks it at link) before the first byte. Bytes written to the
+          pty (e.g. CMD_START_MEAS) are read and dropped.
+
+    load_capture(path)
+        - The whole capture at once: (data bytes, per-read arrival times in
+          ns, end offset of each read in data).
+
+    decode_measurements(data, t_ns=None, read_ends=None)
+        - Every M packet in a raw byte stream, framed and decoded with array
+          operations (no per-packet Python), as a structured array with
+          fields t_ns (arrival of the read completing the packet; 0 without
+          t_ns), offset, error_code, gas1, gas2, temperature_C (NaN where a
+          packet does not carry it). Needs NumPy.
+
+    decode_capture(path)
+        - decode_measurements() over load_capture(path).
+
+CLI:
+    python3 axetris_capture.py capture voyage.axcap [--port /dev/ttyUSB0] [--seconds N]
+    python3 axetris_capture.py replay voyage.axcap [--speed 10] [--link /tmp/ttyAXE]
+    python3 axetris_capture.py bench voyage.axcap [--repeat 100]
+    python3 axetris_capture.py decode voyage.axcap [--tsv]
+"""
+
+import argparse
+import os
+import select
+import struct
+import sys
+import time
+import tty
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:  # only the bulk decoder needs NumPy
+    np = None
+
+from axetris_framer import (PacketFramer, START, END, MIN_PACKET_SIZE, MAX_PACKET_SIZE,
+                            MEAS_PAYLOAD_OFFSET)
+
+MAGIC = b"AXCAP1\x00\x00"
+RECORD = struct.Struct("<QH")
+MAX_CHUNK = 0xFFFF
+
+
+# ----------------------------------------------------------------------
+# Capture
+# ----------------------------------------------------------------------
+
+class CaptureWriter:
+
+    def __init__(self, path):
+        self.path = path
+        self._f = open(path, "wb")
+        self._f.write(MAGIC)
+        self.bytes = 0
+
+    def write(self, data, t_ns=None):
+        if not data or self._f.closed:
+            return
+        if t_ns is None:
+            t_ns = time.time_ns()
+        for i in range(0, len(data), MAX_CHUNK):
+            chunk = data[i:i + MAX_CHUNK]
+            self._f.write(RECORD.pack(t_ns, len(chunk)))
+            self._f.write(chunk)
+        # ~1 read per second: flushing each one costs nothing, and a crash
+        # or power cut loses nothing already received
+        self._f.flush()
+        self.bytes += len(data)
+
+    def close(self):
+        self._f.close()
+
+
+class CapturingSerial:
+
+    def __init__(self, ser, writer):
+        self.ser = ser
+        self.writer = writer
+
+    def read(self, size=1):
+        data = self.ser.read(size)
+        self.writer.write(data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.ser, name)
+
+
+def read_capture(path):
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path}: not an Axetris capture file")
+        while True:
+            head = f.read(RECORD.size)
+            if len(head) < RECORD.size:
+                return  # end of file, or a record cut off mid-write
+            t_ns, n = RECORD.unpack(head)
+            data = f.read(n)
+            if len(data) < n:
+                return
+            yield t_ns, data
+
+
+def load_capture(path):
+    with open(path, "rb") as f:
+        raw = f.read()
+    if raw[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path}: not an Axetris capture file")
+    times, chunks = [], []
+    pos = len(MAGIC)
+    while pos + RECORD.size <= len(raw):
+        t_ns, n = RECORD.unpack_from(raw, pos)
+        pos += RECORD.size
+        if pos + n > len(raw):
+            break  # record cut off mid-write
+        times.append(t_ns)
+        chunks.append(raw[pos:pos + n])
+        pos += n
+    ends = [0] * len(chunks)
+    total = 0
+    for i, chunk in enumerate(chunks):
+        total += len(chunk)
+        ends[i] = total
+    return b"".join(chunks), times, ends
+
+
+# ----------------------------------------------------------------------
+# Bulk decoding
+# ----------------------------------------------------------------------
+
+def _packet_dtype(fields, size):
+    """Structured dtype laying one whole packet of the given size out."""
+    names = ["start", "id", "size"] + [f[0] for f in fields]
+    formats = ["u1", "u1", "<u2"] + [f[1] for f in fields]
+    offsets = [0, 1, 2] + [f[2] for f in fields]
+    return np.dtype({"names": names, "formats": formats, "offsets": offsets,
+                     "itemsize": size})
+
+
+if np is not None:
+    # The two measurement layouts (see methane_sensor._parse_measurement)
+    MEAS16 = _packet_dtype([("error_code", "<u2", 4), ("gas1", "<f4", MEAS_PAYLOAD_OFFSET)], 16)
+    MEAS24 = _packet_dtype([("error_code", "<u2", 4), ("gas1", "<f4", MEAS_PAYLOAD_OFFSET),
+                            ("gas2", "<f4", MEAS_PAYLOAD_OFFSET + 4),
+                            ("temperature_C", "<f4", MEAS_PAYLOAD_OFFSET + 8)], 24)
+    MEASUREMENTS = np.dtype([("t_ns", "<i8"), ("offset", "<i8"), ("error_code", "<u2"),
+                             ("gas1", "<f4"), ("gas2", "<f4"), ("temperature_C", "<f4")])
+
+
+def _frames(buf):
+    """(starts, sizes) of every valid frame in buf, in order, non-overlapping."""
+    n = len(buf)
+    starts = np.flatnonzero(buf[:max(n - 3, 0)] == START)
+    sizes = buf[starts + 2].astype(np.int64) | (buf[starts + 3].astype(np.int64) << 8)
+    ok = (sizes >= MIN_PACKET_SIZE) & (sizes <= MAX_PACKET_SIZE) & (starts + sizes <= n)
+    starts, sizes = starts[ok], sizes[ok]
+    ends = starts + sizes
+    ok = buf[ends - 1] == END
+    # Sum-8 of every byte but the closing '}', from one running sum
+    csum = np.zeros(n + 1, dtype=np.uint64)
+    np.cumsum(buf, dtype=np.uint64, out=csum[1:])
+    ok &= ((csum[ends - 1] - csum[starts]) & 0xFF) == 0
+    starts, sizes, ends = starts[ok], sizes[ok], ends[ok]
+
+    # A '{' inside a good packet can start a "frame" that happens to check
+    # out too. The streaming framer never sees those (it skips past each
+    # packet), so drop them the same way; this is rare, so a loop is fine.
+    if len(starts) > 1 and np.any(starts[1:] < np.maximum.accumulate(ends)[:-1]):
+        keep = np.zeros(len(starts), dtype=bool)
+        last_end = 0
+        for i in range(len(starts)):
+            if starts[i] >= last_end:
+                keep[i] = True
+                last_end = ends[i]
+        starts, sizes = starts[keep], sizes[keep]
+    return starts, sizes
+
+
+def _gather(buf, starts, dtype):
+    """Copy the packets at starts into rows of dtype (one fancy-index gather)."""
+    rows = buf[starts[:, None] + np.arange(dtype.itemsize)]
+    return rows.view(dtype).reshape(len(starts))
+
+
+def decode_measurements(data, t_ns=None, read_ends=None):
+    if np is None:
+        raise RuntimeError("NumPy is required to bulk-decode Axetris captures.")
+    buf = np.frombuffer(data, dtype=np.uint8)
+    starts, sizes = _frames(buf)
+    is_meas = buf[starts + 1] == ord('M')
+    starts, sizes = starts[is_meas], sizes[is_meas]
+
+    out = np.zeros(len(starts), dtype=MEASUREMENTS)
+    out["offset"] = starts
+    out["gas1"] = out["gas2"] = out["temperature_C"] = np.nan
+    for dtype in (MEAS16, MEAS24):
+        sel = np.flatnonzero(sizes == dtype.itemsize)
+        packets = _gather(buf, starts[sel], dtype)
+        for name in dtype.names[3:]:
+            out[name][sel] = packets[name]
+    if t_ns is not None and len(out):
+        # The read that delivered each packet's last byte
+        chunk = np.searchsorted(np.asarray(read_ends), starts + sizes - 1, side="right")
+        out["t_ns"] = np.asarray(t_ns, dtype=np.int64)[chunk]
+    return out
+
+
+def decode_capture(path):
+    return decode_measurements(*load_capture(path))
+
+
+# ----------------------------------------------------------------------
+# Replay
+# ----------------------------------------------------------------------
+
+def _drain(fd, timeout):
+    """Discard whatever the reader wrote to the pty, for up to timeout s."""
+    deadline = time.monotonic() + max(0.0, timeout)
+    while True:
+        ready, _, _ = select.select([fd], [], [], max(0.0, deadline - time.monotonic()))
+        if ready:
+            try:
+                os.read(fd, 4096)
+            except OSError:
+                pass
+        if time.monotonic() >= deadline:
+            return
+
+
+def replay(path, speed=1.0, link=None):
+    """Serve path on a new pty; returns the number of bytes written."""
+    master, slave = os.openpty()
+    # Raw, so no byte of the binary stream is treated as a control character.
+    # The slave end stays open here so writes never fail between readers.
+    tty.setraw(slave)
+    name = os.ttyname(slave)
+    if link:
+        if os.path.lexists(link):
+            os.unlink(link)
+        os.symlink(name, link)
+    print(f"[replay] {path} on {name}" + (f" ({link})" if link else ""), flush=True)
+
+    sent = 0
+    t0_rec = None
+    t0 = time.monotonic()
+    try:
+        for t_ns, data in read_capture(path):
+            if t0_rec is None:
+                t0_rec = t_ns
+            if speed > 0:
+                due = t0 + (t_ns - t0_rec) / 1e9 / speed
+                _drain(master, due - time.monotonic())
+            os.write(master, data)
+            sent += len(data)
+    finally:
+        if link and os.path.islink(link):
+            os.unlink(link)
+        os.close(master)
+        os.close(slave)
+    return sent
+
+
+# ----------------------------------------------------------------------
+# CLI
+# ----------------------------------------------------------------------
+
+def _capture(args):
+    from methane_sensor import _find_serial_port, _open_serial
+
+    port = _find_serial_port(args.port)
+    writer = CaptureWriter(args.path)
+    ser = CapturingSerial(_open_serial(port, args.baud), writer)
+    print(f"[capture] {port} @ {args.baud} bps -> {args.path} (Ctrl-C to stop)")
+    end = time.monotonic() + args.seconds if args.seconds else None
+    try:
+        while end is None or time.monotonic() < end:
+            ser.read(max(1, ser.in_waiting))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ser.close()
+        writer.close()
+    print(f"[capture] {writer.bytes} bytes")
+    return 0
+
+
+def _replay(args):
+    try:
+        sent = replay(args.path, args.speed, args.link)
+    except KeyboardInterrupt:
+        return 0
+    print(f"[replay] done, {sent} bytes")
+    return 0
+
+
+def _bench(args):
+    records = list(read_capture(args.path))
+    n_bytes = sum(len(data) for _, data in records)
+    framer = PacketFramer()
+    t_start = time.perf_counter()
+    for _ in range(args.repeat):
+        for _, data in records:
+            framer.feed(data)
+            for _packet in framer:
+                pass
+    elapsed = time.perf_counter() - t_start
+    stats = framer.stats()
+    span = (records[-1][0] - records[0][0]) / 1e9 if records else 0.0
+    print(f"{len(records)} reads, {n_bytes} bytes, {span:.0f} s of stream")
+    print(f"framed {stats['packets'] // args.repeat} packets x{args.repeat} in {elapsed:.3f} s: "
+          f"{stats['packets'] / elapsed:.0f} packets/s, "
+          f"{n_bytes * args.repeat / elapsed / 1e6:.1f} MB/s")
+    print(f"resyncs={stats['resyncs']} bad_checksums={stats['bad_checksums']} "
+          f"discarded_bytes={stats['discarded_bytes']}")
+    return 0
+
+
+def _decode(args):
+    t_start = time.perf_counter()
+    meas = decode_capture(args.path)
+    elapsed = time.perf_counter() - t_start
+
+    if args.tsv:
+        print("time\tgas1\tgas2\ttemperature_C\terror_code")
+        for m in meas:
+            ts = datetime.fromtimestamp(int(m["t_ns"]) / 1e9).strftime("%Y-%m-%dT%H:%M:%S")
+            vals = ["NA" if v != v else repr(float(v))
+                    for v in (m["gas1"], m["gas2"], m["temperature_C"])]
+            print("\t".join([ts] + vals + [str(int(m["error_code"]))]))
+        return 0
+
+    print(f"{args.path}: {len(meas)} measurement packets decoded in {elapsed:.3f} s")
+    if len(meas):
+        t = meas["t_ns"].astype("datetime64[ns]")
+        print(f"  span: {t[0]} .. {t[-1]} (UTC)")
+        print(f"  gas1: mean {np.nanmean(meas['gas1']):.4f}  "
+              f"min {np.nanmin(meas['gas1']):.4f}  max {np.nanmax(meas['gas1']):.4f}")
+        print(f"  packets with an error code: {int(np.count_nonzero(meas['error_code']))}")
+    return 0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Capture and replay the Axetris serial stream.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("capture", help="record the raw stream from the sensor")
+    p.add_argument("path")
+    p.add_argument("--port", help="serial port (auto-detect if omitted)")
+    p.add_argument("--baud", type=int, default=9600)
+    p.add_argument("--seconds", type=float, help="stop after this long")
+    p.set_defaults(func=_capture)
+
+    p = sub.add_parser("replay", help="serve a capture on a pty")
+    p.add_argument("path")
+    p.add_argument("--speed", type=float, default=1.0,
+                   help="times real time; 0 = as fast as possible (default 1)")
+    p.add_argument("--link", help="also make the pty reachable at this path")
+    p.set_defaults(func=_replay)
+
+    p = sub.add_parser("bench", help="time the packet framer over a capture")
+    p.add_argument("path")
+    p.add_argument("--repeat", type=int, default=1)
+    p.set_defaults(func=_bench)
+
+    p = sub.add_parser("decode", help="bulk-decode every measurement in a capture")
+    p.add_argument("path")
+    p.add_argument("--tsv", action="store_true", help="print the measurements as TSV")
+    p.set_defaults(func=_decode)
+
+    args = ap.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
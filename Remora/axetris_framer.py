@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+axetris_framer.py
+
+Incremental packet framer for the Axetris LGD serial protocol, shared by
+methane_sensor.py, ax.py/axg.py and the Lab readers.
+
+A packet is
+
+    { ID sizeLSB sizeMSB <size - 6 bytes> checksum }
+
+where size counts every byte including both braces and the bytes before
+the final '}' sum to 0 mod 256. Framing goes by the size field, never by
+searching for '}', which is a perfectly good byte inside a float payload.
+
+Serial data is fed in bulk (whatever has arrived, not one read(1) per
+byte) into one bytearray that is consumed by advancing an offset and
+compacted only now and then, so no per-packet slicing of the buffer.
+Checksums are summed over a memoryview of the buffer. A frame whose size
+is implausible, whose last byte is not '}', or whose checksum fails is
+skipped by rescanning for the next '{' one byte after its start, inside
+the buffer; nothing already received is thrown away.
+
+Public API:
+
+    PacketFramer()
+        - framer.feed(data): append received bytes.
+        - framer.next_packet(): next complete, checksum-valid packet as
+          bytes (both braces included), or None if the buffer holds none.
+        - iter(framer): every complete packet now in the buffer.
+        - framer.read_packet(ser): next packet from a pyserial port, reading
+          whatever it has waiting; TimeoutError if a read times out with
+          no complete packet buffered.
+        - framer.clear(): drop buffered bytes (e.g. after reopening a port).
+        - framer.stats(): {"packets", "resyncs", "bad_checksums",
+          "discarded_bytes"} since creation.
+
+    STATUS, GAS1, GAS3
+        - Precompiled struct.Struct decoders for a measurement packet's
+          error code (at MEAS_STATUS_OFFSET) and its one or three floats
+          (at MEAS_PAYLOAD_OFFSET).
+"""
+
+import struct
+
+START = 0x7B  # '{'
+END   = 0x7D  # '}'
+
+# {, ID, sizeLSB, sizeMSB, checksum, }
+MIN_PACKET_SIZE = 6
+# The longest response in the manual is the 64-byte Version packet; a size
+# field much larger than that is a false '{' inside some other packet.
+MAX_PACKET_SIZE = 256
+
+# Compact the buffer once this many consumed bytes sit at its front
+COMPACT_AFTER = 4096
+
+MEAS_STATUS_OFFSET = 4
+MEAS_PAYLOAD_OFFSET = 6
+STATUS = struct.Struct("<H")
+GAS1 = struct.Struct("<f")
+GAS3 = struct.Struct("<fff")
+
+
+class PacketFramer:
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._pos = 0
+        self.packets = 0
+        self.resyncs = 0
+        self.bad_checksums = 0
+        self.discarded_bytes = 0
+
+    def feed(self, data):
+        if self._pos >= COMPACT_AFTER or self._pos == len(self._buf):
+            del self._buf[:self._pos]
+            self._pos = 0
+        self._buf += data
+
+    def clear(self):
+        self._buf.clear()
+        self._pos = 0
+
+    def stats(self):
+        return {"packets": self.packets, "resyncs": self.resyncs,
+                "bad_checksums": self.bad_checksums,
+                "discarded_bytes": self.discarded_bytes}
+
+    def next_packet(self):
+        buf = self._buf
+        while True:
+            start = buf.find(START, self._pos)
+            if start < 0:
+                self.discarded_bytes += len(buf) - self._pos
+                self._pos = len(buf)
+                return None
+            self.discarded_bytes += start - self._pos
+            self._pos = start
+
+            if len(buf) - start < 4:
+                return None
+            size = buf[start + 2] | (buf[start + 3] << 8)
+            if not MIN_PACKET_SIZE <= size <= MAX_PACKET_SIZE:
+                self._resync()
+                continue
+            end = start + size
+            if len(buf) < end:
+                return None
+            if buf[end - 1] != END:
+                self._resync()
+                continue
+            with memoryview(buf) as view:
+                checksum = sum(view[start:end - 1]) & 0xFF
+                if checksum != 0:
+                    self.bad_checksums += 1
+                    self._resync()
+                    continue
+                packet = bytes(view[start:end])
+            self._pos = end
+            self.packets += 1
+            return packet
+
+    def _resync(self):
+        # Not a packet after all: look for the next '{' past this one
+        self.resyncs += 1
+        self.discarded_bytes += 1
+        self._pos += 1
+
+    def __iter__(self):
+        while True:
+            packet = self.next_packet()
+            if packet is None:
+                return
+            yield packet
+
+    def read_packet(self, ser):
+        while True:
+            packet = self.next_packet()
+            if packet is not None:
+                return packet
+            # Blocks (up to the port timeout) for the first byte only
+            chunk = ser.read(max(1, ser.in_waiting))
+            if not chunk:
+                raise TimeoutError("Timeout waiting for a complete packet.")
+            self.feed(chunk)
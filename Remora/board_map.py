@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+board_map.py
+
+Compile remora_config.csv (MODULE, MEZJACK, SOFTSEQ: which lamp board sits
+on which mezzanine jack, and at which position in the chain) into integer
+bitmasks for the 120-bit lamp chain (lamp_chain.py), so a pattern such as
+"B1,B3,B10" becomes its chain word by table lookups and an OR.
+
+Chain layout, as lamps.py shifts it: chain position (SOFTSEQ) k holds bits
+LAMPS_PER_BOARD*(SLOTS-1-k) .. +LAMPS_PER_BOARD-1, lamp j of the board
+being the j-th of those bits. Positions whose MODULE is SKIP have no board
+and are never lit.
+
+Pattern tokens (case-insensitive, comma-separated):
+
+    B10       every lamp on board B10
+    B10.3     lamp 3 (1-6) of board B10
+    J9        every lamp on the board plugged into jack J9
+    B, S      every board whose name starts with that letter
+    ALL       every board
+
+Public API:
+
+    load_board_map(path=DEFAULT_MAP) -> BoardMap
+
+    BoardMap
+        - board_map.word(pattern): the chain word for a pattern string or a
+          list of tokens; ValueError names any unknown token.
+        - board_map.mask(token): one token's mask.
+        - board_map.describe(word): {board: [lit lamps 1-6]} for a word.
+        - board_map.bits(word): the word as a NumPy bool array in shift
+          order (bit 0 first), for checking patterns offline.
+        - board_map.boards, board_map.skipped, board_map.slot_mask(k)
+
+CLI:
+    python3 board_map.py                 # print the compiled map
+    python3 board_map.py "B1,B3,B10"     # word for a pattern, and what it lights
+"""
+
+import argparse
+import csv
+import functools
+import operator
+import os
+import sys
+
+try:
+    import numpy as np
+except ImportError:  # only bits() needs NumPy
+    np = None
+
+from lamp_chain import BOARDS, LAMPS_PER_BOARD
+
+DEFAULT_MAP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "remora_config.csv")
+
+SKIP = "SKIP"
+BOARD_MASK = (1 << LAMPS_PER_BOARD) - 1
+
+
+class BoardMap:
+
+    def __init__(self, rows, slots=BOARDS):
+        """rows: (module, jack, softseq) tuples, as in remora_config.csv."""
+        self.slots = slots
+        self.n_bits = slots * LAMPS_PER_BOARD
+        self.boards = {}      # module -> softseq
+        self.jacks = {}       # module -> jack
+        self.skipped = []     # softseqs with no board
+        seen = {}
+        for module, jack, seq in rows:
+            if not 0 <= seq < slots:
+                raise ValueError(f"{module}: SOFTSEQ {seq} outside 0..{slots - 1}")
+            if seq in seen:
+                raise ValueError(f"SOFTSEQ {seq} used by both {seen[seq]} and {module}")
+            seen[seq] = module
+            if module.upper() == SKIP:
+                self.skipped.append(seq)
+                continue
+            if module.upper() in (b.upper() for b in self.boards):
+                raise ValueError(f"Board {module} listed twice")
+            self.boards[module] = seq
+            self.jacks[module] = jack
+
+        # Every token that can appear in a pattern, precomputed
+        table = {}
+        for module, seq in self.boards.items():
+            table[module.upper()] = self.slot_mask(seq)
+            table[self.jacks[module].upper()] = self.slot_mask(seq)
+            for lamp in range(LAMPS_PER_BOARD):
+                table[f"{module.upper()}.{lamp + 1}"] = 1 << (self._offset(seq) + lamp)
+        for letter in {m[0].upper() for m in self.boards}:
+            table.setdefault(letter, functools.reduce(
+                operator.or_, (table[m.upper()] for m in self.boards
+                               if m[0].upper() == letter), 0))
+        table["ALL"] = functools.reduce(operator.or_, (table[m.upper()] for m in self.boards), 0)
+        self._table = table
+
+    def _offset(self, seq):
+        return LAMPS_PER_BOARD * (self.slots - 1 - seq)
+
+    def slot_mask(self, seq):
+        return BOARD_MASK << self._offset(seq)
+
+    def mask(self, token):
+        try:
+            return self._table[token.strip().upper()]
+        except KeyError:
+            raise ValueError(f"Unknown lamp token {token.strip()!r}") from None
+
+    def word(self, pattern):
+        tokens = pattern.split(",") if isinstance(pattern, str) else pattern
+        return functools.reduce(operator.or_, (self.mask(t) for t in tokens if t.strip()), 0)
+
+    def describe(self, word):
+        lit = {}
+        for module, seq in sorted(self.boards.items(), key=lambda kv: kv[1]):
+            lamps = (word >> self._offset(seq)) & BOARD_MASK
+            if lamps:
+                lit[module] = [j + 1 for j in range(LAMPS_PER_BOARD) if lamps >> j & 1]
+        return lit
+
+    def bits(self, word):
+        if np is None:
+            raise RuntimeError("NumPy is required for bit arrays.")
+        raw = np.frombuffer(word.to_bytes((self.n_bits + 7) // 8, "little"), dtype=np.uint8)
+        return np.unpackbits(raw, bitorder="little")[:self.n_bits].astype(bool)
+
+
+def load_board_map(path=DEFAULT_MAP):
+    rows = []
+    with open(path, newline="") as f:
+        for lineno, row in enumerate(csv.DictReader(f), start=2):
+            try:
+                rows.append((row["MODULE"].strip(), row["MEZJACK"].strip(), int(row["SOFTSEQ"])))
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"{path} line {lineno}: bad row {row} ({e})") from None
+    return BoardMap(rows)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compile remora_config.csv into lamp chain masks.")
+    ap.add_argument("pattern", nargs="?", help='e.g. "B1,B3,B10" or "S,B1.2"')
+    ap.add_argument("--map", default=DEFAULT_MAP, help="board map CSV")
+    args = ap.parse_args()
+
+    bmap = load_board_map(args.map)
+    if args.pattern is None:
+        for module, seq in sorted(bmap.boards.items(), key=lambda kv: kv[1]):
+            print(f"{module:5s} {bmap.jacks[module]:4s} seq {seq:2d}  "
+                  f"0x{bmap.slot_mask(seq):030x}")
+        print(f"skipped slots: {bmap.skipped}")
+        return 0
+
+    try:
+        word = bmap.word(args.pattern)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(f"0x{word:030x}")
+    for module, lamps in bmap.describe(word).items():
+        print(f"  {module}: lamps {','.join(map(str, lamps))}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
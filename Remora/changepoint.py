@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+changepoint.py
+==============
+Step-jump detectors for the methane trace (sensor recalibration ticks; see
+lamp_analysis.py), and their removal.
+
+Every detector has the signature
+
+    detector(x, k) -> [(index_of_new_sample, shift), ...]
+
+with k in the same unit throughout: sigma = 1.4826 * MAD of the first
+differences, the robust sample-to-sample noise. A jump is a level change
+larger than k * sigma, so the slow drift and the lamp-cycle effect the
+analysis is after are left alone whichever detector is used.
+
+    "mad"    - first-difference outliers, |d - median(d)| > k * sigma (the
+               original lamp_analysis detector). One sample per jump; a
+               step spread over two or three samples may be missed or
+               split.
+    "cusum"  - two-sided CUSUM against a slowly tracking reference level;
+               catches steps spread over a few samples, as one jump. A
+               Python loop: about 0.15 s per 100k samples.
+    "pelt"   - penalized least-squares change-point search (PELT: optimal
+               partitioning with pruning, linear expected time when changes
+               keep coming, as they do on a drifting baseline), keeping the
+               change points whose local step exceeds k * sigma. Exact, and
+               the slowest: a few seconds per 100k samples.
+
+remove_steps(x, jumps) subtracts each shift from every later sample with
+one cumulative sum, O(n) however many jumps there are.
+
+Public API:
+
+    DETECTORS                 name -> detector
+    detect(x, k=8.0, method="mad") -> jumps
+    remove_steps(x, jumps) -> corrected copy of x
+    noise_sigma(x)            the sigma above
+
+CLI (compare detectors on the same logs):
+    python3 changepoint.py <logfile> [...] [--k 8] [--method mad cusum pelt]
+"""
+from __future__ import annotations
+import argparse, sys, time
+import numpy as np
+
+# cusum: reference tracking rate (per sample) while no excursion is under
+# way, and the per-sample slack (in sigmas) an excursion must beat to grow
+CUSUM_ALPHA = 0.01
+CUSUM_SLACK = 1.0
+
+# cusum, pelt: samples used to measure a step's level either side of it
+STEP_WINDOW = 12
+
+
+def noise_sigma(x: np.ndarray) -> float:
+    d = np.diff(x)
+    mad = np.median(np.abs(d - np.median(d)))
+    return 1.4826 * mad if mad > 0 else float(np.std(d))
+
+
+def remove_steps(x: np.ndarray, jumps: list[tuple[int, float]]) -> np.ndarray:
+    """x with each jump's shift subtracted from its sample onwards."""
+    steps = np.zeros(len(x))
+    for i, shift in jumps:
+        steps[i] += shift
+    return x - np.cumsum(steps)
+
+
+def mad_jumps(x: np.ndarray, k: float = 8.0) -> list[tuple[int, float]]:
+    d = np.diff(x)
+    med = np.median(d)
+    thr = k * noise_sigma(x)
+    return [(int(i + 1), float(d[i])) for i in np.flatnonzero(np.abs(d - med) > thr)]
+
+
+def cusum_jumps(x: np.ndarray, k: float = 8.0) -> list[tuple[int, float]]:
+    """
+    Page's two-sided CUSUM on (x - ref) / sigma. ref follows the baseline
+    (EWMA, CUSUM_ALPHA) only while neither sum is growing, so it is still
+    the pre-step level when an alarm fires. The step starts just after the
+    sum last sat at zero; its shift is the mean of the STEP_WINDOW samples
+    after the alarm (by then a step spread over a few samples is complete)
+    less ref. Excursions smaller than k * sigma are absorbed into ref rather
+    than reported.
+    """
+    n = len(x)
+    if n < 2:
+        return []
+    sigma = noise_sigma(x)
+    if sigma == 0:
+        return mad_jumps(x, k)
+    z = (x - x[0]) / sigma       # work in sigmas; shifts converted back below
+    jumps = []
+    ref = 0.0
+    gp = gn = 0.0
+    tp = tn = 0                  # last sample each sum was at zero
+    for i in range(1, n):
+        r = z[i] - ref
+        gp = max(0.0, gp + r - CUSUM_SLACK)
+        gn = max(0.0, gn - r - CUSUM_SLACK)
+        if gp == 0.0:
+            tp = i
+        if gn == 0.0:
+            tn = i
+        if gp > k or gn > k:
+            start = (tp if gp > k else tn) + 1
+            shift = float(z[i:i + STEP_WINDOW].mean()) - ref
+            if abs(shift) > k:
+                jumps.append((start, float(shift * sigma)))
+            ref += shift
+            gp = gn = 0.0
+            tp = tn = i
+        elif gp == 0.0 and gn == 0.0:
+            ref += CUSUM_ALPHA * r
+    return jumps
+
+
+def _pelt(z: np.ndarray, penalty: float) -> list[int]:
+    """Change points (segment starts) minimizing squared error + penalty each."""
+    n = len(z)
+    s1 = np.r_[0.0, np.cumsum(z)]
+    s2 = np.r_[0.0, np.cumsum(z * z)]
+    f = np.empty(n + 1)
+    f[0] = -penalty
+    last = np.zeros(n + 1, dtype=int)
+    cand = np.array([0])
+    for t in range(1, n + 1):
+        length = t - cand
+        seg = s1[t] - s1[cand]
+        cost = f[cand] + (s2[t] - s2[cand]) - seg * seg / length + penalty
+        best = int(np.argmin(cost))
+        f[t] = cost[best]
+        last[t] = cand[best]
+        # Prune candidates that can never beat t again
+        cand = np.r_[cand[cost - penalty <= f[t]], t]
+    cps = []
+    t = last[n]
+    while t > 0:
+        cps.append(int(t))
+        t = last[t]
+    return cps[::-1]
+
+
+def pelt_jumps(x: np.ndarray, k: float = 8.0,
+               penalty: float | None = None) -> list[tuple[int, float]]:
+    """
+    PELT on x / sigma with a BIC-style penalty (default 2 ln n). A step
+    spread over a few samples comes out as change points a sample or two
+    apart; those within STEP_WINDOW / 4 of each other are taken as one.
+    Each step is measured over up to STEP_WINDOW samples either side
+    (within the neighbouring segments); steps over k * sigma are jumps.
+    """
+    n = len(x)
+    if n < 2:
+        return []
+    sigma = noise_sigma(x)
+    if sigma == 0:
+        return mad_jumps(x, k)
+    # Each sample's noise is sigma / sqrt(2) when sigma comes from differences
+    z = x / (sigma / np.sqrt(2))
+    cps = _pelt(z - z.mean(), 2 * np.log(n) if penalty is None else penalty)
+
+    groups = []
+    for cp in cps:
+        if groups and cp - groups[-1][-1] <= STEP_WINDOW // 4:
+            groups[-1].append(cp)
+        else:
+            groups.append([cp])
+    jumps = []
+    for j, g in enumerate(groups):
+        lo = groups[j - 1][-1] if j else 0
+        hi = groups[j + 1][0] if j + 1 < len(groups) else n
+        a, b = g[0], g[-1]
+        shift = float(x[b:min(hi, b + STEP_WINDOW)].mean()
+                      - x[max(lo, a - STEP_WINDOW):a].mean())
+        if abs(shift) > k * sigma:
+            jumps.append((a, shift))
+    return jumps
+
+
+DETECTORS = {"mad": mad_jumps, "cusum": cusum_jumps, "pelt": pelt_jumps}
+
+
+def detect(x: np.ndarray, k: float = 8.0, method: str = "mad") -> list[tuple[int, float]]:
+    try:
+        detector = DETECTORS[method]
+    except KeyError:
+        raise ValueError(f"Unknown jump detector {method!r} "
+                         f"(expected {', '.join(DETECTORS)})") from None
+    return detector(np.asarray(x, dtype=float), k)
+
+
+def main():
+    from lamp_analysis import load_logs
+
+    ap = argparse.ArgumentParser(description="Compare step-jump detectors on lamp logs.")
+    ap.add_argument("logfile", nargs="+")
+    ap.add_argument("--k", type=float, default=8.0,
+                    help="Jump threshold in MAD-scaled sigmas (default 8)")
+    ap.add_argument("--method", nargs="+", default=list(DETECTORS), choices=list(DETECTORS))
+    args = ap.parse_args()
+
+    df, _ = load_logs(args.logfile)
+    x = df["methane"].values
+    print(f"{len(x)} samples, sigma = {noise_sigma(x):.5f} ppm")
+    found = {}
+    for method in args.method:
+        t0 = time.perf_counter()
+        jumps = detect(x, args.k, method)
+        corrected = remove_steps(x, jumps)
+        dt = time.perf_counter() - t0
+        found[method] = {i for i, _ in jumps}
+        print(f"{method:6s} {len(jumps):4d} jumps  {dt * 1000:8.1f} ms  "
+              f"net shift {sum(s for _, s in jumps):+.4f} ppm  "
+              f"corrected range {np.ptp(corrected):.4f} ppm")
+    for a in args.method:
+        for b in args.method:
+            if a < b:
+                # Same jump if within 3 samples
+                near = sum(1 for i in found[a] if any(abs(i - j) <= 3 for j in found[b]))
+                print(f"{a} vs {b}: {near} of {len(found[a])} {a} jumps also found by {b}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+config_watcher.py
+
+Change notification for lamp.config, so run.py can act on a new config
+within milliseconds of it being written instead of on its next poll.
+
+Public API:
+
+    ConfigWatcher(path)
+        - Watch one file. Uses Linux inotify on the file's directory, which
+          catches both in-place rewrites (what `cp` does) and editors that
+          save by renaming a temp file over the original. Where inotify is
+          not available it falls back to polling the file's mtime/size and,
+          once those have settled, a content hash.
+        - watcher.mode is "inotify" or "poll".
+
+    watcher.wait(timeout)
+        - Block for up to timeout seconds.
+        - Returns the file's mtime in ns (same clock as time.time_ns()) if
+          its content changed, or None if nothing changed in time. Rewrites
+          that leave the content identical are not reported.
+
+    watcher.close()
+        - Release the inotify descriptor.
+"""
+
+import ctypes
+import ctypes.util
+import hashlib
+import os
+import select
+import struct
+import time
+
+# inotify constants from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO    = 0x00000080
+IN_NONBLOCK    = os.O_NONBLOCK
+IN_CLOEXEC     = 0o2000000
+
+# struct inotify_event { int wd; uint32 mask; uint32 cookie; uint32 len; char name[]; }
+_EVENT = struct.Struct("iIII")
+
+# Stat interval for the polling fallback (seconds)
+POLL_INTERVAL = 0.1
+
+
+def _load_libc():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class ConfigWatcher:
+    """Report content changes to a single file; see module docstring."""
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self._dir, self._name = os.path.split(self.path)
+        self._name_bytes = os.fsencode(self._name)
+        self._fd = None
+        self._stat_sig = self._stat_signature()
+        self._pending_sig = None
+        self._digest = self._content_digest()
+        self.mode = "poll"
+
+        libc = _load_libc()
+        if libc is None:
+            return
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return
+        wd = libc.inotify_add_watch(fd, os.fsencode(self._dir), IN_CLOSE_WRITE | IN_MOVED_TO)
+        if wd < 0:
+            os.close(fd)
+            return
+        self._fd = fd
+        self.mode = "inotify"
+
+    # ------------------------------------------------------------------
+
+    def _stat_signature(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def _content_digest(self):
+        try:
+            with open(self.path, "rb") as f:
+                return hashlib.sha1(f.read()).digest()
+        except OSError:
+            return None
+
+    def _check(self, settle=False):
+        """
+        Return mtime_ns if the content differs from last time, else None.
+
+        With settle=True (polling), a new stat signature must be seen on two
+        consecutive polls before the file is read, so a copy caught halfway
+        through (truncated, partly written) is not reported as the new
+        content. inotify needs no settling: IN_CLOSE_WRITE fires only once
+        the writer is done.
+        """
+        sig = self._stat_signature()
+        if sig is None or sig == self._stat_sig:
+            self._pending_sig = None
+            return None
+        if settle and sig != self._pending_sig:
+            self._pending_sig = sig
+            return None
+        self._pending_sig = None
+        self._stat_sig = sig
+        digest = self._content_digest()
+        if digest is None or digest == self._digest:
+            return None
+        self._digest = digest
+        return sig[2]
+
+    def _drain_events(self):
+        """Read pending inotify events; True if any named our file."""
+        hit = False
+        while True:
+            try:
+                buf = os.read(self._fd, 4096)
+            except BlockingIOError:
+                return hit
+            if not buf:
+                return hit
+            off = 0
+            while off + _EVENT.size <= len(buf):
+                _wd, _mask, _cookie, name_len = _EVENT.unpack_from(buf, off)
+                name = buf[off + _EVENT.size: off + _EVENT.size + name_len].rstrip(b"\0")
+                if name == self._name_bytes:
+                    hit = True
+                off += _EVENT.size + name_len
+
+    # ------------------------------------------------------------------
+
+    def wait(self, timeout):
+        deadline = time.monotonic() + max(0.0, timeout)
+        while True:
+            remaining = deadline - time.monotonic()
+            if self._fd is not None:
+                ready, _, _ = select.select([self._fd], [], [], max(0.0, remaining))
+                if ready and self._drain_events():
+                    changed = self._check()
+                    if changed is not None:
+                        return changed
+            else:
+                changed = self._check(settle=True)
+                if changed is not None:
+                    return changed
+                time.sleep(max(0.0, min(POLL_INTERVAL, remaining)))
+            if time.monotonic() >= deadline:
+                return None
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
@@ -22,11 +22,15 @@ Lamp state is inferred one of two ways, depending on what the log contains:
 Baseline step-jumps in the methane trace (sensor recalibration ticks,
 unrelated to the lamp cycle) are detected and removed.
 
+Parsed logs are cached in .lamp_cache/ beside them (see parse_file), so
+rerunning on the same or a growing set of logs only parses what is new.
+
 Usage:
-    python3 lamp_analysis.py <logfile> [-o report.pdf]
+    python3 lamp_analysis.py <logfile> [-o report.pdf] [--no-cache] [--jobs N]
 """
 from __future__ import annotations
-import argparse, re, sys, io
+import argparse, hashlib, os, re, sys, io, zipfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from dataclasses import dataclass
 import numpy as np
@@ -45,6 +49,8 @@ from reportlab.platypus import (
     SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image, PageBreak,
 )
 
+import changepoint
+
 
 # ---------------------------------------------------------------------------
 # 1. PARSING
@@ -53,54 +59,202 @@ LINE_RE = re.compile(
     r"time=(?P<t>\S+)\s+methane=(?P<m>[\w.\-]+)\s+"
     r"windspeed=(?P<w>[\w.\-]+)\s+current=(?P<c>[\w.\-]+)"
 )
+QUAD_RE = re.compile(r"^(?P<t>\S+).*Quad (?P<name>\w+) set to (?P<state>ON|OFF)")
 
+# Parsed columns are cached per log file in CACHE_DIR next to the log, as
+# .npz, so a rerun (or lamp_lag_scan.py after lamp_analysis.py) only parses
+# files that are new or have changed. An entry is reused outright while the
+# file's size and mtime match; otherwise the file is hashed, and if what was
+# parsed before is still its prefix (the live log, appended to since) only
+# the new tail is parsed. Anything else is parsed from scratch.
+CACHE_DIR = ".lamp_cache"
+CACHE_VERSION = 1
 
-def parse_log(paths: list[str]) -> pd.DataFrame:
-    """Parse one or more log files, concatenate, sort by time, dedupe."""
-    rows = []
-    for path in paths:
-        with open(path) as fh:
-            for line in fh:
-                if "Sensors:" not in line:
-                    continue
-                m = LINE_RE.search(line)
-                if not m:
-                    continue
-                def _f(x):
-                    try: return float(x)
-                    except ValueError: return np.nan
-                rows.append((
-                    datetime.fromisoformat(m["t"]),
-                    _f(m["m"]), _f(m["w"]), _f(m["c"]),
-                ))
-    df = pd.DataFrame(rows, columns=["time", "methane", "windspeed", "current"])
-    df = df.dropna(subset=["methane", "current"])
-    df = df.sort_values("time").drop_duplicates(subset="time", keep="first")
-    return df.reset_index(drop=True)
-
+SENSOR_COLUMNS = ("time", "methane", "windspeed", "current")
+QUAD_COLUMNS = ("quad_time", "quad_name", "quad_on")
 
-QUAD_RE = re.compile(r"^(?P<t>\S+).*Quad (?P<name>\w+) set to (?P<state>ON|OFF)")
 
+def _scan_lines(lines: list[str]) -> dict[str, np.ndarray]:
+    """
+    Sensor columns and quad events from complete log lines, in one pass.
 
-def parse_quad_events(paths: list[str]) -> list[tuple[datetime, str, bool]]:
-    """Parse 'Quad <name> set to ON/OFF' events from one or more log files."""
-    events = []
-    for path in paths:
-        with open(path) as fh:
-            for line in fh:
-                m = QUAD_RE.search(line)
-                if not m:
-                    continue
-                try:
-                    t = datetime.fromisoformat(m["t"])
-                except ValueError:
-                    continue
+    Lines are "<time> [<LEVEL>] <message>"; each is classified by how its
+    message starts, so the regexes only run on the lines they can match.
+    """
+    ts, ms, ws, cs = [], [], [], []
+    qt, qn, qo = [], [], []
+    for line in lines:
+        msg = line.find("] ") + 2
+        if line.startswith("Sensors:", msg):
+            m = LINE_RE.search(line, msg)
+            if m:
+                ts.append(m["t"]); ms.append(m["m"]); ws.append(m["w"]); cs.append(m["c"])
+        elif line.startswith("Quad ", msg):
+            m = QUAD_RE.match(line)
+            if not m:
+                continue
+            try:
                 # Sensor timestamps (used for df["time"]) are naive local
                 # time; strip the offset here so the two are comparable.
-                t = t.replace(tzinfo=None)
-                events.append((t, m["name"], m["state"] == "ON"))
-    events.sort(key=lambda e: e[0])
-    return events
+                qt.append(datetime.fromisoformat(m["t"]).replace(tzinfo=None))
+            except ValueError:
+                continue
+            qn.append(m["name"]); qo.append(m["state"] == "ON")
+
+    try:
+        t = np.array(ts, dtype="datetime64[us]")
+    except ValueError:
+        t = np.array([datetime.fromisoformat(x).replace(tzinfo=None) for x in ts],
+                     dtype="datetime64[us]")
+
+    def _f(x):
+        return pd.to_numeric(np.array(x, dtype=str), errors="coerce").astype(float)
+
+    return {
+        "time": t, "methane": _f(ms), "windspeed": _f(ws), "current": _f(cs),
+        "quad_time": np.array(qt, dtype="datetime64[us]"),
+        "quad_name": np.array(qn, dtype=str),
+        "quad_on": np.array(qo, dtype=bool),
+    }
+
+
+def _cache_path(path: str) -> str:
+    head, tail = os.path.split(os.path.abspath(path))
+    return os.path.join(head, CACHE_DIR, tail + ".npz")
+
+
+def _load_cache(path: str) -> dict | None:
+    try:
+        with np.load(_cache_path(path), allow_pickle=False) as z:
+            cols = {k: z[k] for k in z.files}
+    except (OSError, ValueError, zipfile.BadZipFile):
+        return None
+    if int(cols.get("version", -1)) != CACHE_VERSION:
+        return None
+    return cols
+
+
+def _save_cache(path: str, cols: dict) -> None:
+    cpath = _cache_path(path)
+    try:
+        os.makedirs(os.path.dirname(cpath), exist_ok=True)
+        tmp = cpath + ".tmp"
+        with open(tmp, "wb") as fh:
+            np.savez(fh, **cols)
+        os.replace(tmp, cpath)
+    except OSError as e:
+        # Read-only log directory: still works, just parses every time
+        print(f"lamp_analysis: not caching {path}: {e}", file=sys.stderr)
+
+
+def _is_fresh(cached: dict | None, st: os.stat_result) -> bool:
+    return (cached is not None and int(cached["size"]) == st.st_size
+            and int(cached["mtime_ns"]) == st.st_mtime_ns)
+
+
+def parse_file(path: str, cache: bool = True) -> dict[str, np.ndarray]:
+    """
+    Parsed columns (SENSOR_COLUMNS + QUAD_COLUMNS, file order, nothing
+    dropped) for one log file, from the cache where still valid.
+    """
+    st = os.stat(path)
+    cached = _load_cache(path) if cache else None
+    if _is_fresh(cached, st):
+        return cached
+
+    with open(path, "rb") as fh:
+        data = fh.read()
+    # Parse complete lines only; a line still being written is picked up
+    # next time
+    end = data.rfind(b"\n") + 1
+    start = 0
+    if cached is not None:
+        offset = int(cached["offset"])
+        if (offset <= end and
+                hashlib.blake2b(data[:offset]).hexdigest() == str(cached["digest"])):
+            start = offset
+
+    cols = _scan_lines(data[start:end].decode(errors="replace").splitlines())
+    if start:
+        cols = {k: np.concatenate([cached[k], cols[k]])
+                for k in SENSOR_COLUMNS + QUAD_COLUMNS}
+    if cache:
+        cols.update(version=CACHE_VERSION, size=st.st_size, mtime_ns=st.st_mtime_ns,
+                    offset=end, digest=hashlib.blake2b(data[:end]).hexdigest())
+        _save_cache(path, cols)
+    return cols
+
+
+def _parse_files(paths: list[str], cache: bool, jobs: int | None) -> list[dict]:
+    """
+    parse_file() for every path, in order. Files the cache already holds are
+    loaded here; the rest are parsed in a pool of up to jobs processes
+    (default: one per core), one file per task.
+    """
+    parsed = [None] * len(paths)
+    todo = []
+    for i, path in enumerate(paths):
+        cached = _load_cache(path) if cache else None
+        if _is_fresh(cached, os.stat(path)):
+            parsed[i] = cached
+        else:
+            todo.append(i)
+
+    jobs = min(jobs or os.cpu_count() or 1, len(todo))
+    if jobs > 1:
+        with ProcessPoolExecutor(jobs) as pool:
+            results = pool.map(parse_file, [paths[i] for i in todo], [cache] * len(todo))
+            for i, cols in zip(todo, results):
+                parsed[i] = cols
+    else:
+        for i in todo:
+            parsed[i] = parse_file(paths[i], cache)
+    return parsed
+
+
+def _merge_sensors(parsed: list[dict]) -> pd.DataFrame:
+    """Concatenate, drop unreadable samples, sort by time, dedupe."""
+    cols = {k: np.concatenate([c[k] for c in parsed]) if parsed else np.array([])
+            for k in SENSOR_COLUMNS}
+    keep = ~(np.isnan(cols["methane"]) | np.isnan(cols["current"]))
+    cols = {k: v[keep] for k, v in cols.items()}
+    # Stable sort, so of samples sharing a timestamp the first logged wins
+    order = np.argsort(cols["time"], kind="stable")
+    t = cols["time"][order]
+    first = np.r_[True, t[1:] != t[:-1]] if len(t) else np.zeros(0, dtype=bool)
+    return pd.DataFrame({k: v[order][first] for k, v in cols.items()},
+                        columns=list(SENSOR_COLUMNS))
+
+
+def _merge_quads(parsed: list[dict]) -> list[tuple[datetime, str, bool]]:
+    if not parsed:
+        return []
+    t = np.concatenate([c["quad_time"] for c in parsed])
+    names = np.concatenate([c["quad_name"] for c in parsed])
+    on = np.concatenate([c["quad_on"] for c in parsed])
+    order = np.argsort(t, kind="stable")
+    return list(zip(t[order].tolist(), names[order].tolist(), on[order].tolist()))
+
+
+def load_logs(paths: list[str], cache: bool = True, jobs: int | None = None
+              ) -> tuple[pd.DataFrame, list[tuple[datetime, str, bool]]]:
+    """
+    Sensor samples (as parse_log) and quad events (as parse_quad_events)
+    from one scan of each log file.
+    """
+    parsed = _parse_files(paths, cache, jobs)
+    return _merge_sensors(parsed), _merge_quads(parsed)
+
+
+def parse_log(paths: list[str], cache: bool = True, jobs: int | None = None) -> pd.DataFrame:
+    """Parse one or more log files, concatenate, sort by time, dedupe."""
+    return _merge_sensors(_parse_files(paths, cache, jobs))
+
+
+def parse_quad_events(paths: list[str], cache: bool = True, jobs: int | None = None
+                      ) -> list[tuple[datetime, str, bool]]:
+    """Parse 'Quad <name> set to ON/OFF' events from one or more log files."""
+    return _merge_quads(_parse_files(paths, cache, jobs))
 
 
 def lamp_state_from_quads(
@@ -116,26 +270,33 @@ def lamp_state_from_quads(
               excluded from the ON/OFF comparison.
 
     Returns the state array and the count of ramp samples.
+
+    Vectorized: the number of quads on after each event is a cumulative
+    sum of the events that actually change a quad's state, and each
+    sample looks up how many events precede it with np.searchsorted.
     """
-    quad_names = sorted({name for _, name, _ in events})
-    n_quads = len(quad_names)
-    on = {name: False for name in quad_names}
-    lamp = np.zeros(len(times), dtype=int)
-    ei = 0
-    n_on = 0
-    for i, t in enumerate(times):
-        while ei < len(events) and events[ei][0] <= t:
-            _, name, is_on = events[ei]
-            if on[name] != is_on:
-                on[name] = is_on
-                n_on += 1 if is_on else -1
-            ei += 1
-        if n_on == n_quads:
-            lamp[i] = 1
-        elif n_on == 0:
-            lamp[i] = 0
-        else:
-            lamp[i] = -1
+    t = np.asarray(times, dtype="datetime64[ns]")
+    if not events:
+        # No quads, so "every quad on" holds trivially
+        return np.ones(len(t), dtype=int), 0
+    ev_t = np.array([e[0] for e in events], dtype="datetime64[ns]")
+    order = np.argsort(ev_t, kind="stable")
+    ev_t = ev_t[order]
+    _, quad = np.unique([e[1] for e in events], return_inverse=True)
+    quad = quad[order]
+    is_on = np.array([e[2] for e in events], dtype=int)[order]
+    n_quads = int(quad.max()) + 1
+
+    # Each quad's previous state (off before its first event); redundant
+    # repeats of the same state change nothing
+    by_quad = np.argsort(quad, kind="stable")
+    prev = np.zeros_like(is_on)
+    same = quad[by_quad][1:] == quad[by_quad][:-1]
+    prev[by_quad[1:][same]] = is_on[by_quad[:-1][same]]
+    n_on = np.r_[0, np.cumsum(is_on - prev)]
+
+    n = n_on[np.searchsorted(ev_t, t, side="right")]
+    lamp = np.where(n == n_quads, 1, np.where(n == 0, 0, -1))
     n_ramp = int(np.sum(lamp == -1))
     return lamp, n_ramp
 
@@ -204,31 +365,23 @@ def infer_lamp_state(current: np.ndarray) -> tuple[np.ndarray, float]:
 # ---------------------------------------------------------------------------
 # 3. JUMP CORRECTION
 # ---------------------------------------------------------------------------
-def correct_jumps(methane: np.ndarray, k: float = 8.0) -> tuple[np.ndarray, list[tuple[int, float]]]:
+def correct_jumps(methane: np.ndarray, k: float = 8.0,
+                  method: str = "mad") -> tuple[np.ndarray, list[tuple[int, float]]]:
     """
     Detect and remove step-level shifts in the methane series.
 
-    A jump is a first-difference outlier: |Δ| > k * (1.4826 * MAD(Δ)).
-    The default k=8 targets shifts far outside normal sample-to-sample noise
-    without touching the ~0.01 ppm ordinary fluctuations.
+    method picks the detector (see changepoint.py). The default, "mad",
+    flags first-difference outliers: |Δ| > k * (1.4826 * MAD(Δ)). The
+    default k=8 targets shifts far outside normal sample-to-sample noise
+    without touching the ~0.01 ppm ordinary fluctuations; "cusum" and
+    "pelt" use the same k.
 
     Returns:
       corrected : methane series with subsequent-value offsets removed
       jumps     : list of (index_of_new_sample, shift_magnitude)
     """
-    d = np.diff(methane)
-    med = np.median(d)
-    mad = np.median(np.abs(d - med))
-    sigma = 1.4826 * mad if mad > 0 else np.std(d)
-    thr = k * sigma
-    jump_idx = np.where(np.abs(d - med) > thr)[0]
-    corrected = methane.copy()
-    jumps = []
-    for i in jump_idx:
-        shift = d[i]
-        corrected[i + 1:] -= shift
-        jumps.append((int(i + 1), float(shift)))
-    return corrected, jumps
+    jumps = changepoint.detect(methane, k, method)
+    return changepoint.remove_steps(methane, jumps), jumps
 
 
 # ---------------------------------------------------------------------------
@@ -425,7 +578,7 @@ def fmt_p(p: float) -> str:
 
 def build_pdf(out_pdf, plot_png, df, cycles, jumps, group, cycle_test,
               wind, reg, thr, n_trimmed, n_wind_faults, lamp_method="current",
-              n_ramp=0):
+              n_ramp=0, jump_method="mad", jump_k=8.0):
     doc = SimpleDocTemplate(out_pdf, pagesize=letter,
                             leftMargin=0.6*inch, rightMargin=0.6*inch,
                             topMargin=0.6*inch, bottomMargin=0.6*inch)
@@ -472,9 +625,14 @@ def build_pdf(out_pdf, plot_png, df, cycles, jumps, group, cycle_test,
             f"Lamp state was inferred from driver current using a bimodal split at "
             f"threshold <b>{thr:.3f} A</b> (below = OFF, above = ON). "
             f"Cycles identified: {n_on_c} ON, {n_off_c} OFF.", body))
+    detected_as = {
+        "mad": "first-difference outliers",
+        "cusum": "two-sided CUSUM alarms",
+        "pelt": "penalized (PELT) change points",
+    }[jump_method]
     els.append(Paragraph(
-        f"Baseline step-jumps were detected as first-difference outliers "
-        f"(|Δ| &gt; 8·MAD-scaled σ) and removed by subtracting each shift from "
+        f"Baseline step-jumps were detected as {detected_as} "
+        f"(|Δ| &gt; {jump_k:g}·MAD-scaled σ) and removed by subtracting each shift from "
         f"subsequent samples. Jumps corrected: <b>{len(jumps)}</b>.", body))
     if jumps:
         rows = [["#", "sample idx", "time", "shift (ppm)"]]
@@ -632,14 +790,19 @@ def main():
     ap.add_argument("-o", "--out", default="lamp_report.pdf")
     ap.add_argument("--jump-k", type=float, default=8.0,
                     help="Jump-detection threshold in MAD-scaled sigmas (default 8)")
+    ap.add_argument("--jump-method", default="mad", choices=list(changepoint.DETECTORS),
+                    help="Jump detector (default mad; see changepoint.py)")
+    ap.add_argument("--no-cache", action="store_true",
+                    help="parse every log from scratch (cache: .lamp_cache/ next to the logs)")
+    ap.add_argument("--jobs", type=int, default=None,
+                    help="processes for parsing uncached logs (default: one per core)")
     args = ap.parse_args()
 
-    df = parse_log(args.logfile)
+    df, quad_events = load_logs(args.logfile, cache=not args.no_cache, jobs=args.jobs)
     df.attrs["source"] = ", ".join(args.logfile)
     if len(df) < 100:
         sys.exit(f"Too few valid samples parsed ({len(df)}).")
 
-    quad_events = parse_quad_events(args.logfile)
     if quad_events:
         lamp_method = "quad-log"
         thr = None
@@ -653,7 +816,8 @@ def main():
     df, n_trimmed = trim_to_experiment(df)
     if len(df) < 100:
         sys.exit(f"Too few samples after trim ({len(df)}).")
-    df["methane_corr"], jumps = correct_jumps(df["methane"].values, k=args.jump_k)
+    df["methane_corr"], jumps = correct_jumps(df["methane"].values, k=args.jump_k,
+                                               method=args.jump_method)
     df["windspeed"], n_wind_faults = clean_windspeed(df["windspeed"].values)
 
     cycles  = segment_cycles(df)
@@ -669,7 +833,8 @@ def main():
     png = "/tmp/_lamp_plot.png"
     make_plot(df, cycles, png)
     build_pdf(args.out, png, df, cycles, jumps, group, cyc_t, wind, reg, thr,
-              n_trimmed, n_wind_faults, lamp_method, n_ramp)
+              n_trimmed, n_wind_faults, lamp_method, n_ramp,
+              args.jump_method, args.jump_k)
     print(f"Wrote {args.out}  ({len(df)} samples, {n_trimmed} trimmed, "
           f"{n_ramp} ramp samples excluded, {len(cycles)} cycles, "
           f"{len(jumps)} jumps corrected, {n_wind_faults} wind faults interpolated)")
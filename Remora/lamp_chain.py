@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+lamp_chain.py
+
+Driver for the serial lamp chain: 20 boards x 6 lamps = 120 bits shifted
+in on DATA/CLOCK, bracketed by STROBE and followed by ENABLE, exactly the
+sequence lamps.py bit-bangs:
+
+    STROBE high
+    for each bit, least significant first: DATA = bit, CLOCK pulse
+    STROBE low
+    (latch settle)
+    ENABLE high            (all_off(): ENABLE low)
+
+lamps.py sleeps 10 ms per clock pulse and 100 ms after the strobe, so an
+update takes over a second with the lamps in between states the whole
+time. Here the same edges are driven by one of three backends:
+
+    "spi"      - spidev hardware SPI: the 120 bits go out as one 15-byte
+                 transfer (mode 0, so DATA is set up before each rising
+                 CLOCK edge, as in the bit-bang path). SPI has fixed pins:
+                 the chain's DATA/CLOCK must be on MOSI/SCLK of SPI_BUS
+                 (GPIO 10/11 for SPI0) rather than GPIO 13/6. STROBE and
+                 ENABLE stay ordinary GPIO.
+    "waveform" - pigpio DMA-timed waveform on the existing pins: the whole
+                 strobe-and-shift sequence is built once per update and
+                 played out by DMA with microsecond edges. Needs the
+                 pigpiod daemon.
+    "bitbang"  - gpiozero, one call per edge, without the sleeps.
+
+"auto" picks waveform if pigpiod answers, else bitbang; spi is used only
+when asked for, since it needs the rewiring above.
+
+Public API:
+
+    LampChain(backend="auto", n_bits=CHAIN_BITS)
+        - chain.write(state): shift state (an int, bit i = lamp i) and
+          enable it.
+        - chain.all_off(): shift zeros and drop ENABLE.
+        - chain.shift(state), chain.set_enable(on): the two halves, for
+          callers with their own enable sequencing.
+        - chain.state, chain.backend_name, chain.close().
+
+CLI:
+    python3 lamp_chain.py --state 0x3f           # write one pattern
+    python3 lamp_chain.py --bench --backend spi  # time full-chain updates
+"""
+
+import argparse
+import statistics
+import sys
+import time
+
+# BCM pins, as wired (see lamps.py)
+DATA_PIN = 13
+CLOCK_PIN = 6
+ENABLE_PIN = 19
+STROBE_PIN = 26
+
+BOARDS = 20
+LAMPS_PER_BOARD = 6
+CHAIN_BITS = BOARDS * LAMPS_PER_BOARD
+
+# Wait between STROBE low and ENABLE high (s). lamps.py used 0.1 s, which
+# was never a hardware requirement; the latch needs nanoseconds.
+LATCH_SETTLE = 10e-6
+
+# spidev
+SPI_BUS = 0
+SPI_DEVICE = 0
+SPI_HZ = 1_000_000
+
+# pigpio waveform: length of each half clock period (us)
+WAVE_HALF_PERIOD_US = 1
+
+
+def _bits_lsb_first(state, n_bits):
+    """The chain's bits in shift order: bit 0 of state first."""
+    return [(state >> i) & 1 for i in range(n_bits)]
+
+
+# ----------------------------------------------------------------------
+# Backends: shift(state, n_bits) drives STROBE high, the bits and STROBE
+# low; set_enable(on) drives ENABLE.
+# ----------------------------------------------------------------------
+
+class _BitBangBackend:
+    """The original gpiozero path (one library call per edge, no sleeps)."""
+
+    name = "bitbang"
+
+    def __init__(self):
+        from gpiozero import DigitalOutputDevice
+        self.data = DigitalOutputDevice(DATA_PIN, initial_value=False)
+        self.clock = DigitalOutputDevice(CLOCK_PIN, initial_value=False)
+        self.enable = DigitalOutputDevice(ENABLE_PIN, initial_value=False)
+        self.strobe = DigitalOutputDevice(STROBE_PIN, initial_value=False)
+
+    def shift(self, state, n_bits):
+        self.strobe.on()
+        for bit in _bits_lsb_first(state, n_bits):
+            self.data.value = bit
+            self.clock.on()
+            self.clock.off()
+        self.strobe.off()
+
+    def set_enable(self, on):
+        self.enable.value = on
+
+    def close(self):
+        for dev in (self.data, self.clock, self.enable, self.strobe):
+            dev.close()
+
+
+class _SpiBackend:
+    """spidev transfer for the bits; gpiozero for STROBE and ENABLE."""
+
+    name = "spi"
+
+    def __init__(self):
+        import spidev
+        from gpiozero import DigitalOutputDevice
+        self.spi = spidev.SpiDev()
+        self.spi.open(SPI_BUS, SPI_DEVICE)
+        self.spi.mode = 0
+        self.spi.max_speed_hz = SPI_HZ
+        self.enable = DigitalOutputDevice(ENABLE_PIN, initial_value=False)
+        self.strobe = DigitalOutputDevice(STROBE_PIN, initial_value=False)
+
+    def shift(self, state, n_bits):
+        if n_bits % 8:
+            raise ValueError(f"SPI backend needs a whole number of bytes, not {n_bits} bits")
+        # SPI sends each byte MSB first, so reverse the bit order to put
+        # bit 0 of state on the wire first
+        wire = int(format(state, f"0{n_bits}b")[::-1], 2)
+        self.strobe.on()
+        self.spi.writebytes2(wire.to_bytes(n_bits // 8, "big"))
+        self.strobe.off()
+
+    def set_enable(self, on):
+        self.enable.value = on
+
+    def close(self):
+        self.spi.close()
+        self.enable.close()
+        self.strobe.close()
+
+
+class _WaveformBackend:
+    """pigpio DMA waveform for the whole strobe/shift sequence."""
+
+    name = "waveform"
+
+    def __init__(self):
+        import pigpio
+        self.pigpio = pigpio
+        self.pi = pigpio.pi()
+        if not self.pi.connected:
+            raise OSError("pigpiod is not running")
+        for pin in (DATA_PIN, CLOCK_PIN, ENABLE_PIN, STROBE_PIN):
+            self.pi.set_mode(pin, pigpio.OUTPUT)
+            self.pi.write(pin, 0)
+
+    def shift(self, state, n_bits):
+        pulse = self.pigpio.pulse
+        data, clock, strobe = 1 << DATA_PIN, 1 << CLOCK_PIN, 1 << STROBE_PIN
+        half = WAVE_HALF_PERIOD_US
+        pulses = [pulse(strobe, 0, half)]
+        for bit in _bits_lsb_first(state, n_bits):
+            # DATA settles with CLOCK low, then the rising edge clocks it in
+            pulses.append(pulse(data if bit else 0, clock | (0 if bit else data), half))
+            pulses.append(pulse(clock, 0, half))
+        pulses.append(pulse(0, clock | data, half))
+        pulses.append(pulse(0, strobe, half))
+
+        self.pi.wave_clear()
+        self.pi.wave_add_generic(pulses)
+        wave = self.pi.wave_create()
+        try:
+            self.pi.wave_send_once(wave)
+            while self.pi.wave_tx_busy():
+                time.sleep(50e-6)
+        finally:
+            self.pi.wave_delete(wave)
+
+    def set_enable(self, on):
+        self.pi.write(ENABLE_PIN, 1 if on else 0)
+
+    def close(self):
+        self.pi.stop()
+
+
+_BACKENDS = {"bitbang": _BitBangBackend, "spi": _SpiBackend, "waveform": _WaveformBackend}
+
+
+def _open_backend(name):
+    if name == "auto":
+        try:
+            return _WaveformBackend()
+        except (ImportError, OSError):
+            return _BitBangBackend()
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown lamp chain backend {name!r} "
+                         f"(expected auto, {', '.join(_BACKENDS)})")
+    return _BACKENDS[name]()
+
+
+# ----------------------------------------------------------------------
+# Chain
+# ----------------------------------------------------------------------
+
+class LampChain:
+
+    def __init__(self, backend="auto", n_bits=CHAIN_BITS):
+        self.n_bits = n_bits
+        self.state = None
+        self._backend = _open_backend(backend)
+
+    @property
+    def backend_name(self):
+        return self._backend.name
+
+    def shift(self, state):
+        """STROBE high, the bits, STROBE low, latch settle; ENABLE untouched."""
+        if state < 0 or state >> self.n_bits:
+            raise ValueError(f"Lamp state 0x{state:x} does not fit in {self.n_bits} bits")
+        self._backend.shift(state, self.n_bits)
+        time.sleep(LATCH_SETTLE)
+        self.state = state
+
+    def set_enable(self, on):
+        self._backend.set_enable(on)
+
+    def write(self, state):
+        self.shift(state)
+        self.set_enable(True)
+
+    def all_off(self):
+        self.shift(0)
+        self.set_enable(False)
+
+    def close(self):
+        self._backend.close()
+
+
+# ----------------------------------------------------------------------
+# CLI
+# ----------------------------------------------------------------------
+
+def main():
+    ap = argparse.ArgumentParser(description="Drive the 120-bit lamp chain.")
+    ap.add_argument("--backend", default="auto", choices=["auto"] + list(_BACKENDS))
+    ap.add_argument("--state", type=lambda v: int(v, 0), help="pattern to write (e.g. 0x3f)")
+    ap.add_argument("--off", action="store_true", help="switch every lamp off")
+    ap.add_argument("--bench", action="store_true", help="time full-chain updates")
+    ap.add_argument("-n", type=int, default=200, help="updates for --bench")
+    args = ap.parse_args()
+
+    chain = LampChain(args.backend)
+    print(f"backend: {chain.backend_name}")
+    try:
+        if args.bench:
+            full = (1 << chain.n_bits) - 1
+            times = []
+            for i in range(args.n):
+                t0 = time.perf_counter()
+                chain.write(full if i % 2 else full // 3)   # all on / alternate lamps
+                times.append((time.perf_counter() - t0) * 1000)
+            chain.all_off()
+            times.sort()
+            print(f"n={args.n} mean={statistics.mean(times):.3f} ms "
+                  f"median={statistics.median(times):.3f} ms "
+                  f"p95={times[int(0.95 * (args.n - 1))]:.3f} ms max={times[-1]:.3f} ms")
+        elif args.off:
+            chain.all_off()
+        elif args.state is not None:
+            chain.write(args.state)
+    finally:
+        chain.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
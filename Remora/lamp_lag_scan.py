@@ -25,8 +25,9 @@ import matplotlib
 matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 
+import changepoint
 from lamp_analysis import (
-    parse_log, parse_quad_events, lamp_state_from_quads,
+    load_logs, lamp_state_from_quads,
     trim_to_experiment, correct_jumps, clean_windspeed,
     segment_cycles, per_cycle_effects, group_tests, paired_cycle_test,
 )
@@ -119,13 +120,18 @@ def main():
                     help="lag step size, in seconds (default 5, matching the sample rate)")
     ap.add_argument("--jump-k", type=float, default=8.0,
                     help="Jump-detection threshold in MAD-scaled sigmas (default 8)")
+    ap.add_argument("--jump-method", default="mad", choices=list(changepoint.DETECTORS),
+                    help="Jump detector (default mad; see changepoint.py)")
+    ap.add_argument("--no-cache", action="store_true",
+                    help="parse every log from scratch (cache: .lamp_cache/ next to the logs)")
+    ap.add_argument("--jobs", type=int, default=None,
+                    help="processes for parsing uncached logs (default: one per core)")
     args = ap.parse_args()
 
-    df = parse_log(args.logfile)
+    df, events = load_logs(args.logfile, cache=not args.no_cache, jobs=args.jobs)
     if len(df) < 100:
         sys.exit(f"Too few valid samples parsed ({len(df)}).")
 
-    events = parse_quad_events(args.logfile)
     if not events:
         sys.exit("No 'Quad ... set to ON/OFF' events found; this tool requires a "
                   "quad-log rig (see lamp_analysis.py).")
@@ -136,7 +142,8 @@ def main():
     if len(df) < 100:
         sys.exit(f"Too few samples after trim ({len(df)}).")
 
-    df["methane_corr"], jumps = correct_jumps(df["methane"].values, k=args.jump_k)
+    df["methane_corr"], jumps = correct_jumps(df["methane"].values, k=args.jump_k,
+                                               method=args.jump_method)
     df["windspeed"], n_wind_faults = clean_windspeed(df["windspeed"].values)
 
     lags = list(range(0, args.max_lag + 1, args.step))
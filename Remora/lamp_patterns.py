@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+lamp_patterns.py
+
+Pattern engine for the lamp chain: keeps the chain's current word, turns
+pattern requests (board_map.py tokens, e.g. "B1,B3,B10") into new words,
+plays timed pattern sequences, and dims boards in software by refreshing
+the chain faster than the eye can follow.
+
+The chain is a shift register, so any change re-shifts all 120 bits; the
+saving is in not shifting at all when nothing changed, and in a shift
+taking microseconds on the SPI/waveform backends (lamp_chain.py) instead
+of over a second. Every write goes through one place, which skips words
+equal to what the chain already holds and counts both.
+
+Dimming: each refresh period (DIM_PERIOD) is cut into DIM_STEPS slices. A
+board at duty d is lit for the first round(d * DIM_STEPS) slices, so the
+frames change only where some duty runs out: with boards at k distinct
+levels the chain is written at most k + 1 times per period, however many
+boards are dimmed. A slice must outlast a chain write or the duty cycle is
+distorted, so writes are timed and a slice is never shorter than
+DIM_SLICE_MARGIN times their moving average; on a slow backend (bitbang)
+the period stretches accordingly, with a warning once it is long enough to
+flicker (MAX_DIM_PERIOD).
+
+Public API:
+
+    PatternEngine(chain, board_map)
+        - engine.show(pattern): exactly these lamps fully on, others off.
+        - engine.turn_on(pattern) / turn_off(pattern): change only these.
+          All three return how many lamps changed state.
+        - engine.set_level(pattern, duty): duty 0..1 for these lamps
+          (1 = steady on, 0 = off); anything between is refreshed.
+        - engine.play(steps, start=None): queue [(duration, pattern), ...]
+          to show back to back from start (time.monotonic(), default now),
+          each switch on its own absolute deadline so timing error does
+          not accumulate. Durations as in sequencer.py ("90s", "10m", 5).
+          Returns the monotonic time the last step ends.
+        - engine.clear_queue(), engine.wait_idle(timeout=None)
+        - engine.word: current steady (undimmed) word.
+        - engine.stats(): {"writes", "unchanged", "queued", "write_time",
+          "dim_period"}.
+        - engine.close(): stop the refresh/queue thread; lamps stay as they
+          are (call chain.all_off() for dark).
+
+CLI:
+    python3 lamp_patterns.py "B1,B3" 10s "S" 10s "ALL" 5s   # play, then all off
+    python3 lamp_patterns.py --dim "B1=0.25,S=0.5" --seconds 30
+"""
+
+import argparse
+import heapq
+import itertools
+import logging
+import sys
+import threading
+import time
+
+from sequencer import parse_duration
+
+# Dimming refresh period (s) and slices per period: 100 Hz, 1.25 ms slices
+DIM_PERIOD = 0.01
+DIM_STEPS = 8
+
+# A slice lasts at least this many chain write times
+DIM_SLICE_MARGIN = 2.0
+
+# Warn when slow writes stretch the period past this (s): below ~50 Hz
+# dimmed lamps visibly flicker
+MAX_DIM_PERIOD = 0.02
+
+
+class PatternEngine:
+
+    def __init__(self, chain, board_map):
+        self.chain = chain
+        self.map = board_map
+        self.word = 0          # steady (fully on) lamps
+        self._levels = {}      # mask -> duty in (0, 1), for dimmed lamps
+        self._frames = [0]     # one word per slice of a refresh period
+        self._shown = None     # what the chain holds now
+        self._writes = 0
+        self._unchanged = 0
+        self._write_time = 0.0  # chain write time (s), moving average
+        self._warned_slow = False
+
+        self._lock = threading.RLock()
+        self._queue = []       # heap of (deadline, seq, word)
+        self._seq = itertools.count()
+        self._idle = threading.Condition(self._lock)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # -- writing -------------------------------------------------------
+
+    def _write(self, word):
+        """Shift word into the chain unless it already holds it."""
+        if word == self._shown:
+            self._unchanged += 1
+            return
+        t0 = time.perf_counter()
+        self.chain.write(word)
+        dt = time.perf_counter() - t0
+        self._write_time = dt if not self._writes else 0.8 * self._write_time + 0.2 * dt
+        self._shown = word
+        self._writes += 1
+
+    def _slice_len(self):
+        """Dimming slice length (s) for the chain's measured write time."""
+        slice_len = max(DIM_PERIOD / DIM_STEPS, DIM_SLICE_MARGIN * self._write_time)
+        if slice_len * DIM_STEPS > MAX_DIM_PERIOD and not self._warned_slow:
+            self._warned_slow = True
+            logging.warning(
+                "Lamp chain writes take %.1f ms (%s backend): dimming period "
+                "stretched to %.0f ms, lamps will flicker",
+                self._write_time * 1000, getattr(self.chain, "backend_name", "?"),
+                slice_len * DIM_STEPS * 1000)
+        return slice_len
+
+    def _rebuild(self):
+        """Recompute the refresh frames and show the first (caller holds _lock)."""
+        if not self._levels:
+            self._frames = [self.word]
+        else:
+            frames = []
+            for i in range(DIM_STEPS):
+                w = self.word
+                for mask, duty in self._levels.items():
+                    if i < round(duty * DIM_STEPS):
+                        w |= mask
+                frames.append(w)
+            self._frames = frames
+            self._ensure_thread()
+        self._write(self._frames[0])
+        self._wake.set()
+
+    def _set(self, word, keep_levels=False):
+        with self._lock:
+            changed = bin(self.word ^ word).count("1")
+            if keep_levels:
+                # Lamps switched fully on stop being dimmed
+                self._levels = {m & ~word: d for m, d in self._levels.items() if m & ~word}
+            else:
+                self._levels = {}
+            self.word = word
+            self._rebuild()
+            return changed
+
+    # -- patterns ------------------------------------------------------
+
+    def show(self, pattern):
+        return self._set(self.map.word(pattern))
+
+    def turn_on(self, pattern):
+        return self._set(self.word | self.map.word(pattern), keep_levels=True)
+
+    def turn_off(self, pattern):
+        mask = self.map.word(pattern)
+        with self._lock:
+            self._levels = {m & ~mask: d for m, d in self._levels.items() if m & ~mask}
+            return self._set(self.word & ~mask, keep_levels=True)
+
+    def set_level(self, pattern, duty):
+        if not 0.0 <= duty <= 1.0:
+            raise ValueError(f"Duty {duty} outside 0..1")
+        mask = self.map.word(pattern)
+        with self._lock:
+            levels = {m & ~mask: d for m, d in self._levels.items() if m & ~mask}
+            word = self.word & ~mask
+            if duty >= 1.0:
+                word |= mask
+            elif duty > 0.0:
+                levels[mask] = duty
+            self._levels = levels
+            self.word = word
+            self._rebuild()
+
+    # -- timed sequences -----------------------------------------------
+
+    def play(self, steps, start=None):
+        t = time.monotonic() if start is None else start
+        words = []
+        for duration, pattern in steps:
+            words.append((t, self.map.word(pattern)))
+            t += parse_duration(duration)
+        with self._lock:
+            for deadline, word in words:
+                heapq.heappush(self._queue, (deadline, next(self._seq), word))
+            self._ensure_thread()
+        self._wake.set()
+        return t
+
+    def clear_queue(self):
+        with self._lock:
+            self._queue.clear()
+            self._idle.notify_all()
+
+    def wait_idle(self, timeout=None):
+        """Block until every queued pattern has been shown."""
+        with self._lock:
+            return self._idle.wait_for(lambda: not self._queue, timeout)
+
+    def stats(self):
+        with self._lock:
+            return {"writes": self._writes, "unchanged": self._unchanged,
+                    "queued": len(self._queue), "write_time": self._write_time,
+                    "dim_period": self._slice_len() * DIM_STEPS}
+
+    # -- refresh / queue thread ----------------------------------------
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="lamp-patterns",
+                                            daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        k = 0
+        next_slice = None
+        while not self._stop.is_set():
+            with self._lock:
+                now = time.monotonic()
+                while self._queue and self._queue[0][0] <= now:
+                    _, _, word = heapq.heappop(self._queue)
+                    self._set(word)
+                    if not self._queue:
+                        self._idle.notify_all()
+
+                wake = self._queue[0][0] if self._queue else None
+                if len(self._frames) > 1:
+                    slice_len = self._slice_len()
+                    if next_slice is None or now - next_slice > slice_len * DIM_STEPS:
+                        next_slice = now    # starting, or stalled: restart phase
+                    if now >= next_slice:
+                        # A late wake-up skips the slices it missed rather
+                        # than rushing through them
+                        missed = int((now - next_slice) / slice_len)
+                        k += missed + 1
+                        next_slice += (missed + 1) * slice_len
+                        self._write(self._frames[k % len(self._frames)])
+                    wake = next_slice if wake is None else min(wake, next_slice)
+                else:
+                    next_slice = None
+            self._wake.clear()
+            self._wake.wait(None if wake is None else max(0.0, wake - time.monotonic()))
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+
+# ----------------------------------------------------------------------
+# CLI
+# ----------------------------------------------------------------------
+
+def main():
+    from board_map import load_board_map
+    from lamp_chain import LampChain
+
+    ap = argparse.ArgumentParser(description="Play lamp patterns on the chain.")
+    ap.add_argument("steps", nargs="*", help="pattern duration pattern duration ...")
+    ap.add_argument("--dim", help='token=duty,... e.g. "B1=0.25,S=0.5"')
+    ap.add_argument("--seconds", type=float, default=10.0, help="how long to hold --dim")
+    ap.add_argument("--backend", default="auto")
+    args = ap.parse_args()
+    if len(args.steps) % 2:
+        ap.error("steps come in pattern/duration pairs")
+
+    chain = LampChain(args.backend)
+    engine = PatternEngine(chain, load_board_map())
+    try:
+        if args.dim:
+            for item in args.dim.split(","):
+                token, duty = item.split("=")
+                engine.set_level(token, float(duty))
+            time.sleep(args.seconds)
+        if args.steps:
+            pairs = list(zip(args.steps[1::2], args.steps[0::2]))
+            end = engine.play(pairs)
+            engine.wait_idle()
+            time.sleep(max(0.0, end - time.monotonic()))
+        print(engine.stats())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.close()
+        chain.all_off()
+        chain.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
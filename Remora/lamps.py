@@ -1,11 +1,11 @@
-from gpiozero import DigitalOutputDevice
 from time import sleep
-from dataclasses import dataclass
 
-ldata = DigitalOutputDevice(13, initial_value = False)
-lclk = DigitalOutputDevice(6, initial_value=False)
-lenable = DigitalOutputDevice(19, initial_value=False)
-lstrobe = DigitalOutputDevice(26, initial_value=False)
+from board_map import load_board_map
+from lamp_chain import LampChain
+
+# Shifts the bits and drives strobe/enable (see lamp_chain.py for backends)
+chain = LampChain()
+board_map = load_board_map()
 
 lstate: int = 0
 masks = [0x3f]  # list of binary (hex) values to mask into state
@@ -16,52 +16,20 @@ masksr = []   #
 def gen_masks():
     global masksr, masks
     
-    m = 0x3f
-    for _ in range(19):   # 1st one is already there
-        m = m << 6
-        masks.append(m)
-        
-    masks_revi = reversed(masks)
-    masksr = list(masks_revi)
+    # Board masks by chain position, from remora_config.csv
+    masksr = [board_map.slot_mask(k) for k in range(board_map.slots)]
+    masks = list(reversed(masksr))
     print("masksr len: ", len(masksr))
     
     
-@dataclass
-class Lampclk:
-    """ run the Lamp Clock """
-    # Set up pulsewidth
-    delay: float = .05  # seconds
-    
-    def runclk(self, cnt : int) -> None:
-        for _ in range(cnt):
-            lclk.on()
-            sleep(self.delay)
-            lclk.off()
-
-
 def LampsData(len : int, dataval : int):
     """ Data and signal handshakes for serial lamp data"""
     
     #len : int # length in bits
     #dataval : int #  Actual data in binary (shown in hex)+
     
-    lstrobe.on()
-    for i in range(len):
-        d = dataval & 0x00001
-            
-        if d == 0:
-            ldata.off()
-        else:
-            ldata.on()
-
-        lamps.runclk(1)  # clock in the value
-            
-        dataval = dataval >> 1
-            
-    lstrobe.off()
-    sleep(.1)
-        
-    lenable.on()
+    chain.n_bits = len
+    chain.write(dataval)
 
         
 def LampsAllOn(len: int):
@@ -70,18 +38,11 @@ def LampsAllOn(len: int):
     #len : int # length in bits
     # All data will be 1
     
-    lstrobe.on()
-    for i in range(len):
-        
-        ldata.on()
-        lamps.runclk(1)  # clock in the value
-                        
-    lstrobe.off()
-    sleep(.1)
-        
-    lenable.on()
+    chain.n_bits = len
+    chain.shift((1 << len) - 1)
+    chain.set_enable(True)
     sleep(.1)
-    lenable.off()
+    chain.set_enable(False)
     
     
     
@@ -97,16 +58,8 @@ def LampsAllOff(len:int):
         boards[b] = 0
         
     print("all off: astate: ",hex(astate))
-    lstrobe.on()
-    
-    for _ in range(len):        
-        ldata.off()
-        lamps.runclk(1)  # clock in the value
-                       
-    lstrobe.off()
-    sleep(.1)
-        
-    lenable.off()   
+    chain.n_bits = len
+    chain.all_off()
 
     
 def calc_all_on_state():
@@ -142,9 +95,6 @@ allstate = calc_all_on_state()
 
 # print( len(masks), len(masksr),hex(masks[0]), hex(masks[1]), hex(masks[19]))
 
-# Create a Lampclk object
-lamps = Lampclk(.01)
-    
 LampsAllOff(120)
 
 #LampsData(120, allstate)
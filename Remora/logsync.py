@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+logsync.py
+
+Incremental, resumable, compressed copy of the Remora's logs, replacing
+logbkup.sh (which re-sent the whole directory with scp on every run and
+then made renamed duplicates of everything).
+
+The same script runs on both ends. `pull` starts `serve` on the Remora
+through ssh (or locally, for testing) and talks to it over the child's
+stdin/stdout. Only bytes it does not have yet are sent, as zstd chunks
+(or zlib if the zstandard module is missing on either end).
+
+Files are known by a hash of their first line, not by name, because
+RotatingFileHandler renames lamp_controller.log -> .log.1 -> .log.2 ...
+A rotated file keeps its first line, so it is recognised and not sent
+again. Each file is stored once under DEST/files/. DEST/manifest.json
+records, for each file, how many bytes we have and a hash of the last of
+them. Before appending, the server checks that hash, so a file that was
+replaced is fetched again from the start instead of corrupted.
+
+The manifest is rewritten after every chunk, and whenever a file shows
+up under a new name even with no new bytes. A dropped connection costs at
+most one chunk, and the next pull carries on from there.
+
+merge orders records by the instant their timestamp names (the stamps
+carry the local UTC offset), so records from either side of a DST change
+come out in true time order.
+
+Usage:
+    # from the Remora, via the relay
+    python3 logsync.py pull /home/bennu/software/bennu logs/ \\
+        --via "ssh rome" --remote-script software/bennu/logsync.py
+
+    # local stand-in (no ssh): serve a directory on this machine
+    python3 logsync.py pull /path/to/remora/dir logs/
+
+    # one deduplicated, time-ordered stream of everything pulled
+    python3 logsync.py merge logs/ -o lamp_controller_all.log
+"""
+
+import argparse
+import fnmatch
+import hashlib
+import heapq
+import json
+import os
+import shlex
+import subprocess
+import sys
+import zlib
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_PATTERN = "lamp_controller.log*"
+CHUNK_SIZE = 256 * 1024
+TAIL_CHECK = 4096        # bytes hashed to confirm our copy matches theirs
+MAX_FIRST_LINE = 4096    # identity = sha1 of the first line (up to this much)
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S%z"   # run.py's log datefmt
+
+
+# ----------------------------------------------------------------------
+# Shared helpers
+# ----------------------------------------------------------------------
+
+def _codecs():
+    return (["zstd"] if zstandard is not None else []) + ["zlib"]
+
+
+def _compress(codec, data):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return zlib.compress(data, 6)
+
+
+def _decompress(codec, data):
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def _send(stream, header, payload=b""):
+    header = dict(header, len=len(payload))
+    stream.write(json.dumps(header, separators=(",", ":")).encode() + b"\n")
+    if payload:
+        stream.write(payload)
+    stream.flush()
+
+
+def _recv(stream):
+    line = stream.readline()
+    if not line:
+        raise EOFError("Connection closed")
+    header = json.loads(line)
+    payload = stream.read(header["len"]) if header["len"] else b""
+    if len(payload) != header["len"]:
+        raise EOFError("Connection closed mid-chunk")
+    return header, payload
+
+
+def file_identity(path):
+    """sha1 of the first line, or None if the first line is not complete yet."""
+    with open(path, "rb") as f:
+        first = f.readline(MAX_FIRST_LINE)
+    if not first.endswith(b"\n") and len(first) < MAX_FIRST_LINE:
+        return None
+    return hashlib.sha1(first).hexdigest()
+
+
+def tail_hash(path, offset):
+    with open(path, "rb") as f:
+        start = max(0, offset - TAIL_CHECK)
+        f.seek(start)
+        data = f.read(offset - start)
+    if len(data) != offset - start:
+        return None
+    return hashlib.sha1(data).hexdigest()
+
+
+# ----------------------------------------------------------------------
+# Server (runs on the Remora; stdin/stdout are the connection)
+# ----------------------------------------------------------------------
+
+def serve(directory, pattern):
+    rd, wr = sys.stdin.buffer, sys.stdout.buffer
+    while True:
+        try:
+            req, _ = _recv(rd)
+        except EOFError:
+            return 0
+
+        if req["op"] == "list":
+            files = []
+            for name in sorted(os.listdir(directory)):
+                path = os.path.join(directory, name)
+                if not fnmatch.fnmatch(name, pattern) or not os.path.isfile(path):
+                    continue
+                ident = file_identity(path)
+                if ident is not None:
+                    files.append({"name": name, "id": ident, "size": os.path.getsize(path)})
+            codec = next((c for c in req.get("codecs", []) if c in _codecs()), "zlib")
+            _send(wr, {"op": "list", "files": files, "codec": codec})
+
+        elif req["op"] == "read":
+            path = os.path.join(directory, os.path.basename(req["name"]))
+            try:
+                if file_identity(path) != req["id"]:
+                    _send(wr, {"op": "moved"})   # rotated since the list; list again
+                    continue
+                offset = req["offset"]
+                if offset and tail_hash(path, offset) != req["tail"]:
+                    _send(wr, {"op": "mismatch"})
+                    continue
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    while True:
+                        raw = f.read(CHUNK_SIZE)
+                        if not raw:
+                            break
+                        _send(wr, {"op": "chunk", "offset": offset, "raw": len(raw)},
+                              _compress(req["codec"], raw))
+                        offset += len(raw)
+                _send(wr, {"op": "eof", "size": offset})
+            except OSError as e:
+                _send(wr, {"op": "error", "error": str(e)})
+
+        else:
+            _send(wr, {"op": "error", "error": f"unknown op {req['op']!r}"})
+
+
+# ----------------------------------------------------------------------
+# Client
+# ----------------------------------------------------------------------
+
+class Manifest:
+    """DEST/manifest.json: {identity: {"file", "offset", "remote_name"}}."""
+
+    def __init__(self, dest):
+        self.dest = dest
+        self.path = os.path.join(dest, "manifest.json")
+        self.files_dir = os.path.join(dest, "files")
+        os.makedirs(self.files_dir, exist_ok=True)
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+        self.changed = False    # entries differ from what is on disk
+        # Bytes written after the last manifest update (a crash mid-chunk)
+        # are dropped so the file always ends exactly at its recorded offset.
+        for entry in self.entries.values():
+            local = self.local_path(entry)
+            if os.path.exists(local) and os.path.getsize(local) > entry["offset"]:
+                with open(local, "r+b") as f:
+                    f.truncate(entry["offset"])
+
+    def local_path(self, entry):
+        return os.path.join(self.files_dir, entry["file"])
+
+    def entry(self, ident, remote_name):
+        entry = self.entries.get(ident)
+        if entry is None:
+            entry = self.entries[ident] = {"file": ident[:16] + ".log", "offset": 0,
+                                           "remote_name": remote_name}
+            self.changed = True
+        elif entry["remote_name"] != remote_name:
+            entry["remote_name"] = remote_name   # rotated since the last pull
+            self.changed = True
+        return entry
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.changed = False
+
+
+def _server_command(args):
+    if args.via:
+        remote = f"{args.remote_python} {args.remote_script} serve {shlex.quote(args.source)}"
+        remote += f" --pattern {shlex.quote(args.pattern)}"
+        return shlex.split(args.via) + [remote]
+    return [sys.executable, os.path.abspath(__file__), "serve", args.source,
+            "--pattern", args.pattern]
+
+
+def _fetch(rd, wr, manifest, f_info, codec):
+    """Bring one file up to date. Returns bytes received, or None if it moved."""
+    entry = manifest.entry(f_info["id"], f_info["name"])
+    if entry["offset"] >= f_info["size"]:
+        return 0
+    local = manifest.local_path(entry)
+    tail = tail_hash(local, entry["offset"]) if entry["offset"] else None
+
+    _send(wr, {"op": "read", "name": f_info["name"], "id": f_info["id"],
+               "offset": entry["offset"], "tail": tail, "codec": codec})
+    received = 0
+    with open(local, "ab") as out:
+        while True:
+            msg, payload = _recv(rd)
+            if msg["op"] == "moved":
+                return None
+            if msg["op"] == "mismatch":
+                print(f"  {f_info['name']}: our copy differs from theirs; fetching it again",
+                      file=sys.stderr)
+                out.truncate(0)
+                entry["offset"] = 0
+                manifest.save()
+                return _fetch(rd, wr, manifest, f_info, codec)
+            if msg["op"] == "error":
+                raise OSError(msg["error"])
+            if msg["op"] == "eof":
+                return received
+            data = _decompress(codec, payload)
+            if msg["offset"] != entry["offset"] or len(data) != msg["raw"]:
+                raise OSError(f"{f_info['name']}: chunk out of order or corrupt")
+            out.write(data)
+            out.flush()
+            os.fsync(out.fileno())
+            entry["offset"] += len(data)
+            manifest.save()
+            received += len(payload)
+
+
+def pull(args):
+    manifest = Manifest(args.dest)
+    proc = subprocess.Popen(_server_command(args), stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    rd, wr = proc.stdout, proc.stdin
+    wire = 0
+    try:
+        for _attempt in range(3):   # re-list if a file rotates under us
+            _send(wr, {"op": "list", "codecs": _codecs()})
+            listing, _ = _recv(rd)
+            moved = False
+            for f_info in listing["files"]:
+                n = _fetch(rd, wr, manifest, f_info, listing["codec"])
+                if manifest.changed:
+                    # e.g. a rotation with no new bytes: still record the new name
+                    manifest.save()
+                if n is None:
+                    moved = True
+                    continue
+                wire += n
+                if n:
+                    print(f"  {f_info['name']}: +{n} bytes ({listing['codec']})", file=sys.stderr)
+            if not moved:
+                break
+    finally:
+        wr.close()
+        proc.wait()
+    print(f"Pulled {wire} compressed bytes; {len(manifest.entries)} files in {args.dest}.",
+          file=sys.stderr)
+    return 0
+
+
+# ----------------------------------------------------------------------
+# Merge
+# ----------------------------------------------------------------------
+
+def _epoch(stamp):
+    """
+    Seconds since the epoch for a record's timestamp, or None. The stamps
+    carry the local UTC offset, so across a DST change their text does not
+    sort in time order; the epoch does.
+    """
+    try:
+        return datetime.strptime(stamp, TIME_FORMAT).timestamp()
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(stamp).timestamp()
+    except ValueError:
+        return None
+
+
+def _records(path):
+    """
+    Yield (epoch seconds, text) per log record; continuation lines without
+    a timestamp of their own (tracebacks) stay with the record above them.
+    A record whose timestamp does not parse keeps the time of the one
+    before it, so each file's records stay in order.
+    """
+    key, lines = float("-inf"), []
+    with open(path, "r", errors="replace") as f:
+        for line in f:
+            if line[:4].isdigit() and line[4:5] == "-":
+                if lines:
+                    yield key, "".join(lines)
+                t = _epoch(line.split(" ", 1)[0].rstrip())
+                key, lines = key if t is None else t, [line]
+            else:
+                lines.append(line)
+    if lines:
+        yield key, "".join(lines)
+
+
+def merge(args):
+    manifest = Manifest(args.dest)
+    paths = [manifest.local_path(e) for e in manifest.entries.values()]
+    out = open(args.output, "w") if args.output else sys.stdout
+    current_key, seen = None, set()
+    written = dropped = 0
+    try:
+        # Each file is already in time order, so a k-way merge orders the lot.
+        # Duplicates share a timestamp, so only the current second is remembered.
+        # Records are ordered by epoch, not timestamp text, so the hour
+        # either side of a DST change interleaves correctly.
+        for key, text in heapq.merge(*(_records(p) for p in paths), key=lambda r: r[0]):
+            if key != current_key:
+                current_key, seen = key, set()
+            if text in seen:
+                dropped += 1
+                continue
+            seen.add(text)
+            out.write(text)
+            written += 1
+    finally:
+        if args.output:
+            out.close()
+    print(f"Merged {len(paths)} files: {written} records, {dropped} duplicates dropped.",
+          file=sys.stderr)
+    return 0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Incremental log sync from the Remora.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    s = sub.add_parser("serve", help="(run by pull) send logs over stdin/stdout")
+    s.add_argument("directory")
+    s.add_argument("--pattern", default=DEFAULT_PATTERN)
+
+    p = sub.add_parser("pull", help="fetch new log bytes into DEST")
+    p.add_argument("source", help="log directory on the Remora")
+    p.add_argument("dest", help="local directory for the synced copy")
+    p.add_argument("--via", help='command that reaches the Remora, e.g. "ssh rome" '
+                                 "(default: serve SOURCE on this machine)")
+    p.add_argument("--remote-python", default="python3")
+    p.add_argument("--remote-script", default="software/bennu/logsync.py")
+    p.add_argument("--pattern", default=DEFAULT_PATTERN)
+
+    m = sub.add_parser("merge", help="write every pulled record once, in time order")
+    m.add_argument("dest")
+    m.add_argument("-o", "--output", help="output file (default stdout)")
+
+    args = ap.parse_args()
+    if args.cmd == "serve":
+        return serve(args.directory, args.pattern)
+    if args.cmd == "pull":
+        return pull(args)
+    return merge(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
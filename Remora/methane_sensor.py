@@ -2,11 +2,41 @@
 """
 methane_sensor.py
 
-Minimal Axetris LGD reader, refactored from the standalone script into a
-simple importable module.
+Axetris LGD reader, refactored from the standalone script into an
+importable module. Each unit is an AxetrisSensor with its own port,
+framer, background reader thread and ring buffer, so several units (CH4
+and C2H6, intake and exhaust, ...) can run side by side from one
+controller. A unit is known by the serial number in its V (version)
+packet, so it is found again whichever port it comes up on after a reboot.
 
 Public API:
 
+    AxetrisSensor(name, port=None, serial_number=None, baud=9600)
+        - port: a fixed port; None = find the unit whose V packet carries
+          serial_number among candidate_ports(by_id=True) (or, with no
+          serial number either, the lowest /dev/ttyUSB*/ttyACM*, as before).
+        - sensor.open() / sensor.close()
+        - sensor.identify() -> {"firmware", "serial"} from a V packet; done
+          once on open.
+        - sensor.read() -> measurement dict (see read_methane()).
+        - sensor.start_reader() / stop_reader() / reader_running()
+        - sensor.latest(max_age=None) / sensor.since_last()
+              (see latest_methane() / methane_since_last())
+        - sensor.start_capture(path) / stop_capture()
+        - sensor.framer_stats()
+
+    add_sensor(name, port=None, serial_number=None, baud=9600)
+        - Create and register a sensor; sensors() is the registry
+          ({name: AxetrisSensor}, in the order added); close_all().
+
+    candidate_ports(by_id=False)
+        - /dev/ttyUSB* and /dev/ttyACM*, sorted; with by_id=True,
+          /dev/serial/by-id/* (stable across reboots and replugging) if
+          there are any.
+
+The functions below drive one default sensor named "methane" (created on
+first use), as before there was more than one:
+
     init_methane(port=None, baud=9600)
         - Open serial port, auto-detect if port is None.
         - Start measurement stream if needed (sends CMD_START_MEAS).
@@ -25,22 +55,58 @@ Public API:
     close_methane()
         - Close the serial port (optional, e.g., on shutdown).
 
-No classes, no CLI, just functions and a global serial handle.
+    start_methane_reader()
+        - Open the port if needed and start a background thread that drains
+          it continuously (the sensor streams ~1 packet/s) into a
+          timestamped ring buffer. While it runs, read_methane() returns
+          the newest buffered packet instead of touching the port, so
+          readings are never stale and no packet is dropped unread.
+
+    latest_methane(max_age=None)
+        - Newest buffered measurement dict, plus "time" (epoch seconds of
+          arrival), or None if there is none (or it is older than max_age).
+
+    methane_since_last()
+        - Aggregate gas1 over every packet that arrived since the previous
+          call:
+              {
+                  "count": <int>,
+                  "mean": <float or None>,
+                  "min": <float or None>,
+                  "max": <float or None>,
+                  "error_codes": <sorted list of non-zero error codes>,
+                  "t_first": <epoch seconds or None>,
+                  "t_last": <epoch seconds or None>,
+              }
+
+    stop_methane_reader()
+        - Stop the background thread (close_methane() does this too).
+
+    start_capture(path), stop_capture()
+        - Record the raw byte stream, as read, to an axetris_capture.py
+          file (for replay without the device).
+
+    framer_stats()
+        - Packet framer counters ({"packets", "resyncs", "bad_checksums",
+          "discarded_bytes"}) since start-up.
 """
 
 import glob
-import struct
+import os
+import threading
 import time
+from collections import deque
 
 import serial  # pip install pyserial
 
+from axetris_capture import CaptureWriter, CapturingSerial
+from axetris_framer import (PacketFramer, STATUS, GAS1, GAS3,
+                            MEAS_STATUS_OFFSET, MEAS_PAYLOAD_OFFSET)
+
 # ----------------------------------------------------------------------
 # Constants copied from original script
 # ----------------------------------------------------------------------
 
-START = 0x7B  # '{'
-END   = 0x7D  # '}'
-
 # Prebuilt 8-byte commands from the manual (little-endian size includes braces)
 CMD_VERSION    = bytes([0x7B, ord('V'), 0x08, 0x00, 0x00, 0x00, 0x27, 0x7D])
 CMD_IDLE       = bytes([0x7B, ord('I'), 0x08, 0x00, 0x00, 0xEA, 0x4A, 0x7D])
@@ -49,21 +115,40 @@ CMD_START_MEAS = bytes([0x7B, ord('M'), 0x08, 0x00, 0x01, 0xEA, 0x45, 0x7D])
 DEFAULT_BAUD = 9600
 DEFAULT_TIMEOUT = 1.0
 
-# ----------------------------------------------------------------------
-# Module-level state
-# ----------------------------------------------------------------------
+# Packets kept by the background reader (~1 Hz, so about ten minutes)
+RING_SIZE = 600
 
-_ser = None
-_initialized = False
+# With the reader running, read_methane() refuses packets older than this (s)
+STALE_AFTER = 3.0
+
+# How long to wait for the V packet answering CMD_VERSION (s)
+IDENTIFY_TIMEOUT = 3.0
+
+# Name of the sensor the module-level functions use
+DEFAULT_SENSOR = "methane"
 
 # ----------------------------------------------------------------------
 # Helper functions (mostly lifted from your script)
 # ----------------------------------------------------------------------
 
+def candidate_ports(by_id=False):
+    """
+    Serial ports a unit may be on: /dev/ttyUSB* and /dev/ttyACM*, sorted as
+    the original script did. by_id=True lists /dev/serial/by-id/* instead
+    (stable across reboots and replugging) when there are any; that order
+    is only used to look for a configured serial number.
+    """
+    if by_id:
+        ports = sorted(glob.glob("/dev/serial/by-id/*"))
+        if ports:
+            return ports
+    return sorted(glob.glob("/dev/ttyUSB*") + glob.glob("/dev/ttyACM*"))
+
+
 def _find_serial_port(explicit_port=None):
     if explicit_port:
         return explicit_port
-    candidates = sorted(glob.glob("/dev/ttyUSB*") + glob.glob("/dev/ttyACM*"))
+    candidates = candidate_ports()
     if not candidates:
         raise RuntimeError("No serial ports found for methane sensor.")
     # Heuristic: prefer the lowest-numbered device
@@ -85,60 +170,6 @@ def _open_serial(port, baud):
     return ser
 
 
-def _read_exact(ser, n):
-    """Read exactly n bytes or raise TimeoutError."""
-    data = bytearray()
-    deadline = time.monotonic() + ser.timeout if ser.timeout else None
-    while len(data) < n:
-        chunk = ser.read(n - len(data))
-        if chunk:
-            data += chunk
-        else:
-            if deadline is not None and time.monotonic() > deadline:
-                raise TimeoutError(f"Timeout reading {n} bytes (got {len(data)}).")
-    return bytes(data)
-
-
-def _compute_sum8(buf):
-    """Sum of bytes modulo 256."""
-    return sum(buf) & 0xFF
-
-
-def _read_packet(ser):
-    """
-    Read one framed packet { ID sizeLSB sizeMSB ... checksum }.
-    Returns bytes including both braces. Validates checksum & end marker.
-    """
-    # Seek start byte
-    while True:
-        b = ser.read(1)
-        if not b:
-            raise TimeoutError("Timeout waiting for start byte '{'.")
-        if b[0] == START:
-            break
-        # else keep discarding until we find '{'
-
-    header = _read_exact(ser, 3)  # ID + size LSB + size MSB
-    pid = header[0]
-    size = header[1] | (header[2] << 8)
-
-    if size < 6:
-        # Minimum is {, ID, sizeLSB, sizeMSB, checksum, }
-        raise ValueError(f"Invalid size {size}")
-
-    # We've read 1 (start) + 3 (header) = 4 bytes so far.
-    rest = _read_exact(ser, size - 4)  # includes checksum and final '}'
-    if rest[-1] != END:
-        raise ValueError("Packet missing closing '}'")
-
-    packet = bytes([START]) + header + rest
-    # Verify checksum: sum of all bytes except the final '}' must be 0 mod 256
-    if _compute_sum8(packet[:-1]) != 0:
-        raise ValueError("Checksum failed")
-
-    return packet
-
-
 def _parse_measurement(packet):
     """
     Return dict with error_code, optional gas1, gas2, temperature.
@@ -152,26 +183,26 @@ def _parse_measurement(packet):
         raise ValueError("Measurement packet too short")
 
     # Bytes 5-6 of full packet are error status code (2 bytes little-endian)
-    err_code = struct.unpack_from("<H", body, 0)[0]
+    (err_code,) = STATUS.unpack_from(packet, MEAS_STATUS_OFFSET)
     # Remaining bytes contain floats and padding to multiple of 8
-    payload = body[2:]
+    n_payload = len(body) - 2
 
     result = {"error_code": err_code, "gas1": None, "gas2": None, "temperature_C": None}
 
-    if size == 16 and len(payload) >= 4:
-        (g1,) = struct.unpack_from("<f", payload, 0)
+    if size == 16 and n_payload >= 4:
+        (g1,) = GAS1.unpack_from(packet, MEAS_PAYLOAD_OFFSET)
         result["gas1"] = g1
-    elif size == 24 and len(payload) >= 12:
-        g1, g2, temp = struct.unpack_from("<fff", payload, 0)
+    elif size == 24 and n_payload >= 12:
+        g1, g2, temp = GAS3.unpack_from(packet, MEAS_PAYLOAD_OFFSET)
         result["gas1"] = g1
         result["gas2"] = g2
         result["temperature_C"] = temp
     else:
         # Unknown/extended format; best effort: up to 3 floats
         floats = []
-        for off in range(0, min(len(payload), 12), 4):
-            if off + 4 <= len(payload):
-                floats.append(struct.unpack_from("<f", payload, off)[0])
+        for off in range(0, min(n_payload, 12), 4):
+            if off + 4 <= n_payload:
+                floats.append(GAS1.unpack_from(packet, MEAS_PAYLOAD_OFFSET + off)[0])
         for i, val in enumerate(floats, 1):
             result[f"f{i}"] = val
 
@@ -184,7 +215,260 @@ def _send_cmd(ser, cmd_bytes):
     ser.flush()
 
 
-def _maybe_start_measurements(ser):
+def _parse_version(packet):
+    """{"firmware", "serial"} from a V packet (None for missing fields)."""
+    body = packet[4:-2]
+    firmware = serialno = None
+    if len(body) >= 50:  # status(2) + firmware(16) + serial(32)
+        firmware = body[2:18].rstrip(b"\x00").decode(errors="ignore") or None
+        serialno = body[18:50].rstrip(b"\x00").decode(errors="ignore").strip() or None
+    return {"firmware": firmware, "serial": serialno}
+
+
+def _same_device(a, b):
+    return os.path.realpath(a) == os.path.realpath(b)
+
+
+# ----------------------------------------------------------------------
+# One sensor
+# ----------------------------------------------------------------------
+
+class AxetrisSensor:
+    """
+    One Axetris unit on one serial port. All state is per instance, so each
+    unit streams into its own ring from its own reader thread.
+    """
+
+    def __init__(self, name, port=None, serial_number=None, baud=DEFAULT_BAUD):
+        self.name = name
+        self.port = port
+        self.serial_number = serial_number
+        self.baud = baud
+        self.info = None      # {"firmware", "serial"} once identified
+
+        self._ser = None
+        # Bytes received but not yet framed; reset whenever the port is (re)opened
+        self._framer = PacketFramer()
+        # axetris_capture.CaptureWriter every read is copied to, if capturing
+        self._capture = None
+        self._lock = threading.RLock()   # open/close/capture
+
+        # Background reader state. _ring holds (seq, arrival_time,
+        # measurement); seq increases by one per packet so since_last() can
+        # tell which packets it has already reported.
+        self._ring = deque(maxlen=RING_SIZE)
+        self._ring_lock = threading.Lock()
+        self._seq = 0
+        self._last_taken_seq = 0
+        self._reader = None
+        self._reader_stop = threading.Event()
+
+    def __repr__(self):
+        return (f"AxetrisSensor({self.name!r}, port={self.port!r}, "
+                f"serial_number={self.serial_number!r})")
+
+    # -- port ----------------------------------------------------------
+
+    def is_open(self):
+        return self._ser is not None and self._ser.is_open
+
+    def open(self):
+        """
+        Open the port (finding it by serial number if need be), identify the
+        unit, and start the measurement stream if it is not streaming. Safe
+        to call when already open.
+        """
+        with self._lock:
+            if self.is_open():
+                return
+            if self.port is None:
+                self.port = (find_sensor_port(self.serial_number, exclude=self)
+                             if self.serial_number else _find_serial_port())
+            self._open_port()
+            if self.info is None:
+                try:
+                    self.info = self.identify()
+                except TimeoutError:
+                    self.info = {"firmware": None, "serial": None}
+            if (self.serial_number and self.info["serial"]
+                    and self.info["serial"] != self.serial_number):
+                found = self.info["serial"]
+                self.close()
+                raise RuntimeError(f"{self.name}: {self.port} is unit {found}, "
+                                   f"not {self.serial_number}")
+            _maybe_start_measurements(self)
+
+    def _open_port(self):
+        ser = _open_serial(self.port, self.baud)
+        self._framer.clear()
+        self._ser = CapturingSerial(ser, self._capture) if self._capture is not None else ser
+
+    def close(self):
+        """Stop the reader and close the port, if open."""
+        self.stop_reader()
+        with self._lock:
+            if self._ser is not None:
+                try:
+                    self._ser.close()
+                except Exception:
+                    pass
+            self._ser = None
+
+    def _read_packet(self):
+        """
+        Next framed, checksum-valid packet { ID sizeLSB sizeMSB ... checksum }
+        as bytes including both braces (see axetris_framer.py).
+        """
+        return self._framer.read_packet(self._ser)
+
+    def _send_cmd(self, cmd_bytes):
+        _send_cmd(self._ser, cmd_bytes)
+
+    def identify(self):
+        """
+        Ask for the V packet and return {"firmware", "serial"}. Measurement
+        packets arriving meanwhile are skipped. Must not be called while the
+        reader runs. TimeoutError if no V packet comes.
+        """
+        deadline = time.monotonic() + IDENTIFY_TIMEOUT
+        self._send_cmd(CMD_VERSION)
+        while time.monotonic() < deadline:
+            try:
+                pkt = self._read_packet()
+            except TimeoutError:
+                continue
+            if pkt[1] == ord('V'):
+                return _parse_version(pkt)
+        raise TimeoutError(f"{self.name}: no version packet from {self.port}")
+
+    # -- reading -------------------------------------------------------
+
+    def read(self):
+        """One measurement dict (see read_methane())."""
+        if self.reader_running():
+            latest = self.latest(max_age=STALE_AFTER)
+            if latest is None:
+                raise RuntimeError(f"{self.name}: no packet in the last {STALE_AFTER:.0f} s")
+            latest.pop("time")
+            return latest
+
+        if not self.is_open():
+            self.open()
+
+        try:
+            while True:
+                pkt = self._read_packet()
+                if pkt[1] == ord('M'):
+                    return _parse_measurement(pkt)
+        except TimeoutError as te:
+            raise RuntimeError(f"{self.name} timeout: {te}") from te
+        except Exception as e:
+            raise RuntimeError(f"{self.name} read error: {e}") from e
+
+    def _reader_loop(self):
+        """Drain the port into _ring until stopped, reopening it if it drops."""
+        while not self._reader_stop.is_set():
+            try:
+                with self._lock:
+                    if not self.is_open():
+                        self._open_port()
+                pkt = self._read_packet()
+            except TimeoutError:
+                continue
+            except (serial.SerialException, OSError):
+                with self._lock:
+                    try:
+                        self._ser.close()
+                    except Exception:
+                        pass
+                    self._ser = None
+                self._reader_stop.wait(1.0)
+                continue
+
+            t_arrival = time.time()
+            if pkt[1] != ord('M'):
+                continue
+            try:
+                meas = _parse_measurement(pkt)
+            except ValueError:
+                continue
+            with self._ring_lock:
+                self._seq += 1
+                self._ring.append((self._seq, t_arrival, meas))
+
+    def reader_running(self):
+        return self._reader is not None and self._reader.is_alive()
+
+    def start_reader(self):
+        """Start the background reader (opening the port first if needed)."""
+        if self.reader_running():
+            return
+        self.open()
+        with self._ring_lock:
+            self._last_taken_seq = self._seq  # aggregates start from now
+        self._reader_stop.clear()
+        self._reader = threading.Thread(target=self._reader_loop,
+                                        name=f"{self.name}-reader", daemon=True)
+        self._reader.start()
+
+    def stop_reader(self):
+        if self._reader is None:
+            return
+        self._reader_stop.set()
+        self._reader.join(timeout=2 * DEFAULT_TIMEOUT)
+        self._reader = None
+
+    def latest(self, max_age=None):
+        with self._ring_lock:
+            if not self._ring:
+                return None
+            _, t_arrival, meas = self._ring[-1]
+        if max_age is not None and time.time() - t_arrival > max_age:
+            return None
+        return dict(meas, time=t_arrival)
+
+    def since_last(self):
+        if not self.reader_running():
+            raise RuntimeError(f"{self.name} background reader is not running.")
+
+        with self._ring_lock:
+            fresh = [entry for entry in self._ring if entry[0] > self._last_taken_seq]
+            self._last_taken_seq = self._seq
+
+        values = [m["gas1"] for _, _, m in fresh if m.get("gas1") is not None]
+        return {
+            "count": len(values),
+            "mean": sum(values) / len(values) if values else None,
+            "min": min(values) if values else None,
+            "max": max(values) if values else None,
+            "error_codes": sorted({m["error_code"] for _, _, m in fresh if m["error_code"]}),
+            "t_first": fresh[0][1] if fresh else None,
+            "t_last": fresh[-1][1] if fresh else None,
+        }
+
+    # -- capture / stats -----------------------------------------------
+
+    def start_capture(self, path):
+        """Copy everything read from the port from now on to path."""
+        with self._lock:
+            self.stop_capture()
+            self._capture = CaptureWriter(path)
+            if self._ser is not None:
+                self._ser = CapturingSerial(self._ser, self._capture)
+
+    def stop_capture(self):
+        with self._lock:
+            if isinstance(self._ser, CapturingSerial):
+                self._ser = self._ser.ser
+            if self._capture is not None:
+                self._capture.close()
+                self._capture = None
+
+    def framer_stats(self):
+        return self._framer.stats()
+
+
+def _maybe_start_measurements(sensor):
     """
     On power-up the device typically begins sending a Version packet once,
     then continuous Measurement packets ~1 Hz. If nothing arrives, try to start.
@@ -194,11 +478,11 @@ def _maybe_start_measurements(ser):
       - If nothing / timeout, send CMD_START_MEAS and move on.
     """
     try:
-        pkt = _read_packet(ser)
+        pkt = sensor._read_packet()
         pid = pkt[1]
         # If we got a measurement, good; if version/other, just ignore.
         if pid == ord('M'):
-            # We drop it on the floor; the next read_methane() will get the next packet.
+            # We drop it on the floor; the next read() will get the next packet.
             return
         # otherwise ignore diagnostic packets etc.
     except TimeoutError:
@@ -206,34 +490,84 @@ def _maybe_start_measurements(ser):
 
     # If we didn't get anything useful, try sending START_MEAS
     try:
-        _send_cmd(ser, CMD_START_MEAS)
+        sensor._send_cmd(CMD_START_MEAS)
     except serial.SerialException:
         pass
 
 
 # ----------------------------------------------------------------------
-# Public API
+# Registry
 # ----------------------------------------------------------------------
 
+_sensors = {}
+_sensors_lock = threading.Lock()
+
+
+def add_sensor(name, port=None, serial_number=None, baud=DEFAULT_BAUD):
+    with _sensors_lock:
+        if name in _sensors:
+            raise ValueError(f"Methane sensor {name!r} already registered.")
+        sensor = _sensors[name] = AxetrisSensor(name, port, serial_number, baud)
+    return sensor
+
+
+def sensors():
+    with _sensors_lock:
+        return dict(_sensors)
+
+
+def close_all():
+    for sensor in sensors().values():
+        sensor.close()
+        sensor.stop_capture()
+
+
+def find_sensor_port(serial_number, exclude=None):
+    """
+    The candidate port whose unit reports serial_number in its V packet.
+    Ports already open by another registered sensor are not probed.
+    """
+    busy = [s.port for s in sensors().values()
+            if s is not exclude and s.port is not None and s.is_open()]
+    for port in candidate_ports(by_id=True):
+        if any(_same_device(port, b) for b in busy):
+            continue
+        probe = AxetrisSensor(f"probe {port}", port)
+        try:
+            probe._open_port()
+            if probe.identify()["serial"] == serial_number:
+                return port
+        except (TimeoutError, serial.SerialException, OSError):
+            pass
+        finally:
+            probe.close()
+    raise RuntimeError(f"No methane sensor with serial number {serial_number} found.")
+
+
+# ----------------------------------------------------------------------
+# Default sensor (the original single-sensor API)
+# ----------------------------------------------------------------------
+
+def _default(port=None, baud=DEFAULT_BAUD):
+    with _sensors_lock:
+        sensor = _sensors.get(DEFAULT_SENSOR)
+        if sensor is None:
+            sensor = _sensors[DEFAULT_SENSOR] = AxetrisSensor(DEFAULT_SENSOR, port, baud=baud)
+    if port is not None and not sensor.is_open():
+        sensor.port = port
+    return sensor
+
+
 def init_methane(port=None, baud=DEFAULT_BAUD):
     """
     Initialize the methane sensor:
 
       - Open the serial port (auto-detect if port is None).
-      - Set up globals.
       - Try to start measurement stream if not already streaming.
 
     Safe to call multiple times; it will only open once.
     """
-    global _ser, _initialized
-
-    if _ser is not None and _ser.is_open:
-        return  # already open
-
-    ser_port = _find_serial_port(port)
-    _ser = _open_serial(ser_port, baud)
-    _maybe_start_measurements(_ser)
-    _initialized = True
+    _default(port, baud).open()
 
 
 def read_methane():
@@ -249,33 +583,45 @@ def read_methane():
         }
 
     If the device can't be read, raises RuntimeError.
-    """
-    global _ser, _initialized
-
-    if _ser is None or not _ser.is_open:
-        # Try to auto-init with defaults
-        init_methane()
 
-    try:
-        pkt = _read_packet(_ser)
-        meas = _parse_measurement(pkt)
-        return meas
-    except TimeoutError as te:
-        raise RuntimeError(f"Methane sensor timeout: {te}") from te
-    except Exception as e:
-        raise RuntimeError(f"Methane sensor read error: {e}") from e
+    With the background reader running this is the newest buffered packet;
+    RuntimeError if none has arrived within STALE_AFTER seconds.
+    """
+    return _default().read()
 
 
 def close_methane():
     """Close the serial port, if open."""
-    global _ser, _initialized
-    if _ser is not None:
-        try:
-            _ser.close()
-        except Exception:
-            pass
-    _ser = None
-    _initialized = False
+    _default().close()
+
+
+def start_methane_reader(port=None, baud=DEFAULT_BAUD):
+    """Start the background reader (opening the port first if needed)."""
+    _default(port, baud).start_reader()
+
+
+def stop_methane_reader():
+    _default().stop_reader()
+
+
+def latest_methane(max_age=None):
+    return _default().latest(max_age)
+
+
+def methane_since_last():
+    return _default().since_last()
+
+
+def start_capture(path):
+    _default().start_capture(path)
+
+
+def stop_capture():
+    _default().stop_capture()
+
+
+def framer_stats():
+    return _default().framer_stats()
 
 
 # Optional: simple sanity check if run directly
@@ -284,6 +630,7 @@ if __name__ == "__main__":
     init_methane()
     try:
         m = read_methane()
+        print("Unit:", _default().info)
         print("Measurement:", m)
     finally:
         close_methane()
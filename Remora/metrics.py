@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+metrics.py
+
+In-process counters, gauges and latency histograms for run.py, so the slow
+path on the Pi can be measured instead of guessed at.
+
+They are served in the Prometheus text format on localhost (curl it, or
+scrape it through an ssh tunnel) and summarised periodically in a
+`Metrics:` log line.
+
+Public API:
+
+    Registry()
+        - registry.counter(name, help, labelnames=())
+        - registry.gauge(name, help, labelnames=(), func=None)
+            func: called at render time for the value (for numbers kept
+            elsewhere, e.g. the scheduler's overrun count)
+        - registry.histogram(name, help, labelnames=(), buckets=LATENCY_BUCKETS)
+        - registry.render() -> Prometheus text exposition
+
+    metric.labels(**values) -> the child for one label combination
+    counter.inc(n=1); gauge.set(v); histogram.observe(v)
+    histogram.time() -> context manager observing the elapsed seconds
+    histogram.take_window() -> (n, mean, max) since the previous call
+
+    MetricsServer(registry, port, host="127.0.0.1")
+        - Serve GET /metrics on a background thread; server.close().
+
+No third-party client library is needed (nothing to install on the Pi).
+"""
+
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds; spans a 1 ms I2C transfer up to a hung 2.5 s serial read
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _fmt(v):
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_str(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **values):
+        key = tuple(str(values[n]) for n in self.labelnames)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+        return child
+
+    def _default(self):
+        """The unlabelled child, for metrics without labels."""
+        return self.labels()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = sorted(self._children.items())
+        for key, child in children:
+            lines.extend(child.render(self.name, self.labelnames, key))
+        return lines
+
+
+# ----------------------------------------------------------------------
+# Counter / Gauge
+# ----------------------------------------------------------------------
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self._lock:
+            self.value += n
+
+    def render(self, name, labelnames, key):
+        return [f"{name}{_label_str(labelnames, key)} {_fmt(self.value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, n=1):
+        self._default().inc(n)
+
+
+class _GaugeChild:
+    def __init__(self, func=None):
+        self.value = 0
+        self.func = func
+
+    def set(self, v):
+        self.value = v
+
+    def render(self, name, labelnames, key):
+        value = self.func() if self.func is not None else self.value
+        return [f"{name}{_label_str(labelnames, key)} {_fmt(value)}"]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=(), func=None):
+        super().__init__(name, help_text, labelnames)
+        self._func = func
+        if func is not None:
+            self._default()   # a callback gauge always has its one sample
+
+    def _new_child(self):
+        return _GaugeChild(self._func)
+
+    def set(self, v):
+        self._default().set(v)
+
+
+# ----------------------------------------------------------------------
+# Histogram
+# ----------------------------------------------------------------------
+
+class _Timer:
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.t0)
+        return False
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # last = +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._win = [0, 0.0, 0.0]                # n, sum, max since take_window()
+        self._lock = threading.Lock()
+
+    def observe(self, v):
+        i = 0
+        while i < len(self.buckets) and v > self.buckets[i]:
+            i += 1
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += v
+            self.count += 1
+            self._win[0] += 1
+            self._win[1] += v
+            self._win[2] = max(self._win[2], v)
+
+    def time(self):
+        return _Timer(self)
+
+    def take_window(self):
+        with self._lock:
+            n, total, peak = self._win
+            self._win = [0, 0.0, 0.0]
+        return n, (total / n if n else None), (peak if n else None)
+
+    def render(self, name, labelnames, key):
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        lines, cumulative = [], 0
+        for bound, c in zip(self.buckets + (math.inf,), counts):
+            cumulative += c
+            lines.append(f"{name}_bucket{_label_str(labelnames, key, [('le', _fmt(bound))])} "
+                         f"{cumulative}")
+        lines.append(f"{name}_sum{_label_str(labelnames, key)} {_fmt(total)}")
+        lines.append(f"{name}_count{_label_str(labelnames, key)} {count}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, v):
+        self._default().observe(v)
+
+    def time(self):
+        return self._default().time()
+
+    def take_window(self):
+        return self._default().take_window()
+
+
+# ----------------------------------------------------------------------
+# Registry and HTTP endpoint
+# ----------------------------------------------------------------------
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._add(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=(), func=None):
+        return self._add(Gauge(name, help_text, labelnames, func))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass   # keep scrapes out of the controller log
+
+
+class MetricsServer:
+    def __init__(self, registry, port, host="127.0.0.1"):
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.registry = registry
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name="metrics-server", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+query_server.py
+
+Small query API on a Unix-domain socket, so a running experiment can be
+checked over the slow ship link for a few hundred bytes per question
+instead of tail -f'ing or scp'ing whole logs.
+
+run.py keeps recent samples and events in memory (Telemetry) and serves
+them on lamp_controller.sock. Each request is one line of text; each reply
+is one line of compact JSON. A connection may send several requests.
+
+Commands:
+
+    last [N]          the N most recent samples (default 10), column-wise:
+                      {"t0": epoch, "dt": [s after t0...], "methane": [...],
+                       ..., "lamp": [bits...], "burst": [0/1...]}
+    summary [T]       n/mean/min/max per channel and the event count for
+                      samples since T (epoch seconds; a negative T means
+                      that many seconds ago; default: everything buffered)
+    state             current lamp state, sample interval, schedule, ...
+    cycles [N]        per-cycle means for the last N stretches of constant
+                      lamp state (default all buffered)
+    events [N]        the N most recent events (default 20)
+    help
+
+Missing values are null. Lamp bits follow the quad order in "quads" of the
+state reply (bit i = quad i ON).
+
+Public API:
+
+    Telemetry(channels, quads, max_samples, max_events, max_cycles)
+        - telemetry.add_sample(t, values, lamp_state, burst)
+        - telemetry.add_event(t, kind, text)
+
+    QueryServer(path, telemetry, state_func)
+        - Serve on a background thread; state_func() returns the dict for
+          the "state" command. server.close() stops it and removes the
+          socket file.
+
+CLI (client):
+    python3 query_server.py state
+    python3 query_server.py last 20
+    python3 query_server.py --socket /path/lamp_controller.sock cycles 5
+"""
+
+import argparse
+import json
+import math
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import deque
+
+DEFAULT_SOCKET = "lamp_controller.sock"
+
+MAX_SAMPLES = 2000   # ~8 h at 15 s, ~33 min of 1 Hz bursts
+MAX_EVENTS = 500
+MAX_CYCLES = 200
+
+
+def _compact(value, digits=4):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return round(value, digits)
+
+
+def _dumps(obj):
+    return json.dumps(obj, separators=(",", ":"))
+
+
+class _Cycle:
+    """Running sums for one stretch of constant lamp state."""
+
+    def __init__(self, t, lamp_bits, channels):
+        self.start = t
+        self.end = t
+        self.lamp = lamp_bits
+        self.n = 0
+        self.sums = {ch: 0.0 for ch in channels}
+        self.counts = {ch: 0 for ch in channels}
+
+    def add(self, t, values):
+        self.end = t
+        self.n += 1
+        for ch, v in values.items():
+            if v is not None:
+                self.sums[ch] += v
+                self.counts[ch] += 1
+
+    def as_dict(self):
+        out = {"start": round(self.start, 1), "end": round(self.end, 1),
+               "lamp": self.lamp, "n": self.n}
+        for ch in self.sums:
+            out[ch] = _compact(self.sums[ch] / self.counts[ch]) if self.counts[ch] else None
+        return out
+
+
+# ----------------------------------------------------------------------
+# In-memory buffers (filled by run.py)
+# ----------------------------------------------------------------------
+
+class Telemetry:
+    def __init__(self, channels, quads, max_samples=MAX_SAMPLES,
+                 max_events=MAX_EVENTS, max_cycles=MAX_CYCLES):
+        self.channels = list(channels)
+        self.quads = list(quads)
+        self._samples = deque(maxlen=max_samples)   # (t, values, lamp_bits, burst)
+        self._events = deque(maxlen=max_events)     # (t, kind, text)
+        self._cycles = deque(maxlen=max_cycles)     # _Cycle, oldest first
+        self._lock = threading.Lock()
+
+    def lamp_bits(self, lamp_state):
+        return sum(1 << i for i, q in enumerate(self.quads) if lamp_state.get(q))
+
+    def add_sample(self, t, values, lamp_state, burst=False):
+        bits = self.lamp_bits(lamp_state)
+        with self._lock:
+            self._samples.append((t, dict(values), bits, bool(burst)))
+            if not self._cycles or self._cycles[-1].lamp != bits:
+                self._cycles.append(_Cycle(t, bits, self.channels))
+            self._cycles[-1].add(t, values)
+
+    def add_event(self, t, kind, text):
+        with self._lock:
+            self._events.append((t, kind, text))
+
+    # ------------------------------------------------------------------
+
+    def last(self, n):
+        with self._lock:
+            rows = list(self._samples)[-n:] if n > 0 else []
+        if not rows:
+            return {"n": 0}
+        t0 = rows[0][0]
+        out = {"n": len(rows), "t0": round(t0, 1),
+               "dt": [round(r[0] - t0, 1) for r in rows]}
+        for ch in self.channels:
+            out[ch] = [_compact(r[1].get(ch)) for r in rows]
+        out["lamp"] = [r[2] for r in rows]
+        out["burst"] = [int(r[3]) for r in rows]
+        return out
+
+    def summary(self, since=None):
+        if since is not None and since < 0:
+            since = time.time() + since
+        with self._lock:
+            rows = [r for r in self._samples if since is None or r[0] >= since]
+            n_events = sum(1 for e in self._events if since is None or e[0] >= since)
+        out = {"n": len(rows), "events": n_events}
+        if rows:
+            out["from"] = round(rows[0][0], 1)
+            out["to"] = round(rows[-1][0], 1)
+        for ch in self.channels:
+            vals = [r[1][ch] for r in rows if r[1].get(ch) is not None]
+            out[ch] = {"n": len(vals),
+                       "mean": _compact(sum(vals) / len(vals)) if vals else None,
+                       "min": _compact(min(vals)) if vals else None,
+                       "max": _compact(max(vals)) if vals else None}
+        return out
+
+    def cycles(self, n=None):
+        with self._lock:
+            cycles = [c.as_dict() for c in self._cycles]
+        return {"cycles": cycles[-n:] if n else cycles}
+
+    def events(self, n):
+        with self._lock:
+            rows = list(self._events)[-n:] if n > 0 else []
+        return {"events": [[round(t, 3), kind, text] for t, kind, text in rows]}
+
+
+# ----------------------------------------------------------------------
+# Server
+# ----------------------------------------------------------------------
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for raw in self.rfile:
+            line = raw.decode("utf-8", "replace").strip()
+            if not line:
+                continue
+            try:
+                reply = self.server.answer(line)
+            except Exception as e:
+                reply = {"error": str(e)}
+            self.wfile.write(_dumps(reply).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class QueryServer:
+    def __init__(self, path, telemetry, state_func):
+        self.path = path
+        self.telemetry = telemetry
+        self.state_func = state_func
+        if os.path.exists(path):
+            os.remove(path)   # stale socket from a previous run
+        self._server = _UnixServer(path, _Handler)
+        self._server.answer = self.answer
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name="query-server", daemon=True)
+        self._thread.start()
+
+    def answer(self, line):
+        cmd, *args = line.split()
+        cmd = cmd.lower()
+        tel = self.telemetry
+        if cmd == "last":
+            return tel.last(int(args[0]) if args else 10)
+        if cmd == "summary":
+            return tel.summary(float(args[0]) if args else None)
+        if cmd == "state":
+            return dict(self.state_func(), quads=tel.quads, channels=tel.channels)
+        if cmd == "cycles":
+            return tel.cycles(int(args[0]) if args else None)
+        if cmd == "events":
+            return tel.events(int(args[0]) if args else 20)
+        if cmd == "help":
+            return {"commands": ["last [N]", "summary [T]", "state", "cycles [N]", "events [N]"]}
+        return {"error": f"unknown command '{cmd}'"}
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+# ----------------------------------------------------------------------
+# Client
+# ----------------------------------------------------------------------
+
+def query(line, path=DEFAULT_SOCKET, timeout=5.0):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(path)
+        s.sendall(line.encode("utf-8") + b"\n")
+        buf = b""
+        while not buf.endswith(b"\n"):
+            chunk = s.recv(65536)
+            if not chunk:
+                break
+            buf += chunk
+    return json.loads(buf)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Query a running run.py.")
+    ap.add_argument("--socket", default=DEFAULT_SOCKET,
+                    help=f"socket path (default {DEFAULT_SOCKET} in the current dir)")
+    ap.add_argument("command", nargs="+", help="e.g. state | last 20 | summary -3600 | cycles 5")
+    args = ap.parse_args()
+    try:
+        reply = query(" ".join(args.command), args.socket)
+    except OSError as e:
+        print(f"Cannot reach {args.socket}: {e}", file=sys.stderr)
+        return 1
+    print(_dumps(reply))
+    return 1 if "error" in reply else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1070 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+import queue
+import functools
+import signal
+import logging
+import threading
+from concurrent.futures import Future, TimeoutError as FuturesTimeoutError
+from logging.handlers import RotatingFileHandler
+
+import RPi.GPIO as GPIO
+
+from adc_sensors import (read_channels, adc_stats, start_sampler, stop_sampler,
+                         sampler_running, window_since_last)
+from config_watcher import ConfigWatcher
+from sequencer import Sequence, saved_schedule
+from query_server import Telemetry, QueryServer
+from metrics import Registry, MetricsServer
+from sensor_records import (RecordWriter, FLAG_NA, FLAG_ERROR, FLAG_TIMEOUT, FLAG_OVERRUN,
+                            FLAG_BURST)
+
+# ----------------------------------------------------------------------
+# CONFIGURATION BLOCK (edit these as needed)
+# ----------------------------------------------------------------------
+
+# GPIO numbering mode: use BCM so numbers match the pin labels here.
+GPIO.setmode(GPIO.BCM)
+
+# Quad -> GPIO pin mapping (EDIT if wiring changes)
+QUAD_GPIO_PINS = {
+    "bowport":   16,
+    "bowstar":   23,
+    "sternport": 24,
+    "sternstar": 25,
+}
+
+# lamp.config changes are picked up as they happen (see config_watcher.py);
+# this is only the backstop full re-read interval (seconds)
+CONFIG_POLL_INTERVAL = 15.0
+
+# Default sensor sampling interval (seconds) – overridden by samplerate in lamp.config
+DEFAULT_SAMPLE_INTERVAL = 15.0
+
+# Burst sampling: whenever a quad actually switches, sample every
+# DEFAULT_BURST_INTERVAL seconds for DEFAULT_BURST_LENGTH seconds, then go
+# back to samplerate. Overridden by burstrate / burstlength in lamp.config;
+# burstlength=0 turns bursts off.
+DEFAULT_BURST_INTERVAL = 1.0
+DEFAULT_BURST_LENGTH = 120.0
+
+# Longest single sleep in the main loop (seconds). The loop normally sleeps
+# right up to the next sample deadline; this only bounds how long a
+# shutdown request can go unnoticed.
+MAX_LOOP_SLEEP = 0.5
+
+# Config file name (in run directory / current working dir)
+CONFIG_FILE = "lamp.config"
+ALL_OFF_CONFIG_FILE = "lamp_all_off.config"
+
+# Log file (in run directory)
+LOG_FILE = "lamp_controller.log"
+
+# Start time of the running schedule (see sequencer.py), kept so a reboot
+# resumes the schedule where it was instead of starting it over
+SEQUENCE_STATE_FILE = "sequence.state"
+
+# Unix socket for remote queries of recent samples (see query_server.py)
+QUERY_SOCKET = "lamp_controller.sock"
+
+# Prometheus-style metrics on http://127.0.0.1:METRICS_PORT/metrics, and a
+# Metrics: summary line in the log every METRICS_LOG_INTERVAL seconds
+METRICS_PORT = 9108
+METRICS_LOG_INTERVAL = 300.0
+
+# Binary copy of every Sensors: line, for fast loading (see sensor_records.py)
+RECORD_FILE = "sensor_records.bin"
+
+# Axetris units, by log channel name, each read by its own thread.
+#   serial:  the unit's serial number (from its V packet); it is found on
+#            whichever port it comes up on.
+#   port:    a fixed port instead, e.g. /dev/serial/by-id/..., or an
+#            axetris_capture.py replay pty to run without the sensor.
+#   capture: file to record the unit's raw serial stream to.
+# All None = the first port found. The first unit must stay "methane" (log
+# parsers read methane=); further units are appended to the Sensors: line.
+METHANE_SENSORS = {
+    "methane": {"serial": None, "port": None, "capture": None},
+}
+
+# Background ADC sampler rate (passes over windspeed and current per
+# second). Logged values are then window means since the previous sample
+# rather than single conversions. 0 = one conversion per channel per sample.
+ADC_SAMPLER_RATE = 5.0
+
+# Name of methane module & function (ADJUST to match your actual module)
+
+from methane_sensor import add_sensor, sensors as methane_sensors, close_all as close_methane
+
+
+# ----------------------------------------------------------------------
+# GLOBAL STATE
+# ----------------------------------------------------------------------
+
+lamp_state = {name: False for name in QUAD_GPIO_PINS.keys()}  # False = off, True = on
+sample_interval = DEFAULT_SAMPLE_INTERVAL
+burst_interval = DEFAULT_BURST_INTERVAL
+burst_length = DEFAULT_BURST_LENGTH
+sequence = None   # running sequencer.Sequence, if lamp.config names a schedule
+start_time = time.time()
+query_server = None   # query_server.QueryServer, if the socket could be opened
+shutdown_requested = False
+record_writer = None
+metrics_server = None
+
+
+# ----------------------------------------------------------------------
+# METRICS (see metrics.py)
+# ----------------------------------------------------------------------
+
+metrics = Registry()
+sensor_read_seconds = metrics.histogram(
+    "bennu_sensor_read_seconds", "Time taken by one sensor read.", ("sensor",))
+sensor_errors = metrics.counter(
+    "bennu_sensor_errors_total", "Sensor reads that failed or returned nothing.", ("sensor",))
+sensor_timeouts = metrics.counter(
+    "bennu_sensor_timeouts_total",
+    "Acquisition tasks that missed their deadline or were still busy.", ("task",))
+methane_packets = metrics.counter(
+    "bennu_methane_packets_total", "Axetris packets averaged into samples.")
+adc_window_samples = metrics.counter(
+    "bennu_adc_window_samples_total", "Background ADC samples averaged into samples.",
+    ("sensor",))
+adc_window_faults = metrics.counter(
+    "bennu_adc_window_faults_total", "Background ADC samples dropped as fault codes.",
+    ("sensor",))
+sample_lateness_seconds = metrics.histogram(
+    "bennu_sample_lateness_seconds", "How late each sample started after its slot.")
+sample_seconds = metrics.histogram(
+    "bennu_sample_seconds", "Time from the start of a sample to the end of its logging.")
+log_write_seconds = metrics.histogram(
+    "bennu_log_write_seconds", "Time spent writing one sample to a log.", ("target",))
+config_apply_seconds = metrics.histogram(
+    "bennu_config_apply_seconds", "From lamp.config being written to the GPIO outputs being set.")
+sequence_step_lateness_seconds = metrics.histogram(
+    "bennu_sequence_step_lateness_seconds", "How late each schedule step switched.")
+for _key, _help in (("reads", "ADC conversions read."),
+                    ("polls", "ADC ready-bit polls, including the read with each select."),
+                    ("max_polls", "Most ready-bit polls any one ADC read needed."),
+                    ("timeouts", "ADC reads abandoned because the ready bit never cleared.")):
+    metrics.gauge(f"bennu_adc_{_key}", _help, func=lambda key=_key: adc_stats()[key])
+for _key, _help in (("resyncs", "Axetris frames rejected and rescanned for the next start byte."),
+                    ("bad_checksums", "Axetris frames rejected for a bad checksum."),
+                    ("discarded_bytes", "Serial bytes skipped while looking for a frame.")):
+    metrics.gauge(f"bennu_methane_framer_{_key}", _help,
+                  func=lambda key=_key: sum(s.framer_stats()[key]
+                                            for s in methane_sensors().values()))
+
+
+# ----------------------------------------------------------------------
+# LOGGING SETUP
+# ----------------------------------------------------------------------
+
+def setup_logging():
+    """Set up logging to file and stdout (for systemd)."""
+    logger = logging.getLogger()
+    logger.setLevel(logging.INFO)
+
+    formatter = logging.Formatter(
+        fmt="%(asctime)s [%(levelname)s] %(message)s",
+        datefmt="%Y-%m-%dT%H:%M:%S%z",
+    )
+
+    # File handler (rotating)
+    fh = RotatingFileHandler(LOG_FILE, maxBytes=1_000_000, backupCount=30)
+    fh.setFormatter(formatter)
+    logger.addHandler(fh)
+
+    # Stdout handler (systemd will capture this)
+    sh = logging.StreamHandler(sys.stdout)
+    sh.setFormatter(formatter)
+    logger.addHandler(sh)
+
+
+# ----------------------------------------------------------------------
+# GPIO SETUP / TEARDOWN
+# ----------------------------------------------------------------------
+
+def setup_gpio():
+    """Initialize GPIO outputs for all quads."""
+    for quad_name, pin in QUAD_GPIO_PINS.items():
+        GPIO.setup(pin, GPIO.OUT)
+        GPIO.output(pin, GPIO.LOW)
+    logging.info("GPIO initialized for quads: %s", ", ".join(sorted(QUAD_GPIO_PINS.keys())))
+
+
+def cleanup_gpio():
+    """Reset GPIO on shutdown."""
+    try:
+        GPIO.cleanup()
+        logging.info("GPIO cleaned up.")
+    except Exception as e:
+        logging.error("Error during GPIO cleanup: %s", e)
+
+
+# ----------------------------------------------------------------------
+# SIGNAL HANDLING
+# ----------------------------------------------------------------------
+
+def handle_signal(signum, frame):
+    global shutdown_requested
+    logging.info("Received signal %s, requesting shutdown.", signum)
+    shutdown_requested = True
+
+
+# ----------------------------------------------------------------------
+# CONFIG PARSING AND LAMP CONTROL
+# ----------------------------------------------------------------------
+
+def parse_samplerate(value_str, current_interval, key="samplerate", allow_zero=False):
+    """Parse samplerate value like '15s' or '10' into seconds."""
+    v = value_str.strip().lower()
+    if v.endswith("s"):
+        v = v[:-1].strip()
+    try:
+        seconds = float(v)
+        if seconds < 0 or (seconds == 0 and not allow_zero):
+            raise ValueError(f"{key} must be {'>=' if allow_zero else '>'} 0 seconds")
+        return seconds
+    except ValueError as e:
+        logging.error("Invalid %s '%s': %s (keeping %.1f s)",
+                      key, value_str, e, current_interval)
+        return current_interval
+
+
+def load_config(current_sample_interval, current_burst=(DEFAULT_BURST_INTERVAL, DEFAULT_BURST_LENGTH)):
+    """
+    Read lamp.config and produce:
+      - desired lamp_state dict (bools)
+      - possibly-updated sample_interval
+      - possibly-updated (burst_interval, burst_length)
+      - the schedule file named by a schedule= line, or None
+    Logs any format errors.
+    """
+    desired_state = lamp_state.copy()
+    new_sample_interval = current_sample_interval
+    new_burst_interval, new_burst_length = current_burst
+    schedule = None
+
+    # A missing or unreadable file keeps whatever is running, schedule included
+    current_schedule = sequence.path if sequence is not None else None
+
+    if not os.path.exists(CONFIG_FILE):
+        logging.error("Config file '%s' not found; keeping previous settings.", CONFIG_FILE)
+        return desired_state, new_sample_interval, current_burst, current_schedule
+
+    try:
+        with open(CONFIG_FILE, "r") as f:
+            lines = f.readlines()
+    except Exception as e:
+        logging.error("Error reading config file '%s': %s", CONFIG_FILE, e)
+        return desired_state, new_sample_interval, current_burst, current_schedule
+
+    for lineno, raw_line in enumerate(lines, start=1):
+        line = raw_line.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        if "=" not in line:
+            logging.error("Config error line %d: '%s' (no '=')", lineno, line)
+            continue
+
+        key, value = line.split("=", 1)
+        key = key.strip().lower()
+        value = value.strip()
+
+        if key == "samplerate":
+            old_interval = new_sample_interval
+            new_sample_interval = parse_samplerate(value, new_sample_interval)
+            if new_sample_interval != old_interval:
+                logging.info("Samplerate changed from %.1f s to %.1f s via config.",
+                             old_interval, new_sample_interval)
+            continue
+
+        if key == "burstrate":
+            new_burst_interval = parse_samplerate(value, new_burst_interval, key)
+            continue
+
+        if key == "burstlength":
+            new_burst_length = parse_samplerate(value, new_burst_length, key, allow_zero=True)
+            continue
+
+        if key == "schedule":
+            schedule = value
+            continue
+
+        if key not in QUAD_GPIO_PINS:
+            logging.error("Config error line %d: unknown key '%s' (value '%s')",
+                          lineno, key, value)
+            continue
+
+        v_lower = value.lower()
+        if v_lower in ("on", "off"):
+            desired_state[key] = (v_lower == "on")
+        else:
+            logging.error("Config error line %d: invalid value '%s' for '%s' (expected on/off)",
+                          lineno, value, key)
+
+    return desired_state, new_sample_interval, (new_burst_interval, new_burst_length), schedule
+
+
+def apply_lamp_state(new_state):
+    """
+    Set GPIO outputs to match new_state.
+    Logs only when something actually changes.
+    Returns the list of quads that changed.
+    """
+    global lamp_state
+
+    changed = []
+    for quad, desired_on in new_state.items():
+        if quad not in QUAD_GPIO_PINS:
+            logging.error("Internal error: unknown quad '%s' in apply_lamp_state.", quad)
+            continue
+
+        current_on = lamp_state.get(quad, False)
+        if desired_on == current_on:
+            continue  # no change
+
+        pin = QUAD_GPIO_PINS[quad]
+        GPIO.output(pin, GPIO.HIGH if desired_on else GPIO.LOW)
+        lamp_state[quad] = desired_on
+        changed.append(quad)
+        logging.info("Quad %s set to %s (GPIO %d)", quad, "ON" if desired_on else "OFF", pin)
+        telemetry.add_event(time.time(), "quad", f"{quad} {'ON' if desired_on else 'OFF'}")
+
+    return changed
+
+
+def switch_lamps(desired, scheduler, now):
+    """
+    apply_lamp_state(), and if any quad switched put the scheduler into
+    (or extend) a burst. Returns the list of quads that changed.
+    """
+    changed = apply_lamp_state(desired)
+    if changed and burst_length > 0:
+        scheduler.start_burst(burst_interval, burst_length, now)
+    return changed
+
+
+def reload_config(scheduler, now, changed_ns=None):
+    """
+    Re-read lamp.config and apply it.
+
+    changed_ns is the file's mtime (ns) when the reload was triggered by a
+    change notification; the delay from then until the GPIO outputs were
+    updated is logged, since it shifts every ON/OFF boundary.
+
+    A schedule= line hands the quads over to the sequencer (the quad lines
+    are then ignored); a config without one stops any running schedule.
+    """
+    global sample_interval, burst_interval, burst_length
+
+    desired, new_sample_interval, new_burst, schedule = load_config(
+        sample_interval, (burst_interval, burst_length))
+
+    if new_burst != (burst_interval, burst_length):
+        burst_interval, burst_length = new_burst
+        logging.info("Burst sampling set to every %.1f s for %.0f s after a switch%s.",
+                     burst_interval, burst_length, " (disabled)" if burst_length == 0 else "")
+
+    # If samplerate changed, re-phase the sample clock
+    if new_sample_interval != sample_interval:
+        logging.info("Updating sample_interval from %.1f to %.1f seconds",
+                     sample_interval, new_sample_interval)
+        sample_interval = new_sample_interval
+        scheduler.set_interval(sample_interval, now)
+
+    if schedule is not None:
+        changed = update_sequence(schedule, scheduler)
+    else:
+        stop_sequence("lamp.config has no schedule line")
+        changed = switch_lamps(desired, scheduler, now)
+
+    if changed_ns is not None:
+        delay = (time.time_ns() - changed_ns) / 1e9
+        config_apply_seconds.observe(delay)
+        logging.info("lamp.config change applied %.1f ms after the file was written "
+                     "(%d quad(s) changed).", delay * 1000, len(changed))
+
+
+# ----------------------------------------------------------------------
+# SEQUENCER (schedule files, see sequencer.py)
+# ----------------------------------------------------------------------
+
+def _format_epoch(t):
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(t)) + f".{int(t % 1 * 1000):03d}"
+
+
+def apply_sequence_step(step, scheduler, resumed=False):
+    """Switch to one schedule step and log when it was due vs. when it happened."""
+    changed = switch_lamps(step.state, scheduler, time.monotonic())
+    actual = time.time()
+    if not resumed:
+        sequence_step_lateness_seconds.observe(actual - step.deadline)
+    logging.info("Sequence step: name=%s cycle=%s step=%s label=%s intended=%s actual=%s "
+                 "late_ms=%s changed=%s",
+                 sequence.name, step.cycle, "end" if step.index is None else step.index,
+                 step.label.replace(" ", "_"), _format_epoch(step.deadline),
+                 _format_epoch(actual),
+                 "resumed" if resumed else f"{(actual - step.deadline) * 1000:.1f}",
+                 ",".join(changed) or "none")
+    telemetry.add_event(actual, "step", f"{sequence.name} {step.label} "
+                        f"late_ms={(actual - step.deadline) * 1000:.1f}")
+    if sequence.finished:
+        logging.info("Sequence '%s' finished; all quads OFF.", sequence.name)
+        telemetry.add_event(actual, "sequence", f"{sequence.name} finished")
+    return changed
+
+
+def update_sequence(path, scheduler):
+    """
+    Start the schedule at path unless that same schedule (same content) is
+    already running or has finished. An edited schedule file starts over.
+    Returns the list of quads that changed.
+    """
+    global sequence
+
+    try:
+        new = Sequence(path, QUAD_GPIO_PINS, SEQUENCE_STATE_FILE)
+    except (OSError, ValueError) as e:
+        logging.error("Cannot load schedule '%s': %s (keeping previous settings)", path, e)
+        return []
+    if sequence is not None and (sequence.path, sequence.digest) == (new.path, new.digest):
+        return []
+
+    stop_sequence(f"replaced by '{path}'")
+    sequence = new
+    step = sequence.start(time.time())
+    telemetry.add_event(time.time(), "sequence", f"{sequence.name} "
+                        f"{'resumed' if sequence.resumed else 'started'}")
+    logging.info("%s sequence '%s' from %s (%d steps, %s).",
+                 "Resuming" if sequence.resumed else "Starting", sequence.name,
+                 _format_epoch(sequence.start_time), len(sequence.steps),
+                 "forever" if sequence.repeat is None else f"{sequence.repeat} cycle(s)")
+    if step is None:
+        logging.info("Sequence '%s' already finished; all quads OFF.", sequence.name)
+        return switch_lamps({q: False for q in QUAD_GPIO_PINS}, scheduler, time.monotonic())
+    return apply_sequence_step(step, scheduler, resumed=sequence.resumed)
+
+
+def stop_sequence(reason):
+    global sequence
+    if sequence is None:
+        return
+    if not sequence.finished:
+        sequence.stop()
+        logging.info("Sequence '%s' stopped: %s.", sequence.name, reason)
+        telemetry.add_event(time.time(), "sequence", f"{sequence.name} stopped")
+    sequence = None
+
+
+def run_sequence(scheduler):
+    """Apply every schedule step whose deadline has passed."""
+    if sequence is None:
+        return
+    for step in sequence.pop_due(time.time()):
+        apply_sequence_step(step, scheduler)
+
+
+def resume_sequence_config():
+    """
+    After a restart (lamp.config has just been reset to all-off), add the
+    interrupted schedule back to lamp.config so it resumes on schedule.
+    """
+    path = saved_schedule(SEQUENCE_STATE_FILE)
+    if path is None:
+        return
+    try:
+        with open(CONFIG_FILE, "a") as f:
+            f.write(f"schedule={path}\n")
+        logging.info("Resuming interrupted schedule '%s'.", path)
+    except Exception as e:
+        logging.error("Could not resume schedule '%s': %s", path, e)
+
+
+# ----------------------------------------------------------------------
+# SENSOR READ FUNCTIONS (STUBS / WRAPPERS)
+# ----------------------------------------------------------------------
+
+def read_methane_wrapper(name="methane"):
+    """
+    Mean gas1 over every packet the named unit's background reader collected
+    since the previous sample, and the arrival time of the newest of them.
+    Returns (None, None) on error or if no packet arrived.
+    """
+    try:
+        with sensor_read_seconds.labels(sensor=name).time():
+            sensor = methane_sensors()[name]
+            # Starts the reader (opening the port) if startup could not
+            sensor.start_reader()
+            agg = sensor.since_last()
+    except Exception as e:
+        logging.error("Error reading %s sensor: %s", name, e)
+        sensor_errors.labels(sensor=name).inc()
+        return None, None
+    methane_packets.inc(agg["count"])
+    if agg["error_codes"]:
+        logging.warning("%s sensor reported error code(s) %s since the previous sample.",
+                        name, ", ".join(f"0x{c:04x}" for c in agg["error_codes"]))
+    if agg["count"] == 0:
+        logging.error("No %s packets since the previous sample.", name)
+        sensor_errors.labels(sensor=name).inc()
+        return None, None
+    return agg["mean"], agg["t_last"]
+
+
+def _acquire_methane(name):
+    # The background reader timestamps packets on arrival, so t_acq is the
+    # newest packet's arrival time rather than the time of this call.
+    return {name: read_methane_wrapper(name)}
+
+
+def start_methane_sensors():
+    """Register every METHANE_SENSORS unit and start its reader."""
+    for name, cfg in METHANE_SENSORS.items():
+        sensor = add_sensor(name, cfg.get("port"), cfg.get("serial"))
+        if cfg.get("capture"):
+            try:
+                sensor.start_capture(cfg["capture"])
+                logging.info("Capturing the raw %s stream to '%s'.", name, cfg["capture"])
+            except Exception as e:
+                logging.error("Could not open %s capture '%s': %s", name, cfg["capture"], e)
+        try:
+            sensor.start_reader()
+            logging.info("%s sensor on %s (serial %s, firmware %s); background reader started.",
+                         name, sensor.port, sensor.info["serial"] or "?",
+                         sensor.info["firmware"] or "?")
+        except Exception as e:
+            logging.error("Could not initialize %s sensor: %s", name, e)
+
+
+def _adc_windows():
+    """
+    Mean of each ADC channel over the background sampler's window since the
+    previous sample, timestamped (like methane) with its newest sample.
+    """
+    readings = {}
+    for ch in ("windspeed", "current"):
+        window = window_since_last(ch)
+        adc_window_samples.labels(sensor=ch).inc(window["n"])
+        if window["faults"] or window["errors"]:
+            adc_window_faults.labels(sensor=ch).inc(window["faults"])
+            logging.warning("%s: %d fault sample(s) dropped and %d failed conversion(s) "
+                            "since the previous sample.", ch, window["faults"], window["errors"])
+        if window["n"] == 0:
+            logging.error("No good %s samples since the previous sample.", ch)
+            sensor_errors.labels(sensor="adc").inc()
+            readings[ch] = (None, None)
+        else:
+            readings[ch] = (window["mean"], window["t_last"])
+    return readings
+
+
+def _acquire_adc():
+    # Windspeed and current are two inputs of the same ADC, which can only
+    # convert one channel at a time, so they are converted back to back in
+    # one call (timestamped per conversion) rather than in parallel. With
+    # the background sampler running, its windows are used instead.
+    try:
+        with sensor_read_seconds.labels(sensor="adc").time():
+            if sampler_running():
+                return _adc_windows()
+            return read_channels(("windspeed", "current"))
+    except Exception as e:
+        logging.error("Error reading ADC: %s", e)
+        sensor_errors.labels(sensor="adc").inc()
+        return {"windspeed": (None, None), "current": (None, None)}
+
+
+# ----------------------------------------------------------------------
+# CONCURRENT ACQUISITION
+# ----------------------------------------------------------------------
+
+# Channels in the order they appear in the Sensors: log line
+SENSOR_CHANNELS = ("methane", "windspeed", "current") + tuple(
+    name for name in METHANE_SENSORS if name != "methane")
+
+# Recent samples and events, for the query socket
+telemetry = Telemetry(SENSOR_CHANNELS, QUAD_GPIO_PINS)
+
+# (task name, channels it produces, read function, deadline in seconds).
+# Tasks run concurrently, each on its own worker thread and against its
+# own deadline. A methane task only reads its unit's background reader's
+# buffer, but its deadline still covers the 1 s serial timeout of reopening
+# the port.
+ACQUISITION_TASKS = tuple(
+    (name, (name,), functools.partial(_acquire_methane, name), 2.5) for name in METHANE_SENSORS
+) + (
+    ("adc", ("windspeed", "current"), _acquire_adc, 2.0),
+)
+
+
+class ChannelReader:
+    """
+    A dedicated daemon worker thread for one acquisition task.
+
+    submit() hands the worker a read and returns a Future for its result.
+    A read that overruns its deadline keeps its worker busy, and busy() stays
+    True until it returns, so a hung device ties up only its own thread and
+    is never queued up behind itself. Daemon threads mean a read stuck in
+    the kernel cannot hold up controller shutdown.
+    """
+
+    def __init__(self, name, channels, read_func, timeout):
+        self.name = name
+        self.channels = channels
+        self.read_func = read_func
+        self.timeout = timeout
+        self._pending = None
+        self._requests = queue.Queue()
+        threading.Thread(target=self._run, name=f"acq-{name}", daemon=True).start()
+
+    def busy(self):
+        return self._pending is not None and not self._pending.done()
+
+    def submit(self):
+        fut = Future()
+        self._pending = fut
+        self._requests.put(fut)
+        return fut
+
+    def _run(self):
+        while True:
+            fut = self._requests.get()
+            if not fut.set_running_or_notify_cancel():
+                continue
+            try:
+                fut.set_result(self.read_func())
+            except BaseException as e:
+                fut.set_exception(e)
+
+
+channel_readers = []
+
+
+def start_channel_readers():
+    """Create one worker per entry in ACQUISITION_TASKS."""
+    channel_readers[:] = [ChannelReader(*task) for task in ACQUISITION_TASKS]
+
+
+def acquire_sensors():
+    """
+    Read every channel concurrently.
+
+    Returns (readings, timed_out). readings is {channel: (value, t_acq)};
+    value is None (logged as NA) for a channel that failed, missed its
+    task's deadline, or whose previous read is still running, and t_acq is
+    None whenever there is no reading. timed_out is the set of channels that
+    are NA because of a deadline rather than a read error.
+    """
+    started = time.monotonic()
+    readings = {ch: (None, None) for ch in SENSOR_CHANNELS}
+    timed_out = set()
+
+    futures = []
+    for reader in channel_readers:
+        if reader.busy():
+            logging.error("%s read still running from an earlier sample; logging NA.",
+                          reader.name)
+            sensor_timeouts.labels(task=reader.name).inc()
+            timed_out.update(reader.channels)
+            continue
+        futures.append((reader, reader.submit()))
+
+    for reader, fut in futures:
+        remaining = max(0.0, started + reader.timeout - time.monotonic())
+        try:
+            readings.update(fut.result(timeout=remaining))
+        except FuturesTimeoutError:
+            logging.error("%s read missed its %.1f s deadline; logging NA.",
+                          reader.name, reader.timeout)
+            sensor_timeouts.labels(task=reader.name).inc()
+            timed_out.update(reader.channels)
+        except Exception as e:
+            logging.error("Error in %s acquisition: %s", reader.name, e)
+
+    return readings, timed_out
+
+
+def open_record_log():
+    """Open the binary record log; on failure run on with the text log only."""
+    global record_writer
+    try:
+        record_writer = RecordWriter(RECORD_FILE, SENSOR_CHANNELS, list(QUAD_GPIO_PINS))
+        logging.info("Writing binary sensor records to '%s'.", RECORD_FILE)
+    except Exception as e:
+        logging.error("Could not open record log '%s': %s", RECORD_FILE, e)
+        record_writer = None
+
+
+def write_record(t_ns, readings, timed_out, lateness, skipped, burst):
+    """Append one sample to the binary record log (see sensor_records.py)."""
+    global record_writer
+    if record_writer is None:
+        return
+
+    values = []
+    flags = 0
+    for ch in SENSOR_CHANNELS:
+        value = readings[ch][0]
+        if value is None:
+            values.append(float("nan"))
+            flags |= FLAG_NA | (FLAG_TIMEOUT if ch in timed_out else FLAG_ERROR)
+        else:
+            values.append(value)
+    if skipped:
+        flags |= FLAG_OVERRUN
+    if burst:
+        flags |= FLAG_BURST
+    lamp_bits = sum(1 << i for i, quad in enumerate(QUAD_GPIO_PINS) if lamp_state[quad])
+
+    try:
+        record_writer.write(t_ns, values, lateness, flags, lamp_bits)
+    except Exception as e:
+        logging.error("Error writing record log; disabling it: %s", e)
+        record_writer = None
+
+
+def current_status():
+    """Answer to the query socket's "state" command."""
+    status = {
+        "time": round(time.time(), 1),
+        "uptime": round(time.time() - start_time),
+        "lamp": {quad: int(on) for quad, on in lamp_state.items()},
+        "samplerate": sample_interval,
+        "burstrate": burst_interval,
+        "burstlength": burst_length,
+    }
+    if sequence is not None:
+        status["schedule"] = {
+            "name": sequence.name,
+            "start": round(sequence.start_time, 1),
+            "finished": sequence.finished,
+            "next": None if sequence.next_deadline is None else round(sequence.next_deadline, 1),
+        }
+    return status
+
+
+def open_query_socket():
+    """Serve the query socket; on failure run on without it."""
+    global query_server
+    try:
+        query_server = QueryServer(QUERY_SOCKET, telemetry, current_status)
+        logging.info("Answering queries on '%s'.", QUERY_SOCKET)
+    except Exception as e:
+        logging.error("Could not open query socket '%s': %s", QUERY_SOCKET, e)
+        query_server = None
+
+
+def open_metrics(scheduler):
+    """Publish the scheduler's counters and serve /metrics; on failure run on without it."""
+    global metrics_server
+    for attr, help_text in (("samples", "Samples taken."),
+                            ("overruns", "Samples that ran past the next slot."),
+                            ("skipped", "Sample slots skipped after an overrun."),
+                            ("bursts", "Post-switch bursts started.")):
+        metrics.gauge(f"bennu_scheduler_{attr}", help_text,
+                      func=lambda attr=attr: getattr(scheduler, attr))
+    try:
+        metrics_server = MetricsServer(metrics, METRICS_PORT)
+        logging.info("Serving metrics on http://127.0.0.1:%d/metrics.", METRICS_PORT)
+    except Exception as e:
+        logging.error("Could not serve metrics on port %d: %s", METRICS_PORT, e)
+        metrics_server = None
+
+
+def _window_ms(histogram):
+    """'mean/max' in ms of what histogram saw since the last Metrics: line."""
+    _n, mean, peak = histogram.take_window()
+    if mean is None:
+        return "NA"
+    return f"{mean * 1000:.2f}/{peak * 1000:.2f}"
+
+
+def log_metrics_summary(scheduler):
+    """
+    One Metrics: line: mean/max (ms) of each timing since the previous line,
+    and running totals of errors, timeouts, overruns and skipped slots.
+    """
+    fields = [f"samples={scheduler.samples}",
+              f"lateness_ms={_window_ms(sample_lateness_seconds)}",
+              f"sample_ms={_window_ms(sample_seconds)}"]
+    tasks = [task[0] for task in ACQUISITION_TASKS]
+    for task in tasks:
+        fields.append(f"{task}_read_ms={_window_ms(sensor_read_seconds.labels(sensor=task))}")
+    for target in ("text", "record"):
+        fields.append(f"{target}_write_ms={_window_ms(log_write_seconds.labels(target=target))}")
+    fields.append(f"config_apply_ms={_window_ms(config_apply_seconds)}")
+    adc = adc_stats()
+    fields.append(f"adc_polls_per_read={adc['polls'] / adc['reads']:.1f}" if adc["reads"]
+                  else "adc_polls_per_read=NA")
+    fields.append(f"errors={sum(sensor_errors.labels(sensor=t).value for t in tasks)}")
+    fields.append(f"timeouts={sum(sensor_timeouts.labels(task=t).value for t in tasks)}")
+    fields.append(f"overruns={scheduler.overruns} skipped={scheduler.skipped}")
+    logging.info("Metrics: %s", " ".join(fields))
+
+
+# Further methane units, after burst= on the Sensors: line
+_EXTRA_SENSORS_FORMAT = "".join(f" {ch}=%({ch})s {ch}_dt=%({ch}_dt)s"
+                                for ch in SENSOR_CHANNELS[3:])
+
+
+def log_sensor_readings(lateness=0.0, skipped=0, burst=False):
+    """
+    Read all sensors once and log/print the results.
+
+    lateness is how far (seconds) this sample started after its scheduled
+    slot; it is logged with the readings so uneven spacing can be seen.
+    skipped is the number of slots dropped just before this one.
+    burst marks a sample taken during a post-switch burst (burst=1).
+    Each channel also gets <channel>_dt, the offset (seconds) of its own
+    acquisition time from the sample's start.
+    """
+    t_sample_ns = time.time_ns()
+    t_sample = t_sample_ns / 1e9
+    ts = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(t_sample))
+
+    readings, timed_out = acquire_sensors()
+
+    # Use 'NA' for missing values so logs remain parseable
+    fields = {"time": ts, "lateness": lateness, "burst": int(burst)}
+    for ch in SENSOR_CHANNELS:
+        value, t_acq = readings[ch]
+        fields[ch] = "NA" if value is None else value
+        fields[f"{ch}_dt"] = "NA" if t_acq is None else f"{t_acq - t_sample:.3f}"
+
+    # Simple human-readable log line; easy to grep or TSV-parse later.
+    # Extra fields go after current= so older parsers keep working.
+    with log_write_seconds.labels(target="text").time():
+        logging.info(
+            "Sensors: time=%(time)s methane=%(methane)s windspeed=%(windspeed)s current=%(current)s "
+            "lateness=%(lateness).3f methane_dt=%(methane_dt)s windspeed_dt=%(windspeed_dt)s "
+            "current_dt=%(current_dt)s burst=%(burst)d" + _EXTRA_SENSORS_FORMAT,
+            fields,
+        )
+    with log_write_seconds.labels(target="record").time():
+        write_record(t_sample_ns, readings, timed_out, lateness, skipped, burst)
+    telemetry.add_sample(t_sample, {ch: readings[ch][0] for ch in SENSOR_CHANNELS},
+                         lamp_state, burst)
+
+
+# ----------------------------------------------------------------------
+# SAMPLE SCHEDULER
+# ----------------------------------------------------------------------
+
+class SampleScheduler:
+    """
+    Fixed-phase sample clock on time.monotonic().
+
+    Slot k is due at t0 + k*interval however long earlier reads took, so the
+    cadence never drifts. A sample that runs past the next slot counts as an
+    overrun; any slots that passed entirely while it ran are skipped (not
+    fired back-to-back) and counted in `skipped`.
+
+    A burst temporarily swaps in a shorter interval, phased so the first
+    burst sample is taken straight away; once the burst runs out the clock
+    re-phases on the base interval from the burst's end.
+    """
+
+    def __init__(self, interval, now=None):
+        self.overruns = 0
+        self.skipped = 0
+        self.last_skipped = 0
+        self.samples = 0
+        self.bursts = 0
+        self.burst_until = None
+        self.last_burst = False
+        self.reset(interval, time.monotonic() if now is None else now)
+        self.base_interval = interval
+
+    def reset(self, interval, now):
+        """Re-phase the clock so the first slot is one interval after now."""
+        self.interval = interval
+        self.t0 = now
+        self.k = 1
+
+    def set_interval(self, interval, now):
+        """Change the base interval; during a burst it takes effect after it."""
+        self.base_interval = interval
+        if self.burst_until is None:
+            self.reset(interval, now)
+
+    def start_burst(self, interval, length, now):
+        """Sample now and every interval until length seconds from now."""
+        if self.burst_until is None:
+            self.bursts += 1
+            logging.info("Burst sampling started: every %.1f s for %.0f s.", interval, length)
+        else:
+            logging.info("Burst sampling extended to %.0f s from now.", length)
+        self.burst_until = now + length
+        self.reset(interval, now)
+        self.k = 0
+
+    @property
+    def in_burst(self):
+        return self.burst_until is not None
+
+    @property
+    def next_deadline(self):
+        return self.t0 + self.k * self.interval
+
+    def start_sample(self, now):
+        """
+        Claim the most recent due slot and return the lateness (seconds)
+        of now relative to it.
+        """
+        missed = int((now - self.next_deadline) // self.interval)
+        if missed > 0:
+            self.skipped += missed
+            logging.warning("Skipped %d sample slot(s) (%d skipped in total).",
+                            missed, self.skipped)
+        self.k += missed
+        self.last_skipped = max(missed, 0)
+        lateness = now - self.next_deadline
+        self.k += 1
+        self.samples += 1
+        self.last_burst = self.in_burst
+        if self.in_burst and self.next_deadline > self.burst_until:
+            logging.info("Burst sampling ended; back to every %.1f s.", self.base_interval)
+            end = self.burst_until
+            self.burst_until = None
+            self.reset(self.base_interval, end)
+        return lateness
+
+    def finish_sample(self, now, started):
+        """Count an overrun if the sample ran past the next slot."""
+        if now > self.next_deadline:
+            self.overruns += 1
+            logging.warning("Sample overrun: read took %.3f s with a %.1f s interval "
+                            "(%d overruns in total).",
+                            now - started, self.interval, self.overruns)
+
+# ----------------------------------------------------------------------
+# When we start we force all the lamps off by forcing in all_off_config
+# ----------------------------------------------------------------------
+
+def initialize_config_to_all_off():
+    """On startup, replace CONFIG_FILE with ALL_OFF_CONFIG_FILE"""
+    if not os.path.exists(ALL_OFF_CONFIG_FILE):
+        logging.error("All-off config '%s' not found; not modifying '%s'.",
+                      ALL_OFF_CONFIG_FILE, CONFIG_FILE)
+        return
+
+    try:
+        with open(ALL_OFF_CONFIG_FILE, "r") as src, open(CONFIG_FILE, "w") as dst:
+            dst.write(src.read())
+        logging.info("Initialized '%s' from '%s' (all lamps OFF).",
+                     CONFIG_FILE, ALL_OFF_CONFIG_FILE)
+    except Exception as e:
+        logging.error("Failed to initialize config from '%s': %s",
+                      ALL_OFF_CONFIG_FILE, e)
+
+# ----------------------------------------------------------------------
+# MAIN LOOP
+# ----------------------------------------------------------------------
+
+def main():
+
+    setup_logging()
+    logging.info("=== Lamp controller starting up ===")
+    initialize_config_to_all_off()
+    open_record_log()
+    open_query_socket()
+
+    start_methane_sensors()
+
+    if ADC_SAMPLER_RATE > 0:
+        try:
+            start_sampler(ADC_SAMPLER_RATE)
+            logging.info("ADC background sampler started at %.1f passes/s.", ADC_SAMPLER_RATE)
+        except Exception as e:
+            logging.error("Could not start ADC background sampler (single conversions "
+                          "per sample instead): %s", e)
+
+    setup_gpio()
+    start_channel_readers()
+
+    # Hook signals for clean shutdown
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    # All loop timing is on the monotonic clock so wall-clock steps (NTP,
+    # manual date changes) cannot stretch or collapse the sample cadence.
+    scheduler = SampleScheduler(sample_interval)
+
+    # Initial config load and lamp set
+    resume_sequence_config()
+    reload_config(scheduler, time.monotonic())
+    logging.info("Initial lamp states: %s", lamp_state)
+    logging.info("Initial sensor sample interval: %.1f s", sample_interval)
+    logging.info("Burst sampling: every %.1f s for %.0f s after a switch%s.",
+                 burst_interval, burst_length, " (disabled)" if burst_length == 0 else "")
+
+    next_config_time = time.monotonic() + CONFIG_POLL_INTERVAL
+    open_metrics(scheduler)
+    next_metrics_time = time.monotonic() + METRICS_LOG_INTERVAL
+
+    config_watcher = ConfigWatcher(CONFIG_FILE)
+    logging.info("Watching '%s' for changes (%s).", CONFIG_FILE, config_watcher.mode)
+
+    try:
+        while not shutdown_requested:
+            now = time.monotonic()
+
+            # Backstop config reload, in case a change notification is missed
+            if now >= next_config_time:
+                reload_config(scheduler, now)
+                next_config_time = now + CONFIG_POLL_INTERVAL
+
+            # Scheduled lamp switches, on their absolute deadlines
+            run_sequence(scheduler)
+
+            # Sensor sampling on the fixed-phase schedule
+            if now >= scheduler.next_deadline:
+                lateness = scheduler.start_sample(now)
+                sample_lateness_seconds.observe(lateness)
+                log_sensor_readings(lateness, scheduler.last_skipped, scheduler.last_burst)
+                finished = time.monotonic()
+                sample_seconds.observe(finished - now)
+                scheduler.finish_sample(finished, now)
+
+            if now >= next_metrics_time:
+                log_metrics_summary(scheduler)
+                next_metrics_time = now + METRICS_LOG_INTERVAL
+
+            # Sleep until the next thing is due (not a fixed tick), so
+            # samples start on their deadline instead of up to a tick late,
+            # waking early to apply a lamp.config change the moment it lands.
+            wake = min(scheduler.next_deadline, next_config_time, next_metrics_time)
+            if sequence is not None and sequence.next_deadline is not None:
+                # Schedule deadlines are wall-clock; convert to monotonic
+                wake = min(wake, time.monotonic() + sequence.next_deadline - time.time())
+            changed_ns = config_watcher.wait(min(max(0.0, wake - time.monotonic()), MAX_LOOP_SLEEP))
+            if changed_ns is not None:
+                reload_config(scheduler, time.monotonic(), changed_ns)
+
+    except Exception as e:
+        logging.exception("Unexpected error in main loop: %s", e)
+    finally:
+        logging.info("Sampling summary: %d samples, %d overruns, %d skipped slots, %d bursts.",
+                     scheduler.samples, scheduler.overruns, scheduler.skipped, scheduler.bursts)
+        logging.info("Shutting down controller...")
+        config_watcher.close()
+        close_methane()
+        stop_sampler()
+        if record_writer is not None:
+            record_writer.close()
+        if query_server is not None:
+            query_server.close()
+        if metrics_server is not None:
+            metrics_server.close()
+        cleanup_gpio()
+        logging.info("=== Lamp controller stopped ===")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+sensor_records.py
+
+Fixed-width, append-only binary record log of the controller's samples,
+written by run.py next to the text log so analysis can load months of data
+with one np.fromfile/memmap instead of regex-parsing every Sensors: line.
+
+File layout (all little-endian):
+
+    header   HEADER_PREFIX = magic b"BENNUREC", version, header_len,
+             record_size; then ASCII "channels=a,b,c\\nquads=w,x,y,z\\n",
+             NUL-padded out to header_len bytes.
+    records  back to back, record_size bytes each:
+                 t_ns      int64    sample start, ns since the epoch (UTC)
+                 <channel> float32  one per header channel; NaN = NA
+                 lateness  float32  seconds after the sample's slot
+                 flags     uint8    FLAG_* bits below
+                 lamp      uint8    bit i set = header quad i ON
+
+A record is written with a single write() call, so a crash can at worst
+leave a partial record at the end; readers ignore it and the writer cuts it
+off before appending again.
+
+Public API:
+
+    RecordWriter(path, channels, quads)
+        - Open path for appending, starting a new file (and renaming an
+          incompatible old one aside) if the header does not match.
+        - writer.write(t_ns, values, lateness, flags, lamp_bits)
+        - writer.close()
+
+    read_header(path)
+        - Returns dict(version, header_len, record_size, channels, quads).
+
+    load_records(path, mmap=True)
+        - Returns a NumPy structured array, one element per record, with
+          fields t_ns, <channels...>, lateness, flags, lamp. With mmap=True
+          it is a read-only memory map of the file.
+
+    quad_states(records, header)
+        - Returns {quad: bool array} decoded from the lamp bits.
+
+CLI:
+    python3 sensor_records.py sensor_records.bin          # summary
+    python3 sensor_records.py sensor_records.bin --tsv    # log2tsv-style TSV
+"""
+
+import argparse
+import os
+import struct
+import sys
+import time
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:  # run.py only writes records; NumPy is needed to read them
+    np = None
+
+MAGIC = b"BENNUREC"
+VERSION = 1
+HEADER_PREFIX = struct.Struct("<8sHHH")  # magic, version, header_len, record_size
+HEADER_ALIGN = 64
+
+# flags byte
+FLAG_NA      = 0x01   # at least one channel is NA
+FLAG_ERROR   = 0x02   # a channel read raised an error
+FLAG_TIMEOUT = 0x04   # a channel missed its deadline or was still busy
+FLAG_OVERRUN = 0x08   # sample slots were skipped just before this sample
+FLAG_BURST   = 0x10   # taken during a post-switch burst (burst=1 in the text log)
+
+
+def _record_struct(n_channels):
+    return struct.Struct("<q" + "f" * n_channels + "fBB")
+
+
+def _encode_header(channels, quads):
+    rec = _record_struct(len(channels))
+    text = f"channels={','.join(channels)}\nquads={','.join(quads)}\n".encode("ascii")
+    header_len = HEADER_PREFIX.size + len(text)
+    header_len += -header_len % HEADER_ALIGN
+    prefix = HEADER_PREFIX.pack(MAGIC, VERSION, header_len, rec.size)
+    return (prefix + text).ljust(header_len, b"\0")
+
+
+def _decode_header(raw):
+    if len(raw) < HEADER_PREFIX.size:
+        raise ValueError("File too short for a record-log header")
+    magic, version, header_len, record_size = HEADER_PREFIX.unpack_from(raw, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a sensor record log (bad magic)")
+    if version != VERSION:
+        raise ValueError(f"Unsupported record-log version {version}")
+    fields = {}
+    text = raw[HEADER_PREFIX.size:header_len].rstrip(b"\0").decode("ascii")
+    for line in text.splitlines():
+        key, _, value = line.partition("=")
+        fields[key] = value.split(",") if value else []
+    return {
+        "version": version,
+        "header_len": header_len,
+        "record_size": record_size,
+        "channels": fields.get("channels", []),
+        "quads": fields.get("quads", []),
+    }
+
+
+def read_header(path):
+    with open(path, "rb") as f:
+        raw = f.read(HEADER_PREFIX.size)
+        if len(raw) == HEADER_PREFIX.size:
+            raw += f.read(HEADER_PREFIX.unpack(raw)[2] - HEADER_PREFIX.size)
+    return _decode_header(raw)
+
+
+# ----------------------------------------------------------------------
+# Writer (stdlib only, used by run.py)
+# ----------------------------------------------------------------------
+
+class RecordWriter:
+    """Append records to a record-log file; see module docstring."""
+
+    def __init__(self, path, channels, quads):
+        if len(quads) > 8:
+            raise ValueError("At most 8 quads fit in the lamp byte")
+        self.path = path
+        self.channels = list(channels)
+        self.quads = list(quads)
+        self._struct = _record_struct(len(self.channels))
+        header = _encode_header(self.channels, self.quads)
+
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            try:
+                existing = read_header(path)
+            except (OSError, ValueError):
+                existing = None
+            if (existing is not None and existing["channels"] == self.channels
+                    and existing["quads"] == self.quads):
+                # Drop a partial trailing record left by a crash mid-write
+                body = os.path.getsize(path) - existing["header_len"]
+                keep = existing["header_len"] + body - body % self._struct.size
+                self._fh = open(path, "r+b")
+                self._fh.truncate(keep)
+                self._fh.seek(keep)
+                return
+            aside = f"{path}.{time.strftime('%Y%m%d%H%M%S')}"
+            os.rename(path, aside)
+
+        self._fh = open(path, "wb")
+        self._fh.write(header)
+        self._fh.flush()
+
+    def write(self, t_ns, values, lateness, flags, lamp_bits):
+        """values: one float (NaN for NA) per channel, in header order."""
+        self._fh.write(self._struct.pack(t_ns, *values, lateness, flags, lamp_bits))
+        self._fh.flush()
+
+    def close(self):
+        self._fh.close()
+
+
+# ----------------------------------------------------------------------
+# Reader (NumPy)
+# ----------------------------------------------------------------------
+
+def record_dtype(channels):
+    fields = [("t_ns", "<i8")]
+    fields += [(ch, "<f4") for ch in channels]
+    fields += [("lateness", "<f4"), ("flags", "u1"), ("lamp", "u1")]
+    return np.dtype(fields)
+
+
+def load_records(path, mmap=True):
+    if np is None:
+        raise RuntimeError("NumPy is required to read sensor record logs.")
+    header = read_header(path)
+    dtype = record_dtype(header["channels"])
+    if dtype.itemsize != header["record_size"]:
+        raise ValueError(f"Record size {header['record_size']} does not match "
+                         f"channels {header['channels']}")
+    n = (os.path.getsize(path) - header["header_len"]) // dtype.itemsize
+    if n <= 0:
+        return np.zeros(0, dtype=dtype)
+    if mmap:
+        return np.memmap(path, dtype=dtype, mode="r", offset=header["header_len"], shape=(n,))
+    return np.fromfile(path, dtype=dtype, count=n, offset=header["header_len"])
+
+
+def quad_states(records, header):
+    return {q: (records["lamp"] & (1 << i)) != 0 for i, q in enumerate(header["quads"])}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Inspect a binary sensor record log.")
+    ap.add_argument("path")
+    ap.add_argument("--tsv", action="store_true",
+                    help="print time + channels as TSV (same layout as log2tsv.py)")
+    args = ap.parse_args()
+
+    header = read_header(args.path)
+    rec = load_records(args.path)
+
+    if args.tsv:
+        # Local time, matching the time= field of the text log
+        print("\t".join(["time"] + header["channels"]))
+        for r in rec:
+            ts = datetime.fromtimestamp(int(r["t_ns"]) / 1e9).strftime("%Y-%m-%dT%H:%M:%S")
+            vals = ["NA" if v != v else repr(float(v)) for v in (r[ch] for ch in header["channels"])]
+            print("\t".join([ts] + vals))
+        return
+
+    print(f"{args.path}: {len(rec)} records, channels={header['channels']}, quads={header['quads']}")
+    if len(rec):
+        t = rec["t_ns"].astype("datetime64[ns]")
+        print(f"  span: {t[0]} .. {t[-1]} (UTC)")
+        print(f"  NA: {int(np.count_nonzero(rec['flags'] & FLAG_NA))}  "
+              f"errors: {int(np.count_nonzero(rec['flags'] & FLAG_ERROR))}  "
+              f"timeouts: {int(np.count_nonzero(rec['flags'] & FLAG_TIMEOUT))}  "
+              f"overruns: {int(np.count_nonzero(rec['flags'] & FLAG_OVERRUN))}  "
+              f"burst samples: {int(np.count_nonzero(rec['flags'] & FLAG_BURST))}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+sequencer.py
+
+Declarative experiment schedules for run.py, replacing run.sh loops that
+cp configs over lamp.config and sleep. run.py runs the schedule named by
+a `schedule=<path>` line in lamp.config and switches the quads itself, at
+absolute deadlines measured from the schedule's start, so timing error does
+not accumulate from step to step and a reboot can pick up where it left off.
+
+Schedule file (JSON):
+
+    {
+      "name": "20260901_seqon",
+      "repeat": "forever",                  # or a count; default 1
+      "steps": [
+        {"config": "lamp_configs/lamp_all_off.config", "duration": "10m"},
+        {"state": {"bowport": "on", "sternstar": "on"}, "duration": 600},
+        {"ramp": ["bowport", "bowstar", "sternport", "sternstar"],
+         "interval": "1m", "hold": "10m"},
+        {"steps": [...], "repeat": 3}
+      ]
+    }
+
+    config   quad states from a lamp config file (path relative to the
+             schedule file); other keys in it are ignored
+    state    quad -> "on"/"off"; quads not listed are OFF
+    ramp     turn the listed quads on one at a time, `interval` apart (like
+             lamp_seqon1..4.config), holding the last for `hold` (default
+             `interval`); "direction": "off" turns them off one at a time
+             from all on instead
+    steps    a nested block; any step may carry "repeat"
+
+Durations are seconds, or strings like "90s", "10m", "2h".
+
+Public API:
+
+    Sequence(path, quads, state_file)
+        - Load and compile a schedule; ValueError if it is malformed.
+        - seq.start(now) starts it (or resumes it, if state_file records a
+          start time for this same schedule file and content) and returns
+          the Step that should be in effect at now (None if it has already
+          finished).
+        - seq.next_deadline: wall-clock time of the next switch, or None.
+        - seq.pop_due(now): Steps whose deadlines have passed, in order.
+          The last Step of a finite schedule is the all-off "end" step.
+        - seq.stop(): abandon it and forget the saved start time.
+        - seq.finished, seq.name, seq.path, seq.digest
+
+    saved_schedule(state_file)
+        - Path of the schedule a saved start time belongs to, or None. run.py
+          uses it after a restart to put the schedule back into lamp.config.
+
+    Step
+        - namedtuple(deadline, cycle, index, state, label); state is a full
+          {quad: bool} dict, index is None for the end step.
+
+All times are time.time() epoch seconds, since the start time has to mean
+the same thing after a reboot.
+"""
+
+import bisect
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import re
+from collections import namedtuple
+
+Step = namedtuple("Step", "deadline cycle index state label")
+
+_DURATION_RE = re.compile(r"^\s*([0-9]*\.?[0-9]+)\s*([smh]?)\s*$", re.IGNORECASE)
+_UNIT_SECONDS = {"": 1, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        seconds = float(value)
+    else:
+        m = _DURATION_RE.match(str(value))
+        if not m:
+            raise ValueError(f"Invalid duration {value!r}")
+        seconds = float(m.group(1)) * _UNIT_SECONDS[m.group(2).lower()]
+    if seconds <= 0:
+        raise ValueError(f"Duration must be > 0 (got {value!r})")
+    return seconds
+
+
+def _read_config_states(path, quads):
+    state = {q: False for q in quads}
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            key, value = (s.strip().lower() for s in line.split("=", 1))
+            if key in state:
+                if value not in ("on", "off"):
+                    raise ValueError(f"{path}: invalid value '{value}' for '{key}'")
+                state[key] = value == "on"
+    return state
+
+
+def _compile_steps(steps, base_dir, quads, where):
+    """Flatten a step list into [(duration, state, label)]."""
+    if not isinstance(steps, list) or not steps:
+        raise ValueError(f"{where}: 'steps' must be a non-empty list")
+
+    out = []
+    for i, step in enumerate(steps):
+        at = f"{where}[{i}]"
+        if not isinstance(step, dict):
+            raise ValueError(f"{at}: each step must be an object")
+        repeat = step.get("repeat", 1)
+        if not isinstance(repeat, int) or repeat < 1:
+            raise ValueError(f"{at}: 'repeat' must be a positive integer")
+
+        if "steps" in step:
+            block = _compile_steps(step["steps"], base_dir, quads, at + ".steps")
+        elif "ramp" in step:
+            ramp = step["ramp"]
+            if not ramp or any(q not in quads for q in ramp):
+                raise ValueError(f"{at}: 'ramp' must list quads from {list(quads)}")
+            interval = parse_duration(step.get("interval", 0))
+            hold = parse_duration(step.get("hold", interval))
+            turning_on = step.get("direction", "on") == "on"
+            block = []
+            for n, quad in enumerate(ramp, start=1):
+                switched = set(ramp[:n])
+                if turning_on:
+                    state = {q: q in switched for q in quads}
+                else:
+                    state = {q: q in ramp and q not in switched for q in quads}
+                label = f"ramp {quad} {'on' if turning_on else 'off'}"
+                block.append((hold if n == len(ramp) else interval, state, label))
+        elif "config" in step:
+            path = os.path.join(base_dir, step["config"])
+            try:
+                state = _read_config_states(path, quads)
+            except OSError as e:
+                raise ValueError(f"{at}: {e}") from None
+            block = [(parse_duration(step.get("duration", 0)), state,
+                      os.path.basename(step["config"]))]
+        elif "state" in step:
+            unknown = set(step["state"]) - set(quads)
+            if unknown:
+                raise ValueError(f"{at}: unknown quad(s) {sorted(unknown)}")
+            state = {q: False for q in quads}
+            for quad, value in step["state"].items():
+                if str(value).lower() not in ("on", "off"):
+                    raise ValueError(f"{at}: invalid value '{value}' for '{quad}'")
+                state[quad] = str(value).lower() == "on"
+            label = ",".join(q for q in quads if state[q]) or "all off"
+            block = [(parse_duration(step.get("duration", 0)), state, label)]
+        else:
+            raise ValueError(f"{at}: step needs one of config/state/ramp/steps")
+
+        out.extend(block * repeat)
+    return out
+
+
+def _load_state(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def saved_schedule(state_file):
+    saved = _load_state(state_file)
+    return saved.get("schedule") if isinstance(saved, dict) else None
+
+
+class Sequence:
+    """A compiled, running schedule; see module docstring."""
+
+    def __init__(self, path, quads, state_file):
+        self.path = os.path.abspath(path)
+        self.quads = list(quads)
+        self.state_file = state_file
+        with open(self.path, "rb") as f:
+            raw = f.read()
+        self.digest = hashlib.sha1(raw).hexdigest()
+        try:
+            spec = json.loads(raw)
+        except ValueError as e:
+            raise ValueError(f"{self.path}: {e}") from None
+        if not isinstance(spec, dict):
+            raise ValueError(f"{self.path}: schedule must be a JSON object")
+
+        self.name = spec.get("name", os.path.basename(self.path))
+        repeat = spec.get("repeat", 1)
+        if repeat == "forever":
+            self.repeat = None
+        elif isinstance(repeat, int) and repeat >= 1:
+            self.repeat = repeat
+        else:
+            raise ValueError(f"{self.path}: 'repeat' must be a positive integer or \"forever\"")
+
+        self.steps = _compile_steps(spec.get("steps"), os.path.dirname(self.path),
+                                    self.quads, "steps")
+        self.offsets = list(itertools.accumulate([0.0] + [d for d, _, _ in self.steps[:-1]]))
+        self.period = sum(d for d, _, _ in self.steps)
+
+        self.start_time = None
+        self.resumed = False
+        self.finished = False
+        self._heap = []
+        self._tiebreak = itertools.count()
+
+    # ------------------------------------------------------------------
+
+    def _step(self, cycle, index):
+        _, state, label = self.steps[index]
+        deadline = self.start_time + cycle * self.period + self.offsets[index]
+        return Step(deadline, cycle, index, dict(state), label)
+
+    def _push(self, step):
+        heapq.heappush(self._heap, (step.deadline, next(self._tiebreak), step))
+
+    def _push_cycle(self, cycle, first=0):
+        if self.repeat is not None and cycle >= self.repeat:
+            return
+        for index in range(first, len(self.steps)):
+            self._push(self._step(cycle, index))
+
+    def _save_state(self):
+        tmp = self.state_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"schedule": self.path, "sha1": self.digest,
+                       "start": self.start_time}, f)
+        os.replace(tmp, self.state_file)
+
+    def _clear_state(self):
+        try:
+            os.remove(self.state_file)
+        except FileNotFoundError:
+            pass
+
+    # ------------------------------------------------------------------
+
+    def start(self, now):
+        saved = _load_state(self.state_file)
+        if (saved and saved.get("schedule") == self.path
+                and saved.get("sha1") == self.digest):
+            self.start_time = float(saved["start"])
+            self.resumed = True
+        else:
+            self.start_time = now
+            self._save_state()
+
+        elapsed = max(0.0, now - self.start_time)
+        if self.repeat is not None and elapsed >= self.repeat * self.period:
+            self.finished = True
+            self._clear_state()
+            return None
+
+        cycle, within = divmod(elapsed, self.period)
+        cycle = int(cycle)
+        index = bisect.bisect_right(self.offsets, within) - 1
+        self._push_cycle(cycle, first=index + 1)
+        if index == len(self.steps) - 1:
+            self._push_cycle(cycle + 1)
+        if self.repeat is not None:
+            end = self.start_time + self.repeat * self.period
+            self._push(Step(end, self.repeat, None, {q: False for q in self.quads},
+                            "end of schedule"))
+        return self._step(cycle, index)
+
+    @property
+    def next_deadline(self):
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, _, step = heapq.heappop(self._heap)
+            due.append(step)
+            if step.index is None:
+                self.finished = True
+                self._heap.clear()
+                self._clear_state()
+            elif step.index == len(self.steps) - 1:
+                self._push_cycle(step.cycle + 1)
+        return due
+
+    def stop(self):
+        self._heap.clear()
+        self._clear_state()